@@ -1,37 +1,101 @@
 """
 JWT authentication — encode/decode tokens for session management.
 Eliminates Google Sheets lookup on every API request.
+
+The JWT carries everything handlers need (tenant_id, pyme_name, sheet_id)
+plus the tenant's auth version ("ver"). A request with a valid Bearer JWT
+whose ver matches the current auth version is served from the claims alone:
+decode results are memoized per token and versions live in a per-worker
+dict, so the hot path touches no DB. Changing or deleting a tenant bumps its
+version; older JWTs then fall back to a token lookup (401 if the tenant is gone).
 """
 import jwt
 import logging
+import threading
+import time
 from datetime import datetime, timedelta, timezone
 from typing import Optional
-from fastapi import Header, Query, HTTPException
+from fastapi import Depends, Header, Query, HTTPException
 from app.core.config import settings
-from app.core.cache import get_cache, set_cache
+from app.core.cache import get_named_cache
+from app.core.state import state, GenerationWatch
 
 logger = logging.getLogger(__name__)
 
+# JWT string -> verified payload (exp is re-checked on every hit)
+_jwt_cache = get_named_cache("jwt", default_ttl=600, negative_ttl=30)
+
+
+# ── Auth versions (revocation) ──
+
+_auth_versions: dict[str, int] = {}
+_auth_lock = threading.Lock()
+_auth_watch = GenerationWatch("auth")  # bumped by revocations in any worker
+
+
+def auth_version(tenant_id: str) -> int:
+    """Current auth version of a tenant; JWTs issued with an older one are not trusted."""
+    if _auth_watch.changed():
+        with _auth_lock:
+            _auth_versions.clear()
+    version = _auth_versions.get(tenant_id)
+    if version is None:
+        version = int(state.get("auth_version", tenant_id) or 0)
+        with _auth_lock:
+            _auth_versions[tenant_id] = version
+    return version
+
 
-def create_token(tenant_id: str, original_token: str) -> str:
+def revoke_tenant_tokens(tenant_id: str) -> int:
+    """Bump the tenant's auth version (in every worker). Returns the new version."""
+    version = state.incr("auth_version", tenant_id)
+    with _auth_lock:
+        _auth_versions[tenant_id] = version
+    _auth_watch.bump()
+    return version
+
+
+def invalidate_tenant_cache(tenant_id: Optional[str] = None):
+    """Reload the tenant registry after a tenant changes (in every worker).
+    With tenant_id, its JWT claims are re-validated too."""
+    from app.services.tenant_registry import registry
+    registry.invalidate()
+    if tenant_id:
+        revoke_tenant_tokens(tenant_id)
+
+
+# ── Tokens ──
+
+def create_token(tenant_id: str, original_token: str, pyme_name: str = "", sheet_id: str = "") -> str:
     """Create JWT with tenant info. Valid for JWT_EXPIRE_DAYS."""
     payload = {
         "sub": tenant_id,
         "token": original_token,
+        "pyme_name": pyme_name,
+        "sheet_id": sheet_id,
+        "ver": auth_version(tenant_id),
         "iat": datetime.now(timezone.utc),
         "exp": datetime.now(timezone.utc) + timedelta(days=settings.JWT_EXPIRE_DAYS),
     }
     return jwt.encode(payload, settings.JWT_SECRET, algorithm=settings.JWT_ALGORITHM)
 
 
-def decode_token(token: str) -> Optional[dict]:
-    """Decode JWT. Returns payload dict or None if invalid/expired."""
+def _decode(token: str) -> Optional[dict]:
     try:
         return jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM])
     except (jwt.ExpiredSignatureError, jwt.InvalidTokenError):
         return None
 
 
+def decode_token(token: str) -> Optional[dict]:
+    """Decode JWT. Returns payload dict or None if invalid/expired.
+    Memoized: the signature is verified once per token."""
+    payload = _jwt_cache.get_or_load(token, lambda: _decode(token))
+    if payload is None or payload.get("exp", 0) <= time.time():
+        return None
+    return payload
+
+
 def get_tenant_id_from_jwt(token: str) -> Optional[str]:
     """Extract tenant_id from JWT. Returns None if invalid."""
     payload = decode_token(token)
@@ -40,26 +104,35 @@ def get_tenant_id_from_jwt(token: str) -> Optional[str]:
     return None
 
 
-async def get_current_tenant(
+def get_current_tenant(
     authorization: str = Header(None),
     token: str = Query(None),
 ) -> dict:
     """
     Shared dependency for all protected endpoints.
     Tries JWT (Authorization header) first, falls back to ?token= query param.
+    Sync on purpose: cache/DB lookups run in the threadpool, not on the event loop.
 
     Returns: {"tenant_id", "token", "pyme_name", "sheet_id"}
     """
     original_token = None
     tenant_id = None
 
-    # Path 1: JWT from Authorization header — no DB call needed for tenant_id
+    # Path 1: JWT from Authorization header — no DB call when its claims are current
     if authorization and authorization.startswith("Bearer "):
         jwt_token = authorization.replace("Bearer ", "")
         payload = decode_token(jwt_token)
         if payload:
             original_token = payload.get("token")
             tenant_id = payload.get("sub")
+            # JWTs issued before claims were added have no "ver": validated below
+            if tenant_id and "ver" in payload and payload["ver"] == auth_version(tenant_id):
+                return {
+                    "tenant_id": tenant_id,
+                    "token": original_token,
+                    "pyme_name": payload.get("pyme_name", ""),
+                    "sheet_id": payload.get("sheet_id", ""),
+                }
 
     # Path 2: query param token (fallback)
     if not tenant_id and token:
@@ -77,36 +150,21 @@ async def get_current_tenant(
             "sheet_id": "",
         }
 
-    # Look up sheet_id + pyme_name from cache or DB
-    cache_key = f"tenant_info:{original_token}"
-
-    cached = get_cache(cache_key, ttl=300)
-    if cached and (cached.get("sheet_id") or cached.get("tenant_id")):
-        if not tenant_id:
-            tenant_id = cached.get("tenant_id")
-        return {
-            "tenant_id": tenant_id,
-            "token": original_token,
-            "pyme_name": cached.get("pyme_name", ""),
-            "sheet_id": cached.get("sheet_id", ""),
-        }
-
-    # Cache miss — look up in SQLite
+    # Look up sheet_id + pyme_name in the tenant registry (in-memory token index)
     try:
-        from app.services.factory import get_tenant_service
-        tenant_service = get_tenant_service()
-
-        info = tenant_service.validate_token(original_token)
-        if not info:
-            raise HTTPException(status_code=401, detail="Token invalido")
-
-        tenant_id = tenant_id or info["tenant_id"]
-        info["tenant_id"] = tenant_id
-        set_cache(cache_key, info, ttl=300)
-        return info
-
-    except HTTPException:
-        raise
+        from app.services.tenant_registry import registry
+        info = registry.by_token(original_token)
     except Exception as e:
         logger.error(f"Error buscando tenant: {e}")
         raise HTTPException(status_code=503, detail="Servicio temporalmente no disponible")
+
+    if not info:
+        raise HTTPException(status_code=401, detail="Token invalido")
+    return {**info, "tenant_id": tenant_id or info["tenant_id"]}
+
+
+def require_admin(tenant: dict = Depends(get_current_tenant)) -> dict:
+    """Dependency for operator endpoints (maintenance, backups): admin token only."""
+    if tenant["tenant_id"] != "admin":
+        raise HTTPException(status_code=403, detail="Solo el administrador puede hacer esto")
+    return tenant
@@ -0,0 +1,292 @@
+"""
+Online snapshots of every SQLite file under DB_DIR (inventory_, orders_, usage_, admin.db).
+
+Files are copied with SQLite's backup API a few pages per step, sleeping
+between steps, from a read-only connection. In WAL mode a reader never blocks
+writers, so sales keep committing while the copy runs. If the source keeps
+changing and the copy restarts too often, the file is copied in one step
+instead (still just a read snapshot). Every file in a snapshot is
+transactionally consistent; the snapshot dir only appears (rename from
+.partial) once every file is written and quick_check'ed.
+
+Local use (DATA_DIR / BACKUP_DIR from env):
+    python -m app.core.backup create | list | verify <id> | restore <id> [db_file]
+"""
+import datetime
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from typing import Optional
+
+from app.core.config import settings
+from app.core.database import DB_DIR, _pool, open_connection
+from app.core.maintenance import list_databases
+
+logger = logging.getLogger(__name__)
+
+BACKUP_DIR = settings.BACKUP_DIR or os.path.join(DB_DIR, "backups")
+MANIFEST = "manifest.json"
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+# ── Single file ──
+
+def backup_file(src_path: str, dest_path: str) -> dict:
+    """Copy one live DB to dest_path page by page. Returns size/duration/check info."""
+    started = time.monotonic()
+    tmp = dest_path + ".tmp"
+    restarts = 0
+    last_remaining: Optional[int] = None
+
+    def _progress(_status, remaining, _total):
+        # remaining grows again when another connection wrote to the source
+        nonlocal restarts, last_remaining
+        if last_remaining is not None and remaining > last_remaining:
+            restarts += 1
+            if restarts > settings.BACKUP_MAX_RESTARTS:
+                raise _TooManyRestarts()
+        last_remaining = remaining
+
+    with closing(open_connection(src_path, readonly=True)) as src, closing(sqlite3.connect(tmp)) as dest:
+        try:
+            src.backup(dest, pages=settings.BACKUP_PAGES, progress=_progress, sleep=settings.BACKUP_SLEEP)
+            mode = "incremental"
+        except _TooManyRestarts:
+            src.backup(dest, pages=-1)
+            mode = "single-step"
+        check = dest.execute("PRAGMA quick_check").fetchone()[0]
+    os.replace(tmp, dest_path)
+    return {
+        "size": os.path.getsize(dest_path),
+        "mode": mode,
+        "restarts": restarts,
+        "check": check,
+        "duration_ms": round((time.monotonic() - started) * 1000, 1),
+    }
+
+
+# ── Snapshots ──
+
+def _snapshot_path(snapshot_id: str) -> str:
+    path = os.path.join(BACKUP_DIR, os.path.basename(snapshot_id))
+    if not os.path.isfile(os.path.join(path, MANIFEST)):
+        raise FileNotFoundError(f"Snapshot no encontrado: {snapshot_id}")
+    return path
+
+
+def _read_manifest(path: str) -> dict:
+    with open(os.path.join(path, MANIFEST)) as f:
+        return json.load(f)
+
+
+def _write_manifest(path: str, manifest: dict):
+    tmp = os.path.join(path, MANIFEST + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, os.path.join(path, MANIFEST))
+
+
+def create_snapshot() -> dict:
+    """Back up every DB file into BACKUP_DIR/<timestamp>/ and prune old snapshots."""
+    snapshot_id = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+    n = 1
+    while os.path.exists(os.path.join(BACKUP_DIR, snapshot_id)):
+        snapshot_id = f"{snapshot_id.split('.')[0]}.{n}"
+        n += 1
+    final = os.path.join(BACKUP_DIR, snapshot_id)
+    partial = final + ".partial"
+    os.makedirs(partial, exist_ok=True)
+    started = time.monotonic()
+
+    files: dict[str, dict] = {}
+    for path in list_databases():
+        name = os.path.basename(path)
+        try:
+            files[name] = backup_file(path, os.path.join(partial, name))
+        except Exception as e:
+            logger.error(f"Backup failed for {name}: {e}")
+            files[name] = {"error": str(e)}
+
+    failed = [n for n, f in files.items() if "error" in f or f.get("check") != "ok"]
+    manifest = {
+        "id": snapshot_id,
+        "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "status": "ok" if not failed else "partial",
+        "failed": failed,
+        "duration_ms": round((time.monotonic() - started) * 1000, 1),
+        "total_bytes": sum(f.get("size", 0) for f in files.values()),
+        "files": files,
+    }
+    _write_manifest(partial, manifest)
+    os.replace(partial, final)
+    logger.info(f"Snapshot {snapshot_id}: {len(files)} files, {len(failed)} failed")
+    prune_snapshots()
+    return manifest
+
+
+def list_snapshots() -> list[dict]:
+    """Manifests (without per-file detail), newest first."""
+    if not os.path.isdir(BACKUP_DIR):
+        return []
+    result = []
+    for entry in sorted(os.listdir(BACKUP_DIR), reverse=True):
+        path = os.path.join(BACKUP_DIR, entry)
+        if entry.endswith(".partial") or not os.path.isfile(os.path.join(path, MANIFEST)):
+            continue
+        manifest = _read_manifest(path)
+        manifest["file_count"] = len(manifest.pop("files", {}))
+        result.append(manifest)
+    return result
+
+
+def prune_snapshots(keep: Optional[int] = None) -> list[str]:
+    """Delete all but the newest `keep` snapshots (and leftover .partial dirs)."""
+    keep = settings.BACKUP_KEEP if keep is None else keep
+    if not os.path.isdir(BACKUP_DIR):
+        return []
+    removed = []
+    for entry in os.listdir(BACKUP_DIR):
+        if entry.endswith(".partial") and not _running.locked():
+            shutil.rmtree(os.path.join(BACKUP_DIR, entry), ignore_errors=True)
+    for snapshot in list_snapshots()[keep:]:
+        shutil.rmtree(os.path.join(BACKUP_DIR, snapshot["id"]), ignore_errors=True)
+        removed.append(snapshot["id"])
+    return removed
+
+
+def verify_snapshot(snapshot_id: str) -> dict:
+    """Full integrity_check of every file in the snapshot; result saved in the manifest."""
+    path = _snapshot_path(snapshot_id)
+    manifest = _read_manifest(path)
+    results = {}
+    for name in manifest["files"]:
+        file_path = os.path.join(path, name)
+        if not os.path.exists(file_path):
+            results[name] = "missing"
+            continue
+        with closing(sqlite3.connect(f"file:{file_path}?mode=ro", uri=True)) as conn:
+            results[name] = conn.execute("PRAGMA integrity_check").fetchone()[0]
+    manifest["verified_at"] = datetime.datetime.now().isoformat(timespec="seconds")
+    manifest["verify_ok"] = all(r == "ok" for r in results.values())
+    manifest["verify"] = results
+    _write_manifest(path, manifest)
+    return {"id": snapshot_id, "ok": manifest["verify_ok"], "files": results}
+
+
+def restore_snapshot(snapshot_id: str, db_file: Optional[str] = None) -> dict:
+    """Copy one file (or all) from a snapshot back into DB_DIR.
+
+    The live file's pooled connections are closed first, and the copy goes
+    through the backup API into the live DB, so -wal/-shm stay consistent.
+    """
+    from app.core.migrations import forget
+
+    path = _snapshot_path(snapshot_id)
+    manifest = _read_manifest(path)
+    names = [db_file] if db_file else [n for n in manifest["files"] if n not in manifest.get("failed", [])]
+    restored = []
+    for name in names:
+        if name not in manifest["files"] or not os.path.exists(os.path.join(path, name)):
+            raise FileNotFoundError(f"{name} no esta en el snapshot {snapshot_id}")
+        live = os.path.join(DB_DIR, name)
+        _pool.evict(live)
+        with closing(sqlite3.connect(f"file:{os.path.join(path, name)}?mode=ro", uri=True)) as src, \
+                closing(open_connection(live)) as dest:
+            src.backup(dest)
+        forget(live)  # the snapshot may predate the latest migration
+        restored.append(name)
+        logger.info(f"Restored {name} from snapshot {snapshot_id}")
+    return {"id": snapshot_id, "restored": restored}
+
+
+# ── Scheduling ──
+
+_running = threading.Lock()
+_status = {"running": False, "last_id": None, "last_error": None}
+
+
+def run_backup() -> Optional[dict]:
+    """create_snapshot unless one is already running (returns None then)."""
+    if not _running.acquire(blocking=False):
+        return None
+    try:
+        _status.update(running=True, last_error=None)
+        manifest = create_snapshot()
+        _status["last_id"] = manifest["id"]
+        return manifest
+    except Exception as e:
+        _status["last_error"] = str(e)
+        logger.error(f"Snapshot failed: {e}")
+        raise
+    finally:
+        _status["running"] = False
+        _running.release()
+
+
+def run_backup_in_background() -> bool:
+    if _running.locked():
+        return False
+    threading.Thread(target=run_backup, name="db-backup-manual", daemon=True).start()
+    return True
+
+
+def _due() -> bool:
+    snapshots = list_snapshots()
+    if not snapshots:
+        return True
+    last = datetime.datetime.fromisoformat(snapshots[0]["created_at"])
+    return datetime.datetime.now() - last >= datetime.timedelta(hours=settings.BACKUP_INTERVAL_HOURS)
+
+
+def _loop(stop: threading.Event, check_interval: float):
+    while not stop.wait(check_interval):
+        try:
+            if _due():
+                run_backup()
+        except Exception:
+            pass  # logged in run_backup
+
+
+_stop = threading.Event()
+
+
+def start_backup_scheduler(check_interval: float = 300):
+    """Snapshot every BACKUP_INTERVAL_HOURS (checked every few minutes)."""
+    if settings.BACKUP_ENABLED:
+        threading.Thread(target=_loop, args=(_stop, check_interval), name="db-backup", daemon=True).start()
+
+
+def backup_status() -> dict:
+    return {
+        **_status,
+        "enabled": settings.BACKUP_ENABLED,
+        "backup_dir": BACKUP_DIR,
+        "interval_hours": settings.BACKUP_INTERVAL_HOURS,
+        "keep": settings.BACKUP_KEEP,
+    }
+
+
+if __name__ == "__main__":
+    import sys
+
+    logging.basicConfig(level=logging.INFO)
+    cmd, args = (sys.argv[1], sys.argv[2:]) if len(sys.argv) > 1 else ("list", [])
+    if cmd == "create":
+        out = create_snapshot()
+    elif cmd == "list":
+        out = list_snapshots()
+    elif cmd == "verify" and args:
+        out = verify_snapshot(args[0])
+    elif cmd == "restore" and args:
+        out = restore_snapshot(args[0], args[1] if len(args) > 1 else None)
+    else:
+        sys.exit("uso: python -m app.core.backup create | list | verify <id> | restore <id> [db_file]")
+    print(json.dumps(out, indent=2))
@@ -1,24 +1,280 @@
 """
-In-memory cache — simple dict with TTL.
-Used only for tenant_info lookup in auth.py.
+In-process object cache — bounded LRU with per-key TTL.
+
+- max_entries / max_bytes bound each cache; least recently used entries go first
+- values are stored as-is (no JSON round-trip): treat them as read-only
+- get_or_load() is single-flight: concurrent misses on a key run the loader once
+- a loader returning None is cached as a negative entry for negative_ttl
+- a daemon thread sweeps expired entries from every cache
+- invalidate() clears the cache in every worker: it bumps a generation counter
+  in the shared state store, which other workers poll every few seconds
+
+Named caches (get_named_cache) let tenant lookup, catalog and analytics reuse
+the same machinery; get_cache/set_cache remain for simple dict payloads.
+cached_payload() caches computed read responses keyed on the tenant's data
+version, so they are never served stale and need no invalidation.
 """
-import json
+import logging
+import sys
+import threading
 import time
-from typing import Optional
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+from app.core.config import settings
+from app.core.state import GenerationWatch
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+_NEGATIVE = object()
+
+
+def approx_size(obj: Any, _depth: int = 0) -> int:
+    """Rough deep size in bytes for containers of builtins (used for max_bytes)."""
+    size = sys.getsizeof(obj)
+    if _depth > 4:
+        return size
+    if isinstance(obj, dict):
+        size += sum(approx_size(k, _depth + 1) + approx_size(v, _depth + 1) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(approx_size(v, _depth + 1) for v in obj)
+    elif hasattr(obj, "__slots__"):
+        size += sum(approx_size(getattr(obj, s, None), _depth + 1) for s in obj.__slots__)
+    elif hasattr(obj, "__dict__"):
+        size += approx_size(vars(obj), _depth + 1)
+    return size
+
+
+class _Flight:
+    __slots__ = ("event", "value", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error: Optional[BaseException] = None
+
+
+class Cache:
+    """Thread-safe LRU + TTL cache. Entries: key -> (expires_at, size, value)."""
+
+    def __init__(self, name: str, max_entries: int = 10000, max_bytes: Optional[int] = None,
+                 default_ttl: float = 300, negative_ttl: float = 30,
+                 sizeof: Callable[[Any], int] = approx_size):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.negative_ttl = negative_ttl
+        self._sizeof = sizeof
+        self._data: OrderedDict[Any, tuple[float, int, Any]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._flights: dict[Any, _Flight] = {}
+        self._watch = GenerationWatch(f"cache:{name}")
+        self.metrics = {"hits": 0, "misses": 0, "negative_hits": 0, "loads": 0,
+                        "load_waits": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    # ── Cross-worker invalidation ──
+
+    def _sync_generation(self):
+        """Clear local entries if another worker invalidated this cache."""
+        if self._watch.changed():
+            with self._lock:
+                self._clear_locked()
+
+    # ── Core ops ──
+
+    def _clear_locked(self):
+        self._data.clear()
+        self._bytes = 0
+
+    def _remove_locked(self, key):
+        _, size, _ = self._data.pop(key)
+        self._bytes -= size
+
+    def _lookup(self, key):
+        """Raw stored value (may be _NEGATIVE) or _MISSING. Counts hits/misses."""
+        self._sync_generation()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires_at, _, value = entry
+                if expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.metrics["negative_hits" if value is _NEGATIVE else "hits"] += 1
+                    return value
+                self._remove_locked(key)
+                self.metrics["expirations"] += 1
+            self.metrics["misses"] += 1
+            return _MISSING
+
+    def get(self, key, default=None):
+        value = self._lookup(key)
+        return default if value is _MISSING or value is _NEGATIVE else value
+
+    def set(self, key, value, ttl: Optional[float] = None):
+        ttl = self.default_ttl if ttl is None else ttl
+        size = self._sizeof(value) if self.max_bytes else 0
+        with self._lock:
+            if key in self._data:
+                self._remove_locked(key)
+            self._data[key] = (time.monotonic() + ttl, size, value)
+            self._bytes += size
+            while self._data and (len(self._data) > self.max_entries
+                                  or (self.max_bytes and self._bytes > self.max_bytes)):
+                self._remove_locked(next(iter(self._data)))
+                self.metrics["evictions"] += 1
+
+    def set_negative(self, key, ttl: Optional[float] = None):
+        """Remember that key has no value (e.g. unknown token) for negative_ttl."""
+        self.set(key, _NEGATIVE, self.negative_ttl if ttl is None else ttl)
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._data:
+                self._remove_locked(key)
+
+    def clear(self):
+        with self._lock:
+            self._clear_locked()
 
-_cache: dict[str, tuple[float, str]] = {}
+    def invalidate(self):
+        """Clear this cache here and, via the state store, in every other worker."""
+        self.clear()
+        self.metrics["invalidations"] += 1
+        self._watch.bump()
 
+    def get_or_load(self, key, loader: Callable[[], Any], ttl: Optional[float] = None,
+                    negative_ttl: Optional[float] = None):
+        """Cached value, or loader() run once for all concurrent callers of key.
+        None results are cached negatively; loader exceptions are not cached."""
+        value = self._lookup(key)
+        if value is _NEGATIVE:
+            return None
+        if value is not _MISSING:
+            return value
+
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self.metrics["load_waits"] += 1
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            self.metrics["loads"] += 1
+            flight.value = loader()
+            if flight.value is None:
+                self.set_negative(key, negative_ttl)
+            else:
+                self.set(key, flight.value, ttl)
+            return flight.value
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.event.set()
+
+    def sweep(self) -> int:
+        """Drop expired entries. Returns how many were removed."""
+        now = time.monotonic()
+        with self._lock:
+            expired = [k for k, (expires_at, _, _) in self._data.items() if expires_at <= now]
+            for key in expired:
+                self._remove_locked(key)
+            self.metrics["expirations"] += len(expired)
+        return len(expired)
+
+    def stats(self) -> dict:
+        with self._lock:
+            m = dict(self.metrics)
+            m.update(entries=len(self._data), bytes=self._bytes)
+        lookups = m["hits"] + m["negative_hits"] + m["misses"]
+        m["hit_rate"] = round((m["hits"] + m["negative_hits"]) / lookups, 4) if lookups else 0.0
+        m.update(max_entries=self.max_entries, max_bytes=self.max_bytes)
+        return m
+
+    def __len__(self):
+        return len(self._data)
+
+
+# ── Registry + sweeper ──
+
+_caches: dict[str, Cache] = {}
+_registry_lock = threading.Lock()
+_sweeper: Optional[threading.Thread] = None
+
+
+def _sweep_loop():
+    while True:
+        time.sleep(settings.CACHE_SWEEP_SECONDS)
+        for cache in list(_caches.values()):
+            try:
+                cache.sweep()
+            except Exception as e:
+                logger.warning(f"Cache sweep failed for {cache.name}: {e}")
+
+
+def get_named_cache(name: str, **kwargs) -> Cache:
+    """Shared cache by name (created on first use with kwargs)."""
+    global _sweeper
+    with _registry_lock:
+        cache = _caches.get(name)
+        if cache is None:
+            kwargs.setdefault("max_entries", settings.CACHE_MAX_ENTRIES)
+            kwargs.setdefault("max_bytes", settings.CACHE_MAX_BYTES)
+            cache = _caches[name] = Cache(name, **kwargs)
+        if _sweeper is None:
+            _sweeper = threading.Thread(target=_sweep_loop, name="cache-sweeper", daemon=True)
+            _sweeper.start()
+    return cache
+
+
+def cache_stats() -> dict:
+    return {name: cache.stats() for name, cache in _caches.items()}
+
+
+# ── Simple dict API (kept for existing callers) ──
 
 def get_cache(key: str, ttl: int = 300) -> Optional[dict]:
-    """Retorna datos cacheados si existen y no expiraron."""
-    if key in _cache:
-        ts, val = _cache[key]
-        if time.time() - ts < ttl:
-            return json.loads(val)
-        del _cache[key]
-    return None
+    """Retorna datos cacheados si existen y tienen menos de ttl segundos."""
+    entry = get_named_cache("default").get(key)
+    if entry is None:
+        return None
+    stored_at, data = entry
+    return data if time.monotonic() - stored_at < ttl else None
 
 
 def set_cache(key: str, data: dict, ttl: int = 300):
     """Guarda datos en cache con TTL."""
-    _cache[key] = (time.time(), json.dumps(data, default=str))
+    get_named_cache("default").set(key, (time.monotonic(), data), ttl)
+
+
+def delete_cache(key: str):
+    """Invalida una entrada."""
+    get_named_cache("default").delete(key)
+
+
+# ── Versioned payloads ──
+
+def cached_payload(tenant_id: str, key: tuple, loader: Callable[[], Any], version: Optional[int] = None):
+    """Return loader()'s result for (tenant, key) at the tenant's current data version.
+
+    The version is read before loading, so a write that lands mid-load makes
+    the stored payload unreachable (next read sees a newer version) instead of stale.
+    Callers that already read the version (ETag check) pass it in.
+    """
+    from app.core.database import get_data_version
+
+    if version is None:
+        version = get_data_version(tenant_id)
+    return get_named_cache("payloads", default_ttl=3600).get_or_load((tenant_id, version) + key, loader)
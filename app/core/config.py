@@ -10,6 +10,68 @@ class Settings(BaseSettings):
     JWT_ALGORITHM: str = "HS256"
     JWT_EXPIRE_DAYS: int = 7
 
+    # --- Storage ---
+    DATA_DIR: str = "/app/data"       # all SQLite files (override for local runs)
+    BACKUP_DIR: str = ""              # snapshots; defaults to DATA_DIR/backups
+
+    # --- Workers / shared state (see app/core/state.py) ---
+    WEB_CONCURRENCY: int = 1          # uvicorn worker processes (uvicorn reads the same env var)
+    STATE_BACKEND: str = "auto"       # memory | sqlite | auto (sqlite when WEB_CONCURRENCY > 1)
+
+    # --- In-process cache (see app/core/cache.py) ---
+    CACHE_MAX_ENTRIES: int = 10000        # per named cache
+    CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    CACHE_SWEEP_SECONDS: float = 60       # expired-entry sweep interval
+    CACHE_GENERATION_CHECK: float = 2.0   # seconds between cross-worker invalidation checks
+    CATALOG_MAX_BYTES: int = 128 * 1024 * 1024  # warm product indexes (services/catalog_index.py), LRU across tenants
+    CATALOG_MAX_TENANTS: int = 500
+    CATALOG_TTL: float = 6 * 3600
+
+    # --- SQLite pool ---
+    DB_MAX_READERS: int = 4           # read-only connections per DB file
+    DB_CHECKOUT_TIMEOUT: float = 10.0  # seconds waiting for a pooled connection
+    DB_MAX_OPEN: int = 256            # open DB files before LRU eviction
+    DB_IDLE_SECONDS: int = 600        # close DBs untouched for this long
+
+    # --- Blocking-call executors (see app/core/executor.py) ---
+    EXECUTOR_WORKERS: int = 8             # CRUD / short reads
+    EXECUTOR_ANALYTICS_WORKERS: int = 2   # full scans, pandas, PDFs
+    EXECUTOR_AI_WORKERS: int = 4          # Groq calls from the webhook
+    EXECUTOR_TENANT_CONCURRENCY: int = 4  # in-flight calls per tenant (0 = unlimited)
+
+    # --- DB maintenance (see app/core/maintenance.py) ---
+    MAINT_ENABLED: bool = True
+    MAINT_WINDOW_START: int = 2            # local hour, off-peak window start
+    MAINT_WINDOW_END: int = 5              # local hour, exclusive
+    MAINT_CONCURRENCY: int = 2             # DB files maintained in parallel
+    MAINT_TIME_BUDGET: float = 1800        # seconds per pass; the rest waits for the next window
+    MAINT_ANALYSIS_LIMIT: int = 1000       # rows sampled per index by ANALYZE
+    MAINT_VACUUM_PAGES: int = 5000         # max pages freed per incremental_vacuum
+    MAINT_FULL_VACUUM_RATIO: float = 0.2   # free-page ratio that triggers the one-time VACUUM of legacy files
+    MAINT_FULL_VACUUM_MAX_MB: int = 200    # never full-VACUUM files larger than this
+    CHANGE_LOG_RETENTION_DAYS: int = 30    # delta-sync entries kept; older clients reload the full inventory
+
+    # --- Movements ledger (see app/services/movement_writer.py) ---
+    MOVEMENT_DURABILITY: str = "wait"      # wait: return once the batch is committed | async: return once queued
+    MOVEMENT_FLUSH_MS: float = 5           # group-commit window after the first queued row
+    MOVEMENT_FLUSH_ROWS: int = 500         # or flush as soon as this many rows are queued
+    MOVEMENT_MAX_PENDING: int = 50000      # queued rows before async callers block (backpressure)
+
+    # --- Catalog import/export (see app/services/catalog_io.py) ---
+    IMPORT_MAX_MB: int = 50                # upload size limit
+    IMPORT_BATCH_ROWS: int = 1000          # rows per upsert transaction
+    IMPORT_MAX_ERRORS: int = 200           # row errors kept in the job report (all are counted)
+    IMPORT_CONCURRENCY: int = 2            # imports running at once per worker; the rest queue
+    EXPORT_PAGE_ROWS: int = 2000           # products read per query while streaming an export
+
+    # --- Backups (see app/core/backup.py) ---
+    BACKUP_ENABLED: bool = True
+    BACKUP_INTERVAL_HOURS: float = 24
+    BACKUP_KEEP: int = 7                   # snapshots retained
+    BACKUP_PAGES: int = 256                # pages copied per step
+    BACKUP_SLEEP: float = 0.02             # seconds between steps (throttle)
+    BACKUP_MAX_RESTARTS: int = 5           # then copy the file in a single step
+
     # --- WHATSAPP (Opcional) ---
     WHATSAPP_SERVER_URL: str = ""
     WHATSAPP_API_KEY: str = ""
@@ -1,184 +1,545 @@
 """
 SQLite database manager — one DB file per tenant + one admin DB.
-Connection pool: reuses open connections instead of opening/closing per request.
+Connection pool: per DB file, one serialized writer + a bounded set of WAL readers.
 """
 import sqlite3
 import os
 import logging
+import threading
+import time
+from collections import OrderedDict
 from contextlib import contextmanager
-from typing import Optional
+from typing import Callable, Optional
+from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
-DB_DIR = "/app/data"
+DB_DIR = settings.DATA_DIR
 os.makedirs(DB_DIR, exist_ok=True)
 
 ADMIN_DB = os.path.join(DB_DIR, "admin.db")
+STATE_DB = os.path.join(DB_DIR, "state.db")  # cross-worker shared state (app/core/state.py)
 
 
-class ConnectionPool:
-    """Pool of SQLite connections, one per database file."""
+def open_connection(db_path: str, readonly: bool = False) -> sqlite3.Connection:
+    """Open a SQLite connection with the app's standard PRAGMAs (WAL, FKs, busy timeout, incremental auto-vacuum)."""
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    if not readonly:
+        # Only takes effect on a brand-new file; older DBs are converted by maintenance
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA foreign_keys=ON")
+    conn.execute("PRAGMA busy_timeout=5000")
+    if readonly:
+        conn.execute("PRAGMA query_only=ON")
+    return conn
+
+
+class _DatabasePool:
+    """Connections for a single database file.
+
+    One writer connection, serialized by a re-entrant lock, plus a bounded set
+    of read-only connections. In WAL mode readers never block the writer, so
+    dashboard reads don't queue behind Telegram sales.
+    """
+
+    def __init__(self, db_path: str, max_readers: int, checkout_timeout: float):
+        self.db_path = db_path
+        self.max_readers = max_readers
+        self.checkout_timeout = checkout_timeout
+        self._writer: Optional[sqlite3.Connection] = None
+        self._writer_lock = threading.RLock()
+        self._writer_owner: Optional[int] = None
+        self._writer_depth = 0
+        self._idle_readers: list[sqlite3.Connection] = []
+        self._reader_slots = threading.BoundedSemaphore(max_readers)
+        self._readers_open = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # Guarded by the owning ConnectionPool's lock (used for eviction decisions)
+        self.active = 0
+        self.last_used = time.monotonic()
+        self.metrics = {
+            "writer_checkouts": 0,
+            "writer_waits": 0,
+            "writer_wait_ms": 0.0,
+            "reader_checkouts": 0,
+            "reader_waits": 0,
+            "reader_wait_ms": 0.0,
+            "timeouts": 0,
+        }
+
+    # ── Connection factory ──
 
-    def __init__(self):
-        self._connections: dict[str, sqlite3.Connection] = {}
+    def _connect(self, readonly: bool) -> sqlite3.Connection:
+        return open_connection(self.db_path, readonly=readonly)
 
-    def get(self, db_path: str) -> sqlite3.Connection:
-        """Return a healthy connection for db_path, reusing or creating one."""
-        conn = self._connections.get(db_path)
-        if conn is not None:
+    def _acquire(self, primitive, kind: str):
+        """Acquire a lock/semaphore, recording wait metrics. Raises TimeoutError."""
+        if primitive.acquire(blocking=False):
+            return
+        started = time.monotonic()
+        acquired = primitive.acquire(timeout=self.checkout_timeout)
+        waited_ms = (time.monotonic() - started) * 1000
+        with self._lock:
+            self.metrics[f"{kind}_waits"] += 1
+            self.metrics[f"{kind}_wait_ms"] += waited_ms
+            if not acquired:
+                self.metrics["timeouts"] += 1
+        if not acquired:
+            raise TimeoutError(f"Timeout esperando conexion {kind} para {self.db_path}")
+
+    # ── Writer ──
+
+    def _healthy_writer(self) -> sqlite3.Connection:
+        """Return the writer connection, recreating it if dead. Caller holds the writer lock."""
+        if self._writer is not None:
             try:
-                conn.execute("SELECT 1")
-                return conn
+                self._writer.execute("SELECT 1")
+                return self._writer
             except Exception:
-                logger.warning(f"Dead connection for {db_path}, recreating")
-        conn = self._create_connection(db_path)
-        self._connections[db_path] = conn
-        return conn
-
-    def _create_connection(self, db_path: str) -> sqlite3.Connection:
-        conn = sqlite3.connect(db_path, check_same_thread=False)
-        conn.row_factory = sqlite3.Row
-        conn.execute("PRAGMA journal_mode=WAL")
-        conn.execute("PRAGMA foreign_keys=ON")
-        conn.execute("PRAGMA busy_timeout=5000")
-        return conn
+                logger.warning(f"Dead connection for {self.db_path}, recreating")
+        self._writer = self._connect(readonly=False)
+        return self._writer
 
-    def close_all(self):
-        """Close all pooled connections gracefully."""
+    def acquire_writer(self, blocking: bool = True) -> Optional[sqlite3.Connection]:
+        """Check out the writer. Pair every successful call with release_writer().
+        Re-entrant: nested checkouts on the same thread share the outer transaction.
+        blocking=False returns None at once if another thread holds the writer."""
+        if blocking:
+            self._acquire(self._writer_lock, "writer")
+        elif not self._writer_lock.acquire(blocking=False):
+            return None
+        self._writer_owner = threading.get_ident()
+        self._writer_depth += 1
         with self._lock:
-            for path, conn in self._connections.items():
+            self.metrics["writer_checkouts"] += 1
+        try:
+            return self._healthy_writer() if self._writer_depth == 1 else self._writer
+        except Exception:
+            self.release_writer()
+            raise
+
+    def release_writer(self, commit: Optional[bool] = None):
+        """Return the writer. At the outermost level commit (True) or roll back (False);
+        None leaves the transaction state to the caller."""
+        try:
+            if self._writer_depth == 1 and commit is not None and self._writer is not None:
+                if commit:
+                    try:
+                        self._writer.commit()
+                    except Exception:
+                        self._writer.rollback()
+                        raise
+                else:
+                    self._writer.rollback()
+        finally:
+            self._writer_depth -= 1
+            if self._writer_depth == 0:
+                self._writer_owner = None
+            self._writer_lock.release()
+
+    @contextmanager
+    def writer(self):
+        """Serialized write connection. Commits on success, rolls back on error."""
+        conn = self.acquire_writer()
+        ok = False
+        try:
+            yield conn
+            ok = True
+        finally:
+            self.release_writer(commit=ok)
+
+    def _owns_writer(self) -> bool:
+        return self._writer_owner == threading.get_ident()
+
+    # ── Readers ──
+
+    @contextmanager
+    def reader(self):
+        """Read-only connection checked out for the current thread.
+        Inside a write transaction the writer is reused, so reads see pending writes."""
+        if self._owns_writer():
+            yield self._writer
+            return
+        current = getattr(self._local, "reader", None)
+        if current is not None:
+            yield current
+            return
+        conn = self.checkout_reader()
+        self._local.reader = conn
+        try:
+            yield conn
+        finally:
+            self._local.reader = None
+            self.checkin_reader(conn)
+
+    def checkout_reader(self) -> sqlite3.Connection:
+        """Take a reader slot and a read-only connection (blocking). Pair with checkin_reader()."""
+        if self._writer is None:
+            # First touch: let the writer create the file and switch it to WAL
+            with self.writer():
+                pass
+
+        self._acquire(self._reader_slots, "reader")
+        try:
+            conn = None
+            with self._lock:
+                self.metrics["reader_checkouts"] += 1
+                if self._idle_readers:
+                    conn = self._idle_readers.pop()
+            if conn is None:
+                conn = self._connect(readonly=True)
+                with self._lock:
+                    self._readers_open += 1
+            return conn
+        except Exception:
+            self._reader_slots.release()
+            raise
+
+    def checkin_reader(self, conn: sqlite3.Connection):
+        """End the connection's read transaction and return it (and its slot) to the pool."""
+        try:
+            conn.rollback()
+            with self._lock:
+                self._idle_readers.append(conn)
+        except Exception:
+            with self._lock:
+                self._readers_open -= 1
+        finally:
+            self._reader_slots.release()
+
+    # ── Lifecycle / metrics ──
+
+    def close(self, checkpoint: bool = False):
+        """Close every connection. With checkpoint=True the WAL is folded back
+        into the main file and truncated first, so no -wal/-shm is left behind."""
+        with self._writer_lock:
+            if self._writer is not None:
+                try:
+                    if checkpoint:
+                        self._writer.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                except Exception as e:
+                    logger.warning(f"Checkpoint failed for {self.db_path}: {e}")
+                try:
+                    self._writer.close()
+                except Exception:
+                    pass
+                self._writer = None
+        with self._lock:
+            for conn in self._idle_readers:
                 try:
                     conn.close()
                 except Exception:
                     pass
-            self._connections.clear()
+            self._readers_open -= len(self._idle_readers)
+            self._idle_readers.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self.metrics,
+                "writer_open": self._writer is not None,
+                "readers_open": self._readers_open,
+                "readers_idle": len(self._idle_readers),
+                "max_readers": self.max_readers,
+            }
+
+
+class ConnectionPool:
+    """Per-database pools: one serialized writer + up to `max_readers` readers per file.
+
+    At most `max_open_dbs` files stay open. Least recently used databases are
+    checkpointed and closed when the budget is exceeded, and any database idle
+    for `idle_seconds` is closed by the periodic sweep, so open file handles
+    and WAL/SHM mappings stay flat as the tenant count grows.
+    """
+
+    SWEEP_INTERVAL = 30  # seconds between opportunistic idle sweeps
+
+    def __init__(self, max_readers: int = 4, checkout_timeout: float = 10.0,
+                 max_open_dbs: int = 256, idle_seconds: float = 600):
+        self.max_readers = max_readers
+        self.checkout_timeout = checkout_timeout
+        self.max_open_dbs = max_open_dbs
+        self.idle_seconds = idle_seconds
+        self._pools: OrderedDict[str, _DatabasePool] = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+        self._eviction_listeners: list[Callable[[str], None]] = []
+        self.counters = {"opens": 0, "hits": 0, "evictions": 0, "idle_evictions": 0}
+
+    def add_eviction_listener(self, callback: Callable[[str], None]):
+        """Register callback(db_path), called after a database is closed by the pool."""
+        self._eviction_listeners.append(callback)
+
+    # ── Checkout bookkeeping ──
+
+    def _acquire_pool(self, db_path: str) -> _DatabasePool:
+        """Return the pool for db_path marked as in use (never evicted while active)."""
+        evicted: list[_DatabasePool] = []
+        with self._lock:
+            pool = self._pools.get(db_path)
+            if pool is None:
+                pool = _DatabasePool(db_path, self.max_readers, self.checkout_timeout)
+                self._pools[db_path] = pool
+                self.counters["opens"] += 1
+            else:
+                self._pools.move_to_end(db_path)
+                self.counters["hits"] += 1
+            pool.active += 1
+            pool.last_used = time.monotonic()
+            evicted.extend(self._over_budget_locked())
+            if pool.last_used - self._last_sweep >= self.SWEEP_INTERVAL:
+                self._last_sweep = pool.last_used
+                evicted.extend(self._idle_locked(pool.last_used))
+        self._close_evicted(evicted)
+        return pool
+
+    def _release_pool(self, pool: _DatabasePool):
+        with self._lock:
+            pool.active -= 1
+            pool.last_used = time.monotonic()
+
+    def acquire_writer(self, db_path: str) -> tuple[_DatabasePool, sqlite3.Connection]:
+        """Explicit writer checkout for callers that can't use a context manager
+        (the SQLAlchemy engines). Pair with release_writer(pool)."""
+        pool = self._acquire_pool(db_path)
+        try:
+            return pool, pool.acquire_writer()
+        except Exception:
+            self._release_pool(pool)
+            raise
+
+    def release_writer(self, pool: _DatabasePool, commit: Optional[bool] = None):
+        try:
+            pool.release_writer(commit)
+        finally:
+            self._release_pool(pool)
+
+    def acquire_reader(self, db_path: str) -> tuple[_DatabasePool, sqlite3.Connection]:
+        """Explicit reader checkout (read-only SQLAlchemy sessions). Pair with release_reader()."""
+        pool = self._acquire_pool(db_path)
+        try:
+            return pool, pool.checkout_reader()
+        except Exception:
+            self._release_pool(pool)
+            raise
+
+    def release_reader(self, pool: _DatabasePool, conn: sqlite3.Connection):
+        try:
+            pool.checkin_reader(conn)
+        finally:
+            self._release_pool(pool)
+
+    @contextmanager
+    def writer(self, db_path: str):
+        """Context manager yielding the serialized writer for db_path."""
+        pool = self._acquire_pool(db_path)
+        try:
+            with pool.writer() as conn:
+                yield conn
+        finally:
+            self._release_pool(pool)
+
+    @contextmanager
+    def try_writer(self, db_path: str):
+        """writer() that never waits: yields None if another thread holds the writer."""
+        pool = self._acquire_pool(db_path)
+        try:
+            conn = pool.acquire_writer(blocking=False)
+            if conn is None:
+                yield None
+                return
+            ok = False
+            try:
+                yield conn
+                ok = True
+            finally:
+                pool.release_writer(commit=ok)
+        finally:
+            self._release_pool(pool)
+
+    @contextmanager
+    def reader(self, db_path: str):
+        """Context manager yielding a read-only connection for db_path."""
+        pool = self._acquire_pool(db_path)
+        try:
+            with pool.reader() as conn:
+                yield conn
+        finally:
+            self._release_pool(pool)
+
+    def owns_writer(self, db_path: str) -> bool:
+        """True if the calling thread currently holds db_path's writer (is inside its transaction)."""
+        with self._lock:
+            pool = self._pools.get(db_path)
+        return pool is not None and pool._owns_writer()
+
+    # ── Eviction ──
+
+    def _over_budget_locked(self) -> list[_DatabasePool]:
+        """Pop least recently used idle pools until within max_open_dbs. Caller holds _lock."""
+        evicted = []
+        if len(self._pools) <= self.max_open_dbs:
+            return evicted
+        for path in list(self._pools):
+            if len(self._pools) <= self.max_open_dbs:
+                break
+            pool = self._pools[path]
+            if pool.active == 0:
+                evicted.append(self._pools.pop(path))
+                self.counters["evictions"] += 1
+        return evicted
+
+    def _idle_locked(self, now: float) -> list[_DatabasePool]:
+        """Pop pools unused for idle_seconds. Caller holds _lock."""
+        evicted = []
+        for path in list(self._pools):
+            pool = self._pools[path]
+            if now - pool.last_used < self.idle_seconds:
+                break  # OrderedDict is in LRU order: the rest are newer
+            if pool.active == 0:
+                evicted.append(self._pools.pop(path))
+                self.counters["idle_evictions"] += 1
+        return evicted
+
+    def _close_evicted(self, evicted: list[_DatabasePool]):
+        for pool in evicted:
+            pool.close(checkpoint=True)
+            logger.info(f"Evicted DB from pool: {os.path.basename(pool.db_path)}")
+            for callback in self._eviction_listeners:
+                try:
+                    callback(pool.db_path)
+                except Exception as e:
+                    logger.warning(f"Eviction listener failed for {pool.db_path}: {e}")
+
+    def evict_idle(self) -> int:
+        """Close every database idle for longer than idle_seconds. Returns how many."""
+        with self._lock:
+            self._last_sweep = time.monotonic()
+            evicted = self._idle_locked(self._last_sweep)
+        self._close_evicted(evicted)
+        return len(evicted)
+
+    def evict(self, db_path: str) -> bool:
+        """Checkpoint and close db_path now (e.g. before deleting the file).
+        Returns False if it is not open or currently checked out."""
+        with self._lock:
+            pool = self._pools.get(db_path)
+            if pool is None or pool.active:
+                return False
+            del self._pools[db_path]
+            self.counters["evictions"] += 1
+        self._close_evicted([pool])
+        return True
+
+    # ── Metrics / lifecycle ──
+
+    def stats(self) -> dict:
+        """Open/eviction counters plus checkout metrics per database file."""
+        with self._lock:
+            pools = list(self._pools.values())
+            counters = dict(self.counters)
+        lookups = counters["opens"] + counters["hits"]
+        return {
+            "summary": {
+                **counters,
+                "open_dbs": len(pools),
+                "max_open_dbs": self.max_open_dbs,
+                "hit_rate": round(counters["hits"] / lookups, 4) if lookups else 0.0,
+            },
+            "databases": {os.path.basename(p.db_path): p.stats() for p in pools},
+        }
+
+    def close_all(self):
+        """Close all pooled connections gracefully."""
+        with self._lock:
+            pools = list(self._pools.values())
+            self._pools.clear()
+        for pool in pools:
+            pool.close(checkpoint=True)
 
 
 # Module-level pool — singleton for SQLite is acceptable
 # (one pool per process, shared across all requests)
-_pool = ConnectionPool()
+_pool = ConnectionPool(
+    max_readers=settings.DB_MAX_READERS,
+    checkout_timeout=settings.DB_CHECKOUT_TIMEOUT,
+    max_open_dbs=settings.DB_MAX_OPEN,
+    idle_seconds=settings.DB_IDLE_SECONDS,
+)
+
+
+def pool_stats() -> dict:
+    """Checkout metrics for every pooled database file."""
+    return _pool.stats()
 
 
 def get_db_path(tenant_id: str) -> str:
     return os.path.join(DB_DIR, f"inventory_{tenant_id}.db")
 
 
+def close_tenant_db(tenant_id: str) -> bool:
+    """Checkpoint and close the tenant's pooled connections."""
+    return _pool.evict(get_db_path(tenant_id))
+
+
 @contextmanager
 def get_conn(tenant_id: str):
-    """Yields a pooled SQLite connection for the tenant. Commits on success, rollbacks on error."""
-    db_path = get_db_path(tenant_id)
-    conn = _pool.get(db_path)
-    try:
+    """Yields the tenant's pooled writer connection. Commits on success, rollbacks on error."""
+    with _pool.writer(get_db_path(tenant_id)) as conn:
         yield conn
-        conn.commit()
-    except Exception:
-        conn.rollback()
-        raise
+
+
+@contextmanager
+def try_get_conn(tenant_id: str):
+    """get_conn() without waiting: yields None while another thread holds the tenant's writer."""
+    with _pool.try_writer(get_db_path(tenant_id)) as conn:
+        yield conn
+
+
+def in_write_transaction(tenant_id: str) -> bool:
+    """True inside get_conn() (or an ORM write) for this tenant on the current thread."""
+    return _pool.owns_writer(get_db_path(tenant_id))
+
+
+@contextmanager
+def get_read_conn(tenant_id: str):
+    """Yields a read-only pooled connection for the tenant (concurrent with writes)."""
+    with _pool.reader(get_db_path(tenant_id)) as conn:
+        yield conn
+
+
+def get_data_version(tenant_id: str) -> int:
+    """Tenant write counter, bumped by triggers on every data table (migration v4)."""
+    with get_read_conn(tenant_id) as conn:
+        row = conn.execute("SELECT version FROM data_version WHERE id = 1").fetchone()
+    return row[0] if row else 0
 
 
 @contextmanager
 def get_admin_conn():
-    """Yields a pooled SQLite connection for the admin DB."""
-    conn = _pool.get(ADMIN_DB)
-    try:
+    """Yields the pooled writer connection for the admin DB."""
+    with _pool.writer(ADMIN_DB) as conn:
+        yield conn
+
+
+@contextmanager
+def get_admin_read_conn():
+    """Yields a read-only pooled connection for the admin DB."""
+    with _pool.reader(ADMIN_DB) as conn:
         yield conn
-        conn.commit()
-    except Exception:
-        conn.rollback()
-        raise
 
 
 def init_admin_db():
-    """Create admin tables if they don't exist."""
-    conn = _pool.get(ADMIN_DB)
-    conn.execute("""
-        CREATE TABLE IF NOT EXISTS tenants (
-            id TEXT PRIMARY KEY,
-            pyme_name TEXT NOT NULL,
-            token TEXT NOT NULL UNIQUE,
-            created_at TEXT DEFAULT (datetime('now', 'localtime'))
-        )
-    """)
-    # Ensure extra columns exist (safe idempotent ALTER)
-    for col, col_type in [
-        ("telegram_id", "TEXT DEFAULT ''"),
-        ("tenant_id", "TEXT DEFAULT ''"),
-        ("sheet_id", "TEXT DEFAULT ''"),
-        ("business_type", "TEXT DEFAULT ''"),
-        ("nit", "TEXT DEFAULT ''"),
-        ("address", "TEXT DEFAULT ''"),
-        ("description", "TEXT DEFAULT ''"),
-    ]:
-        try:
-            conn.execute(f"ALTER TABLE tenants ADD COLUMN {col} {col_type}")
-        except sqlite3.OperationalError:
-            pass
-    conn.execute("""
-        CREATE TABLE IF NOT EXISTS telegram_users (
-            telegram_id TEXT PRIMARY KEY,
-            tenant_id TEXT NOT NULL,
-            linked_at TEXT DEFAULT (datetime('now', 'localtime')),
-            FOREIGN KEY (tenant_id) REFERENCES tenants(id)
-        )
-    """)
-    conn.commit()
+    """Bring admin.db to the latest schema version (runs once per process)."""
+    from app.core.migrations import ensure_admin_db
+    ensure_admin_db()
 
 
 def init_tenant_db(tenant_id: str):
-    """Create tenant-specific tables (products + movements) if they don't exist."""
-    db_path = get_db_path(tenant_id)
-    conn = _pool.get(db_path)
-    conn.execute("""
-        CREATE TABLE IF NOT EXISTS products (
-            uuid TEXT, sku TEXT, name TEXT, category TEXT, stock INTEGER, unit TEXT,
-            cost REAL, price REAL, expiration_date TEXT, location TEXT,
-            invima TEXT, lote TEXT,
-            created_at TEXT DEFAULT (datetime('now', 'localtime')),
-            updated_at TEXT DEFAULT (datetime('now', 'localtime'))
-        )
-    """)
-    conn.execute("""
-        CREATE TABLE IF NOT EXISTS movements (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            type TEXT, sku TEXT, name TEXT, quantity INTEGER,
-            user TEXT, notes TEXT,
-            created_at TEXT DEFAULT (datetime('now', 'localtime'))
-        )
-    """)
-    conn.execute("""
-        CREATE TABLE IF NOT EXISTS suppliers (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            contact TEXT,
-            phone TEXT,
-            email TEXT,
-            address TEXT,
-            notes TEXT,
-            created_at TEXT DEFAULT (datetime('now', 'localtime')),
-            updated_at TEXT DEFAULT (datetime('now', 'localtime'))
-        )
-    """)
-    conn.execute("""
-        CREATE TABLE IF NOT EXISTS custom_columns (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL UNIQUE,
-            col_type TEXT NOT NULL DEFAULT 'text' CHECK(col_type IN ('text','number','date')),
-            created_at TEXT DEFAULT (datetime('now', 'localtime'))
-        )
-    """)
-    conn.execute("""
-        CREATE TABLE IF NOT EXISTS product_custom_values (
-            product_sku TEXT NOT NULL,
-            column_id INTEGER NOT NULL,
-            value TEXT,
-            PRIMARY KEY (product_sku, column_id),
-            FOREIGN KEY (column_id) REFERENCES custom_columns(id) ON DELETE CASCADE
-        )
-    """)
-    conn.commit()
-    # SQLAlchemy tables (non-blocking)
-    try:
-        from app.database_sa import create_all
-        create_all(tenant_id)
-    except Exception:
-        pass
+    """Bring the tenant DB to the latest schema version (runs once per process)."""
+    from app.core.migrations import ensure_tenant_db
+    ensure_tenant_db(tenant_id)
@@ -0,0 +1,141 @@
+"""
+Bounded executors for blocking work called from async endpoints.
+sqlite3, SQLAlchemy, pandas and the Groq client are all synchronous; running
+them on the event loop stalls every other tenant and the Telegram webhook.
+`run_db` hands the call to a lane (a fixed-size thread pool) and caps how many
+calls a single tenant can have in flight, so one heavy dashboard can't fill a lane.
+"""
+import asyncio
+import contextvars
+import functools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Callable, Optional, TypeVar
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+DEFAULT = "default"      # CRUD and short reads
+ANALYTICS = "analytics"  # full scans, pandas reports, PDFs
+AI = "ai"                # outbound LLM calls
+
+
+class _Lane:
+    """One bounded thread pool plus queue-depth metrics."""
+
+    def __init__(self, name: str, workers: int):
+        self.name = name
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"run-{name}")
+        self._lock = threading.Lock()
+        self.metrics = {
+            "submitted": 0, "completed": 0, "failed": 0,
+            "queued": 0, "running": 0, "max_queued": 0,
+            "wait_ms": 0.0, "max_wait_ms": 0.0, "run_ms": 0.0,
+        }
+
+    def _run(self, enqueued: float, call: Callable[[], T]) -> T:
+        started = time.perf_counter()
+        waited = (started - enqueued) * 1000
+        with self._lock:
+            m = self.metrics
+            m["queued"] -= 1
+            m["running"] += 1
+            m["wait_ms"] += waited
+            m["max_wait_ms"] = max(m["max_wait_ms"], waited)
+        ok = False
+        try:
+            result = call()
+            ok = True
+            return result
+        finally:
+            with self._lock:
+                m["running"] -= 1
+                m["completed" if ok else "failed"] += 1
+                m["run_ms"] += (time.perf_counter() - started) * 1000
+
+    async def submit(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        # Keep contextvars (request-scoped logging etc.) visible in the worker
+        ctx = contextvars.copy_context()
+        call = functools.partial(ctx.run, fn, *args, **kwargs)
+        with self._lock:
+            m = self.metrics
+            m["submitted"] += 1
+            m["queued"] += 1
+            m["max_queued"] = max(m["max_queued"], m["queued"])
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._run, time.perf_counter(), call)
+
+    def stats(self) -> dict:
+        with self._lock:
+            m = dict(self.metrics)
+        done = m["completed"] + m["failed"]
+        started = done + m["running"]
+        m["workers"] = self.workers
+        m["avg_wait_ms"] = round(m["wait_ms"] / started, 2) if started else 0.0
+        m["avg_run_ms"] = round(m["run_ms"] / done, 2) if done else 0.0
+        m["wait_ms"] = round(m["wait_ms"], 2)
+        m["max_wait_ms"] = round(m["max_wait_ms"], 2)
+        m["run_ms"] = round(m["run_ms"], 2)
+        return m
+
+
+_lanes: dict[str, _Lane] = {
+    DEFAULT: _Lane(DEFAULT, settings.EXECUTOR_WORKERS),
+    ANALYTICS: _Lane(ANALYTICS, settings.EXECUTOR_ANALYTICS_WORKERS),
+    AI: _Lane(AI, settings.EXECUTOR_AI_WORKERS),
+}
+
+# Per-tenant in-flight cap. Semaphores are keyed by event loop too, since an
+# asyncio.Semaphore binds to the first loop that waits on it.
+_tenant_slots: dict[tuple[int, str], list] = {}  # key -> [semaphore, users]
+_tenant_waits = 0
+
+
+@asynccontextmanager
+async def _tenant_slot(tenant_id: Optional[str]):
+    global _tenant_waits
+    limit = settings.EXECUTOR_TENANT_CONCURRENCY
+    if not tenant_id or limit <= 0:
+        yield
+        return
+    key = (id(asyncio.get_running_loop()), tenant_id)
+    slot = _tenant_slots.get(key)
+    if slot is None:
+        slot = _tenant_slots[key] = [asyncio.Semaphore(limit), 0]
+    slot[1] += 1
+    sem = slot[0]
+    try:
+        if sem.locked():
+            _tenant_waits += 1
+        async with sem:
+            yield
+    finally:
+        slot[1] -= 1
+        if slot[1] == 0:
+            _tenant_slots.pop(key, None)
+
+
+async def run_db(fn: Callable[..., T], *args, lane: str = DEFAULT,
+                 tenant_id: Optional[str] = None, **kwargs) -> T:
+    """Run a blocking callable on `lane` and await its result.
+
+    With tenant_id, at most EXECUTOR_TENANT_CONCURRENCY calls of that tenant
+    occupy workers at once; the rest wait on the event loop, not in a thread.
+    """
+    async with _tenant_slot(tenant_id):
+        return await _lanes[lane].submit(fn, *args, **kwargs)
+
+
+def executor_stats() -> dict:
+    """Queue depth, waits and run times per lane."""
+    return {
+        "lanes": {name: lane.stats() for name, lane in _lanes.items()},
+        "tenants_in_flight": sum(users for _, users in _tenant_slots.values()),
+        "tenant_waits": _tenant_waits,
+    }
@@ -0,0 +1,271 @@
+"""
+Background maintenance for every SQLite file under DB_DIR.
+
+Once per off-peak window the scheduler walks the tenant DBs (inventory_,
+orders_, usage_) plus admin.db, least recently maintained first, and for each:
+  - ANALYZE (bounded) + PRAGMA optimize → planner statistics
+  - incremental_vacuum        → returns free pages to the filesystem
+  - wal_checkpoint(TRUNCATE)  → keeps -wal files from growing forever
+Work runs on short-lived connections with a concurrency limit and a time
+budget; files not reached are first in line next window. Each result is
+stored in admin.db (db_maintenance_log) for size/fragmentation trends.
+"""
+import datetime
+import glob
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from typing import Optional
+
+from app.core.config import settings
+from app.core.database import DB_DIR, ADMIN_DB, get_admin_conn, get_admin_read_conn, open_connection, init_admin_db
+
+logger = logging.getLogger(__name__)
+
+DB_PATTERNS = ("inventory_*.db", "orders_*.db", "usage_*.db")
+
+
+def _file_size(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def list_databases() -> list[str]:
+    """Every tenant DB file plus admin.db."""
+    paths = []
+    for pattern in DB_PATTERNS:
+        paths.extend(glob.glob(os.path.join(DB_DIR, pattern)))
+    if os.path.exists(ADMIN_DB):
+        paths.append(ADMIN_DB)
+    return sorted(paths)
+
+
+def maintain_db(db_path: str) -> dict:
+    """Analyze, vacuum and checkpoint one DB file. Never raises; errors are recorded."""
+    started = time.monotonic()
+    result = {
+        "db_file": os.path.basename(db_path),
+        "started_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "size_before": _file_size(db_path),
+        "wal_before": _file_size(db_path + "-wal"),
+        "actions": [],
+        "error": None,
+    }
+    try:
+        with closing(open_connection(db_path)) as conn:
+            result["page_count"] = conn.execute("PRAGMA page_count").fetchone()[0]
+            freelist = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            result["freelist_before"] = freelist
+
+            # Tenant DBs: drop delta-sync entries past retention (clients behind them get reset=true)
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'change_log'").fetchone():
+                with conn:
+                    pruned = conn.execute(
+                        "DELETE FROM change_log WHERE changed_at < datetime('now', 'localtime', ?)",
+                        (f"-{settings.CHANGE_LOG_RETENTION_DAYS} days",)
+                    ).rowcount
+                    if pruned:
+                        # The feed answer for old cursors changed: retire payloads cached on the data version
+                        conn.execute("UPDATE data_version SET version = version + 1 WHERE id = 1")
+                if pruned:
+                    result["actions"].append("prune_change_log")
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'products_fts'").fetchone():
+                with conn:
+                    conn.execute("INSERT INTO products_fts (products_fts) VALUES ('optimize')")
+                result["actions"].append("fts_optimize")
+
+            # analysis_limit keeps ANALYZE cheap on large tables (approximate stats)
+            conn.execute(f"PRAGMA analysis_limit={settings.MAINT_ANALYSIS_LIMIT}")
+            conn.execute("ANALYZE")
+            conn.execute("PRAGMA optimize")
+            result["actions"].append("analyze")
+
+            auto_vacuum = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+            page_count = result["page_count"] or 1
+            if auto_vacuum == 2:
+                if freelist:
+                    conn.execute(f"PRAGMA incremental_vacuum({min(freelist, settings.MAINT_VACUUM_PAGES)})")
+                    result["actions"].append("incremental_vacuum")
+            elif (freelist / page_count >= settings.MAINT_FULL_VACUUM_RATIO
+                  and result["size_before"] <= settings.MAINT_FULL_VACUUM_MAX_MB * 1024 * 1024):
+                # Legacy file without auto_vacuum: one full VACUUM converts it,
+                # later runs only need incremental_vacuum
+                conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+                conn.execute("VACUUM")
+                result["actions"].append("vacuum")
+
+            result["freelist_after"] = conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+            # Last, so the pages written by ANALYZE/vacuum are folded in too
+            busy, _, _ = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+            result["actions"].append("checkpoint" if not busy else "checkpoint-busy")
+    except Exception as e:
+        result["error"] = str(e)
+        logger.warning(f"Maintenance failed for {db_path}: {e}")
+    result["size_after"] = _file_size(db_path)
+    result["wal_after"] = _file_size(db_path + "-wal")
+    result["duration_ms"] = round((time.monotonic() - started) * 1000, 1)
+    return result
+
+
+def _record(results: list[dict]):
+    if not results:
+        return
+    init_admin_db()
+    with get_admin_conn() as conn:
+        conn.executemany(
+            "INSERT INTO db_maintenance_log (db_file, started_at, duration_ms, size_before, size_after, "
+            "wal_before, wal_after, page_count, freelist_before, freelist_after, actions, error) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(r["db_file"], r["started_at"], r["duration_ms"], r["size_before"], r["size_after"],
+              r["wal_before"], r["wal_after"], r.get("page_count"), r.get("freelist_before"),
+              r.get("freelist_after"), ",".join(r["actions"]), r["error"]) for r in results]
+        )
+
+
+def _last_maintained() -> dict[str, str]:
+    init_admin_db()
+    with get_admin_read_conn() as conn:
+        rows = conn.execute(
+            "SELECT db_file, max(started_at) AS last FROM db_maintenance_log GROUP BY db_file"
+        ).fetchall()
+    return {r["db_file"]: r["last"] for r in rows}
+
+
+def maintenance_history(db_file: Optional[str] = None, limit: int = 50) -> list[dict]:
+    """Latest log rows, optionally for a single file (trend view)."""
+    init_admin_db()
+    sql = "SELECT * FROM db_maintenance_log"
+    params: list = []
+    if db_file:
+        sql += " WHERE db_file = ?"
+        params.append(db_file)
+    sql += " ORDER BY id DESC LIMIT ?"
+    params.append(limit)
+    with get_admin_read_conn() as conn:
+        return [dict(r) for r in conn.execute(sql, params).fetchall()]
+
+
+class MaintenanceScheduler:
+    """Daemon thread that runs a maintenance pass once per off-peak window."""
+
+    def __init__(self, window_start: int, window_end: int, concurrency: int,
+                 time_budget: float, check_interval: float = 300):
+        self.window_start = window_start
+        self.window_end = window_end
+        self.concurrency = max(1, concurrency)
+        self.time_budget = time_budget
+        self.check_interval = check_interval
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._run_lock = threading.Lock()
+        self._last_window: Optional[datetime.date] = None
+        self.status = {"running": False, "last_started": None, "last_finished": None,
+                       "last_processed": 0, "last_pending": 0, "last_failed": 0}
+
+    # ── Window ──
+
+    def in_window(self, now: Optional[datetime.datetime] = None) -> bool:
+        hour = (now or datetime.datetime.now()).hour
+        if self.window_start <= self.window_end:
+            return self.window_start <= hour < self.window_end
+        return hour >= self.window_start or hour < self.window_end  # e.g. 23 → 4
+
+    def _window_id(self, now: datetime.datetime) -> datetime.date:
+        # A window crossing midnight belongs to the day it started
+        if self.window_start > self.window_end and now.hour < self.window_end:
+            return (now - datetime.timedelta(days=1)).date()
+        return now.date()
+
+    # ── Run ──
+
+    def run_once(self, time_budget: Optional[float] = None) -> dict:
+        """One pass over all DBs, least recently maintained first, within the time budget."""
+        if not self._run_lock.acquire(blocking=False):
+            return {"status": "already_running"}
+        try:
+            budget = self.time_budget if time_budget is None else time_budget
+            deadline = time.monotonic() + budget
+            last = _last_maintained()
+            paths = sorted(list_databases(), key=lambda p: last.get(os.path.basename(p), ""))
+            self.status.update(running=True, last_started=datetime.datetime.now().isoformat(timespec="seconds"))
+            results: list[dict] = []
+            results_lock = threading.Lock()
+
+            def _one(path: str):
+                if self._stop.is_set() or time.monotonic() >= deadline:
+                    return
+                r = maintain_db(path)
+                with results_lock:
+                    results.append(r)
+
+            with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="maintenance") as executor:
+                list(executor.map(_one, paths))
+            _record(results)
+
+            failed = sum(1 for r in results if r["error"])
+            self.status.update(
+                last_finished=datetime.datetime.now().isoformat(timespec="seconds"),
+                last_processed=len(results), last_pending=len(paths) - len(results), last_failed=failed,
+            )
+            logger.info(f"DB maintenance: {len(results)}/{len(paths)} files, {failed} failed")
+            return {"status": "done", "processed": len(results), "pending": len(paths) - len(results),
+                    "failed": failed}
+        finally:
+            self.status["running"] = False
+            self._run_lock.release()
+
+    def _loop(self):
+        while not self._stop.wait(self.check_interval):
+            now = datetime.datetime.now()
+            if not self.in_window(now) or self._last_window == self._window_id(now):
+                continue
+            self._last_window = self._window_id(now)
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"DB maintenance pass failed: {e}")
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="db-maintenance", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def run_in_background(self) -> bool:
+        """Trigger a pass now (admin endpoint). False if one is already running."""
+        if self.status["running"]:
+            return False
+        threading.Thread(target=self.run_once, name="db-maintenance-manual", daemon=True).start()
+        return True
+
+    def stats(self) -> dict:
+        return {
+            **self.status,
+            "enabled": settings.MAINT_ENABLED,
+            "window": f"{self.window_start:02d}:00-{self.window_end:02d}:00",
+            "concurrency": self.concurrency,
+            "time_budget_s": self.time_budget,
+        }
+
+
+scheduler = MaintenanceScheduler(
+    window_start=settings.MAINT_WINDOW_START,
+    window_end=settings.MAINT_WINDOW_END,
+    concurrency=settings.MAINT_CONCURRENCY,
+    time_budget=settings.MAINT_TIME_BUDGET,
+)
+
+
+def start_maintenance_scheduler():
+    if settings.MAINT_ENABLED:
+        scheduler.start()
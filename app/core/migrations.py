@@ -0,0 +1,609 @@
+"""
+Versioned schema migrations keyed on PRAGMA user_version.
+
+Each database is migrated at most once per process: after the first check
+the path is remembered, so request setup (InventoryService, TenantService)
+no longer runs DDL. Existing tenant files can be upgraded in a background
+batch at startup instead of on their first request.
+"""
+import glob
+import logging
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from typing import Callable
+
+from app.core.database import DB_DIR, ADMIN_DB, STATE_DB, _pool, get_db_path, get_conn, get_admin_conn, open_connection
+
+logger = logging.getLogger(__name__)
+
+Migration = Callable[[sqlite3.Connection], None]
+
+
+# ── Helpers ──
+
+def _columns(conn: sqlite3.Connection, table: str) -> set[str]:
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})").fetchall()}
+
+
+def _add_missing_columns(conn: sqlite3.Connection, table: str, columns: list[tuple[str, str]]):
+    """ALTER TABLE ADD COLUMN only for columns that don't exist yet."""
+    existing = _columns(conn, table)
+    for col, col_type in columns:
+        if col not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {col} {col_type}")
+
+
+def _create_orm_tables(conn: sqlite3.Connection):
+    """Emit CREATE TABLE IF NOT EXISTS for the SQLAlchemy models on this connection,
+    so they are part of the same migration transaction."""
+    from sqlalchemy.dialects import sqlite as sqlite_dialect
+    from sqlalchemy.schema import CreateIndex, CreateTable
+    from app.database_sa import Base
+    import app.models  # noqa: F401 — registers clients/remisiones on Base.metadata
+
+    dialect = sqlite_dialect.dialect()
+    for table in Base.metadata.sorted_tables:
+        conn.execute(str(CreateTable(table, if_not_exists=True).compile(dialect=dialect)))
+        for index in table.indexes:
+            conn.execute(str(CreateIndex(index, if_not_exists=True).compile(dialect=dialect)))
+
+
+# ── Search keys ──
+# products_fts stores names with these accents folded (the trigram tokenizer only
+# folds case before SQLite 3.45), and queries go through fold_text(), so
+# "jabon" finds "Jabón". Triggers can't call Python, hence the SQL twin.
+
+# Spanish accents only: every pair is one more nested replace() in the triggers
+_FOLD_FROM = "áéíóúüñÁÉÍÓÚÜÑ"
+_FOLD_TO = "aeiouunAEIOUUN"
+_FOLD_TABLE = str.maketrans(_FOLD_FROM, _FOLD_TO)
+
+
+def fold_text(text) -> str:
+    return str(text or "").translate(_FOLD_TABLE).lower().strip()
+
+
+def _fold_sql(expr: str) -> str:
+    for src, dst in zip(_FOLD_FROM, _FOLD_TO):
+        expr = f"replace({expr}, '{src}', '{dst}')"
+    return expr
+
+
+# product_codes holds sku/invima/lote as code_key(): case, spaces, dashes, dots
+# and slashes don't matter, and a spreadsheet ".0" suffix is dropped.
+
+_CODE_STRIP = " -./"
+
+
+def code_key(text) -> str:
+    text = str(text or "").strip()
+    if text.endswith(".0"):
+        text = text[:-2]
+    for ch in _CODE_STRIP:
+        text = text.replace(ch, "")
+    return text.encode().lower().decode()  # ASCII-only lowercase, like SQLite lower()
+
+
+def _code_sql(expr: str) -> str:
+    expr = f"trim(coalesce({expr}, ''))"
+    expr = f"CASE WHEN {expr} LIKE '%.0' THEN substr({expr}, 1, length({expr}) - 2) ELSE {expr} END"
+    for ch in _CODE_STRIP:
+        expr = f"replace({expr}, '{ch}', '')"
+    return f"lower({expr})"
+
+
+# ── Admin DB ──
+
+def _admin_v1_baseline(conn: sqlite3.Connection):
+    """tenants (+ profile columns) and telegram_users."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS tenants (
+            id TEXT PRIMARY KEY,
+            pyme_name TEXT NOT NULL,
+            token TEXT NOT NULL UNIQUE,
+            created_at TEXT DEFAULT (datetime('now', 'localtime'))
+        )
+    """)
+    _add_missing_columns(conn, "tenants", [
+        ("telegram_id", "TEXT DEFAULT ''"),
+        ("tenant_id", "TEXT DEFAULT ''"),
+        ("sheet_id", "TEXT DEFAULT ''"),
+        ("business_type", "TEXT DEFAULT ''"),
+        ("nit", "TEXT DEFAULT ''"),
+        ("address", "TEXT DEFAULT ''"),
+        ("description", "TEXT DEFAULT ''"),
+    ])
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS telegram_users (
+            telegram_id TEXT PRIMARY KEY,
+            tenant_id TEXT NOT NULL,
+            linked_at TEXT DEFAULT (datetime('now', 'localtime')),
+            FOREIGN KEY (tenant_id) REFERENCES tenants(id)
+        )
+    """)
+
+
+def _admin_v2_maintenance_log(conn: sqlite3.Connection):
+    """Per-run results of the DB maintenance scheduler (size/fragmentation trends)."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS db_maintenance_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            db_file TEXT NOT NULL,
+            started_at TEXT NOT NULL,
+            duration_ms REAL,
+            size_before INTEGER,
+            size_after INTEGER,
+            wal_before INTEGER,
+            wal_after INTEGER,
+            page_count INTEGER,
+            freelist_before INTEGER,
+            freelist_after INTEGER,
+            actions TEXT,
+            error TEXT
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_maintenance_file_ts ON db_maintenance_log(db_file, started_at)")
+
+
+def _admin_v3_telegram_users(conn: sqlite3.Connection):
+    """tenants.id = tenant_id (was never set) and telegram_users filled from the CSV column."""
+    conn.execute("UPDATE tenants SET id = tenant_id WHERE (id IS NULL OR id = '') AND tenant_id != ''")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tenants_tenant_id ON tenants(tenant_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_telegram_users_tenant ON telegram_users(tenant_id)")
+    rows = conn.execute(
+        "SELECT id, telegram_id FROM tenants WHERE id IS NOT NULL AND telegram_id != '' ORDER BY rowid"
+    ).fetchall()
+    # A user listed under several tenants keeps the first one, as the CSV scan did
+    conn.executemany(
+        "INSERT OR IGNORE INTO telegram_users (telegram_id, tenant_id) VALUES (?, ?)",
+        [(owner.strip(), row[0]) for row in rows for owner in (row[1] or "").split(",") if owner.strip()]
+    )
+
+
+ADMIN_MIGRATIONS: list[Migration] = [
+    _admin_v1_baseline,
+    _admin_v2_maintenance_log,
+    _admin_v3_telegram_users,
+]
+
+
+# ── Tenant DBs ──
+
+def _tenant_v1_baseline(conn: sqlite3.Connection):
+    """Raw tables (products, movements, suppliers, custom columns) + ORM tables."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS products (
+            uuid TEXT, sku TEXT, name TEXT, category TEXT, stock INTEGER, unit TEXT,
+            cost REAL, price REAL, expiration_date TEXT, location TEXT,
+            invima TEXT, lote TEXT,
+            created_at TEXT DEFAULT (datetime('now', 'localtime')),
+            updated_at TEXT DEFAULT (datetime('now', 'localtime'))
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS movements (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            type TEXT, sku TEXT, name TEXT, quantity INTEGER,
+            user TEXT, notes TEXT,
+            created_at TEXT DEFAULT (datetime('now', 'localtime'))
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS suppliers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            contact TEXT,
+            phone TEXT,
+            email TEXT,
+            address TEXT,
+            notes TEXT,
+            created_at TEXT DEFAULT (datetime('now', 'localtime')),
+            updated_at TEXT DEFAULT (datetime('now', 'localtime'))
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS custom_columns (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            col_type TEXT NOT NULL DEFAULT 'text' CHECK(col_type IN ('text','number','date')),
+            created_at TEXT DEFAULT (datetime('now', 'localtime'))
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS product_custom_values (
+            product_sku TEXT NOT NULL,
+            column_id INTEGER NOT NULL,
+            value TEXT,
+            PRIMARY KEY (product_sku, column_id),
+            FOREIGN KEY (column_id) REFERENCES custom_columns(id) ON DELETE CASCADE
+        )
+    """)
+    _create_orm_tables(conn)
+
+
+def _tenant_v2_movement_ledger(conn: sqlite3.Connection):
+    """Columns written by _log_movement. DBs created from the v1 baseline only
+    had the legacy (type, quantity) layout."""
+    _add_missing_columns(conn, "movements", [
+        ("timestamp", "TEXT"),
+        ("tx_id", "TEXT"),
+        ("mov_type", "TEXT"),
+        ("qty", "INTEGER"),
+    ])
+
+
+def _tenant_v3_product_keys(conn: sqlite3.Connection):
+    """Rebuild products with an INTEGER PRIMARY KEY (keeps existing rowids, so
+    row_idx values stay valid) and a unique case-insensitive SKU, then index
+    the columns used by lookups, filters and the movements ledger."""
+    # Backfill blank SKUs and suffix case-insensitive duplicates (later rows lose)
+    conn.execute("""
+        UPDATE products SET sku = 'GEN-' || rowid
+        WHERE sku IS NULL OR trim(sku) = ''
+    """)
+    # Custom values are keyed by SKU: remember every rename (suffix or trim) so they follow
+    conn.execute("CREATE TEMP TABLE sku_renames (old TEXT, new TEXT)")
+    conn.execute("""
+        INSERT INTO sku_renames (old, new)
+        SELECT sku, CASE WHEN rowid IN (SELECT min(rowid) FROM products GROUP BY lower(trim(sku)))
+                         THEN trim(sku) ELSE trim(sku) || '-' || rowid END
+        FROM products
+    """)
+    conn.execute("DELETE FROM sku_renames WHERE old = new")
+    conn.execute("""
+        UPDATE products SET sku = trim(sku) || '-' || rowid
+        WHERE rowid NOT IN (SELECT min(rowid) FROM products GROUP BY lower(trim(sku)))
+    """)
+    # Duplicates that shared a key each get a copy; keys no product owns any more are dropped
+    conn.execute("""
+        INSERT OR IGNORE INTO product_custom_values (product_sku, column_id, value)
+        SELECT r.new, v.column_id, v.value
+        FROM sku_renames r JOIN product_custom_values v ON v.product_sku = r.old
+    """)
+    conn.execute("""
+        DELETE FROM product_custom_values
+        WHERE product_sku IN (SELECT old FROM sku_renames)
+          AND NOT EXISTS (SELECT 1 FROM products p WHERE trim(p.sku) = product_custom_values.product_sku)
+    """)
+    conn.execute("DROP TABLE temp.sku_renames")
+    conn.execute("""
+        CREATE TABLE products_v3 (
+            id INTEGER PRIMARY KEY,
+            uuid TEXT,
+            sku TEXT NOT NULL COLLATE NOCASE UNIQUE,
+            name TEXT COLLATE NOCASE,
+            category TEXT COLLATE NOCASE,
+            stock INTEGER DEFAULT 0,
+            unit TEXT,
+            cost REAL,
+            price REAL,
+            expiration_date TEXT,
+            location TEXT COLLATE NOCASE,
+            invima TEXT COLLATE NOCASE,
+            lote TEXT COLLATE NOCASE,
+            created_at TEXT DEFAULT (datetime('now', 'localtime')),
+            updated_at TEXT DEFAULT (datetime('now', 'localtime'))
+        )
+    """)
+    conn.execute("""
+        INSERT INTO products_v3 (id, uuid, sku, name, category, stock, unit, cost, price,
+                                 expiration_date, location, invima, lote, created_at, updated_at)
+        SELECT rowid, uuid, trim(sku), name, category, stock, unit, cost, price,
+               expiration_date, location, invima, lote, created_at, updated_at
+        FROM products
+    """)
+    conn.execute("DROP TABLE products")
+    conn.execute("ALTER TABLE products_v3 RENAME TO products")
+
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_products_name ON products(name)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_products_invima ON products(invima)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_products_lote ON products(lote)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_products_category ON products(category)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_products_location ON products(location)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_movements_sku_type_ts ON movements(sku, mov_type, timestamp)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_movements_ts ON movements(timestamp)")
+
+
+# Tables whose writes change what the dashboard shows
+VERSIONED_TABLES = (
+    "products", "movements", "suppliers", "custom_columns", "product_custom_values",
+    "clients", "remisiones", "remision_items",
+)
+
+
+def _tenant_v4_data_version(conn: sqlite3.Connection):
+    """Single-row write counter bumped by triggers on every versioned table.
+    Covers raw sqlite3 and SQLAlchemy writes alike; readers key caches on it."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS data_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+    """)
+    conn.execute("INSERT OR IGNORE INTO data_version (id, version) VALUES (1, 0)")
+    for table in VERSIONED_TABLES:
+        for op in ("INSERT", "UPDATE", "DELETE"):
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_{op.lower()}_version
+                AFTER {op} ON {table}
+                BEGIN
+                    UPDATE data_version SET version = version + 1 WHERE id = 1;
+                END
+            """)
+
+
+def _tenant_v5_product_sort_indexes(conn: sqlite3.Connection):
+    """Indexes behind the inventory page sort keys and the low-stock/expiring filters."""
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_products_stock ON products(stock)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_products_price ON products(price)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_products_expiration ON products(expiration_date)")
+
+
+def _tenant_v6_change_log(conn: sqlite3.Connection):
+    """Append-only feed of product/custom value/column changes for delta sync.
+    Rows name what changed (by SKU); readers fetch the current state themselves.
+    An SKU rename is logged as a delete of the old SKU plus an update of the new one."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS change_log (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            entity TEXT NOT NULL CHECK(entity IN ('product', 'column')),
+            key TEXT NOT NULL COLLATE NOCASE,
+            op TEXT NOT NULL,
+            changed_at TEXT DEFAULT (datetime('now', 'localtime'))
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_change_log_changed_at ON change_log(changed_at)")
+    triggers = {
+        "products_insert": ("AFTER INSERT ON products", "'product', NEW.sku, 'insert'"),
+        "products_update": ("AFTER UPDATE ON products", "'product', NEW.sku, 'update'"),
+        "products_rename": ("AFTER UPDATE OF sku ON products WHEN OLD.sku != NEW.sku",
+                            "'product', OLD.sku, 'delete'"),
+        "products_delete": ("AFTER DELETE ON products", "'product', OLD.sku, 'delete'"),
+        "custom_values_insert": ("AFTER INSERT ON product_custom_values", "'product', NEW.product_sku, 'custom'"),
+        "custom_values_update": ("AFTER UPDATE ON product_custom_values", "'product', NEW.product_sku, 'custom'"),
+        "custom_values_delete": ("AFTER DELETE ON product_custom_values", "'product', OLD.product_sku, 'custom'"),
+        "custom_columns_insert": ("AFTER INSERT ON custom_columns", "'column', NEW.name, 'insert'"),
+        "custom_columns_update": ("AFTER UPDATE ON custom_columns", "'column', NEW.name, 'update'"),
+        "custom_columns_delete": ("AFTER DELETE ON custom_columns", "'column', OLD.name, 'delete'"),
+    }
+    for name, (event, values) in triggers.items():
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{name}_changelog
+            {event}
+            BEGIN
+                INSERT INTO change_log (entity, key, op) VALUES ({values});
+            END
+        """)
+
+
+def _tenant_v7_product_search(conn: sqlite3.Connection):
+    """Trigram FTS5 index over the folded name and the codes (sku, invima, lote), kept in
+    sync by triggers. SQLite builds without FTS5 keep the LIKE fallback."""
+    try:
+        conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(name, codes, tokenize='trigram')")
+    except sqlite3.OperationalError as e:
+        logger.warning(f"FTS5 trigram no disponible, busqueda sin indice: {e}")
+        return
+    name = _fold_sql("coalesce({row}.name, '')")
+    codes = "coalesce({row}.sku, '') || ' ' || coalesce({row}.invima, '') || ' ' || coalesce({row}.lote, '')"
+    insert = "INSERT INTO products_fts (rowid, name, codes) VALUES ({row}.id, " + name + ", " + codes + ");"
+    delete = "DELETE FROM products_fts WHERE rowid = OLD.id;"
+    triggers = {
+        "insert": ("AFTER INSERT ON products", insert.format(row="NEW")),
+        "update": ("AFTER UPDATE OF id, name, sku, invima, lote ON products",
+                   delete + "\n" + insert.format(row="NEW")),
+        "delete": ("AFTER DELETE ON products", delete),
+    }
+    for op, (event, body) in triggers.items():
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_products_{op}_fts
+            {event}
+            BEGIN
+                {body}
+            END
+        """)
+    conn.execute("DELETE FROM products_fts")
+    conn.execute(
+        "INSERT INTO products_fts (rowid, name, codes) SELECT id, "
+        + name.format(row="products") + ", " + codes.format(row="products") + " FROM products"
+    )
+
+
+def _tenant_v8_product_codes(conn: sqlite3.Connection):
+    """Normalized identifier index: (code, kind, product_id) for sku, invima and
+    lote, kept in sync by triggers. Exact code lookups are one index probe."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS product_codes (
+            code TEXT NOT NULL,
+            kind TEXT NOT NULL CHECK(kind IN ('sku', 'invima', 'lote')),
+            product_id INTEGER NOT NULL,
+            PRIMARY KEY (code, kind, product_id)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_product_codes_product ON product_codes(product_id)")
+    insert = """
+        INSERT OR IGNORE INTO product_codes (code, kind, product_id)
+        SELECT code, kind, {row}.id FROM (
+            SELECT """ + _code_sql("{row}.sku") + """ AS code, 'sku' AS kind
+            UNION ALL SELECT """ + _code_sql("{row}.invima") + """, 'invima'
+            UNION ALL SELECT """ + _code_sql("{row}.lote") + """, 'lote'
+        ) WHERE code != '';"""
+    delete = "DELETE FROM product_codes WHERE product_id = OLD.id;"
+    triggers = {
+        "insert": ("AFTER INSERT ON products", insert.format(row="NEW")),
+        "update": ("AFTER UPDATE OF id, sku, invima, lote ON products", delete + insert.format(row="NEW")),
+        "delete": ("AFTER DELETE ON products", delete),
+    }
+    for op, (event, body) in triggers.items():
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_products_{op}_codes
+            {event}
+            BEGIN
+                {body}
+            END
+        """)
+    conn.execute("DELETE FROM product_codes")
+    conn.execute("""
+        INSERT OR IGNORE INTO product_codes (code, kind, product_id)
+        SELECT code, kind, id FROM (
+            SELECT id, """ + _code_sql("sku") + """ AS code, 'sku' AS kind FROM products
+            UNION ALL SELECT id, """ + _code_sql("invima") + """, 'invima' FROM products
+            UNION ALL SELECT id, """ + _code_sql("lote") + """, 'lote' FROM products
+        ) WHERE code != ''
+    """)
+
+
+TENANT_MIGRATIONS: list[Migration] = [
+    _tenant_v1_baseline,
+    _tenant_v2_movement_ledger,
+    _tenant_v3_product_keys,
+    _tenant_v4_data_version,
+    _tenant_v5_product_sort_indexes,
+    _tenant_v6_change_log,
+    _tenant_v7_product_search,
+    _tenant_v8_product_codes,
+]
+
+
+# ── State DB ──
+
+def _state_v1_kv(conn: sqlite3.Connection):
+    """Namespaced key/value rows with optional expiry, shared by all workers."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS kv (
+            namespace TEXT NOT NULL,
+            key TEXT NOT NULL,
+            value TEXT,
+            expires_at REAL,
+            PRIMARY KEY (namespace, key)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_kv_expires ON kv(expires_at) WHERE expires_at IS NOT NULL")
+
+
+STATE_MIGRATIONS: list[Migration] = [
+    _state_v1_kv,
+]
+
+
+# ── Runner ──
+
+def migrate(conn: sqlite3.Connection, migrations: list[Migration]) -> int:
+    """Apply pending migrations, one transaction per version. Returns the final version.
+    user_version is re-read under the write lock, so concurrent processes don't double-apply."""
+    target = len(migrations)
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    while version < target:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version >= target:
+                conn.rollback()
+                break
+            migrations[version](conn)
+            version += 1
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return version
+
+
+_migrated: set[str] = set()
+_path_locks: dict[str, threading.Lock] = {}
+_path_locks_guard = threading.Lock()
+
+
+def _ensure(db_path: str, migrations: list[Migration], connect):
+    if db_path in _migrated:
+        return
+    with _path_locks_guard:
+        lock = _path_locks.setdefault(db_path, threading.Lock())
+    with lock:
+        if db_path in _migrated:
+            return
+        with connect() as conn:
+            version = migrate(conn, migrations)
+        _migrated.add(db_path)
+        with _path_locks_guard:
+            _path_locks.pop(db_path, None)
+    logger.debug(f"Schema OK v{version}: {os.path.basename(db_path)}")
+
+
+def ensure_admin_db():
+    """Migrate admin.db once per process."""
+    _ensure(ADMIN_DB, ADMIN_MIGRATIONS, get_admin_conn)
+
+
+def ensure_state_db():
+    """Migrate state.db once per process."""
+    _ensure(STATE_DB, STATE_MIGRATIONS, lambda: _pool.writer(STATE_DB))
+
+
+def ensure_tenant_db(tenant_id: str):
+    """Migrate the tenant DB once per process."""
+    _ensure(get_db_path(tenant_id), TENANT_MIGRATIONS, lambda: get_conn(tenant_id))
+
+
+def forget(db_path: str):
+    """Re-check this file's schema on next use (e.g. after restoring an older snapshot)."""
+    _migrated.discard(db_path)
+
+
+def is_migrated(tenant_id: str) -> bool:
+    return get_db_path(tenant_id) in _migrated
+
+
+# ── Background batch ──
+
+_batch_status = {"running": False, "total": 0, "migrated": 0, "failed": 0, "errors": []}
+_batch_lock = threading.Lock()
+
+
+def migrate_all_tenants(workers: int = 4) -> dict:
+    """Upgrade every inventory_*.db under DB_DIR. Uses short-lived connections
+    so the batch doesn't churn the request connection pool."""
+    paths = [p for p in sorted(glob.glob(os.path.join(DB_DIR, "inventory_*.db"))) if p not in _migrated]
+    _batch_status.update(running=True, total=len(paths), migrated=0, failed=0, errors=[])
+
+    def _one(path: str):
+        try:
+            _ensure(path, TENANT_MIGRATIONS, lambda: closing(open_connection(path)))
+            with _batch_lock:
+                _batch_status["migrated"] += 1
+        except Exception as e:
+            with _batch_lock:
+                _batch_status["failed"] += 1
+                if len(_batch_status["errors"]) < 20:
+                    _batch_status["errors"].append(f"{os.path.basename(path)}: {e}")
+            logger.error(f"Migration failed for {path}: {e}")
+
+    try:
+        ensure_admin_db()
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="migrate") as executor:
+            list(executor.map(_one, paths))
+    finally:
+        _batch_status["running"] = False
+    logger.info(f"Tenant migrations: {_batch_status['migrated']}/{_batch_status['total']} OK, {_batch_status['failed']} failed")
+    return migration_status()
+
+
+def start_background_migrations(workers: int = 4) -> threading.Thread:
+    """Run migrate_all_tenants in a daemon thread."""
+    thread = threading.Thread(target=migrate_all_tenants, args=(workers,), name="tenant-migrations", daemon=True)
+    thread.start()
+    return thread
+
+
+def migration_status() -> dict:
+    with _batch_lock:
+        return {
+            **_batch_status,
+            "errors": list(_batch_status["errors"]),
+            "schema_version": len(TENANT_MIGRATIONS),
+            "migrated_in_process": len(_migrated),
+        }
@@ -0,0 +1,286 @@
+"""
+Shared state store — everything that must look the same from every uvicorn worker.
+
+Backends:
+  memory → per-process dict (single worker, the default)
+  sqlite → state.db in DATA_DIR, shared by all workers on the host
+STATE_BACKEND=auto picks sqlite whenever WEB_CONCURRENCY > 1.
+
+Values are JSON-serialized in both backends, so callers always get a copy.
+Generation counters (incr/generation) let a worker tell that something it
+cached locally was invalidated by another worker.
+
+Also here: a file-lock leader election, so background jobs (migration batch,
+maintenance, backups) run in exactly one worker.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Optional
+
+from app.core.config import settings
+from app.core.database import DB_DIR, STATE_DB, _pool
+
+logger = logging.getLogger(__name__)
+
+
+class StateStore(ABC):
+    """Namespaced key/value store with optional TTL (seconds)."""
+
+    backend = "base"
+
+    @abstractmethod
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        ...
+
+    @abstractmethod
+    def set(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None):
+        ...
+
+    @abstractmethod
+    def add(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        """Set only if the key is absent (or expired), atomically. Returns whether it was set."""
+        ...
+
+    @abstractmethod
+    def delete(self, namespace: str, key: str):
+        ...
+
+    @abstractmethod
+    def pop(self, namespace: str, key: str) -> Optional[Any]:
+        ...
+
+    @abstractmethod
+    def incr(self, namespace: str, key: str) -> int:
+        """Atomically increment an integer counter, returning the new value."""
+        ...
+
+    @abstractmethod
+    def clear(self, namespace: str):
+        ...
+
+    # ── Generation counters ──
+
+    def generation(self, name: str) -> int:
+        return int(self.get("gen", name) or 0)
+
+    def bump(self, name: str) -> int:
+        return self.incr("gen", name)
+
+
+class MemoryStateStore(StateStore):
+    backend = "memory"
+
+    def __init__(self):
+        self._data: dict[tuple[str, str], tuple[Optional[float], str]] = {}
+        self._lock = threading.Lock()
+
+    def _live(self, k: tuple[str, str]) -> Optional[str]:
+        item = self._data.get(k)
+        if item is None:
+            return None
+        expires_at, raw = item
+        if expires_at is not None and expires_at <= time.time():
+            del self._data[k]
+            return None
+        return raw
+
+    def get(self, namespace, key):
+        with self._lock:
+            raw = self._live((namespace, key))
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, namespace, key, value, ttl=None):
+        raw = json.dumps(value, default=str)
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            self._data[(namespace, key)] = (expires_at, raw)
+
+    def add(self, namespace, key, value, ttl=None):
+        raw = json.dumps(value, default=str)
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            if self._live((namespace, key)) is not None:
+                return False
+            self._data[(namespace, key)] = (expires_at, raw)
+            return True
+
+    def delete(self, namespace, key):
+        with self._lock:
+            self._data.pop((namespace, key), None)
+
+    def pop(self, namespace, key):
+        with self._lock:
+            raw = self._live((namespace, key))
+            self._data.pop((namespace, key), None)
+        return json.loads(raw) if raw is not None else None
+
+    def incr(self, namespace, key):
+        with self._lock:
+            raw = self._live((namespace, key))
+            value = int(json.loads(raw)) + 1 if raw is not None else 1
+            self._data[(namespace, key)] = (None, json.dumps(value))
+        return value
+
+    def clear(self, namespace):
+        with self._lock:
+            for k in [k for k in self._data if k[0] == namespace]:
+                del self._data[k]
+
+
+class SQLiteStateStore(StateStore):
+    """state.db through the regular connection pool (WAL: reads don't block writes)."""
+
+    backend = "sqlite"
+    PURGE_EVERY = 500  # writes between expired-row purges
+
+    def __init__(self, db_path: str = STATE_DB):
+        self.db_path = db_path
+        self._writes = 0
+
+    def _ready(self):
+        from app.core.migrations import ensure_state_db
+        ensure_state_db()
+
+    def get(self, namespace, key):
+        self._ready()
+        with _pool.reader(self.db_path) as conn:
+            row = conn.execute(
+                "SELECT value FROM kv WHERE namespace = ? AND key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (namespace, key, time.time())
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, namespace, key, value, ttl=None):
+        self._ready()
+        expires_at = time.time() + ttl if ttl else None
+        with _pool.writer(self.db_path) as conn:
+            conn.execute(
+                "INSERT INTO kv (namespace, key, value, expires_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(namespace, key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at",
+                (namespace, key, json.dumps(value, default=str), expires_at)
+            )
+            self._writes += 1
+            if self._writes % self.PURGE_EVERY == 0:
+                conn.execute("DELETE FROM kv WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),))
+
+    def add(self, namespace, key, value, ttl=None):
+        self._ready()
+        now = time.time()
+        with _pool.writer(self.db_path) as conn:
+            # The upsert only overwrites an expired row: one statement, so check and set can't interleave
+            cur = conn.execute(
+                "INSERT INTO kv (namespace, key, value, expires_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(namespace, key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at "
+                "WHERE kv.expires_at IS NOT NULL AND kv.expires_at <= ?",
+                (namespace, key, json.dumps(value, default=str), now + ttl if ttl else None, now)
+            )
+        return cur.rowcount == 1
+
+    def delete(self, namespace, key):
+        self._ready()
+        with _pool.writer(self.db_path) as conn:
+            conn.execute("DELETE FROM kv WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def pop(self, namespace, key):
+        self._ready()
+        with _pool.writer(self.db_path) as conn:
+            row = conn.execute(
+                "DELETE FROM kv WHERE namespace = ? AND key = ? RETURNING value, expires_at",
+                (namespace, key)
+            ).fetchone()
+        if not row or (row[1] is not None and row[1] <= time.time()):
+            return None
+        return json.loads(row[0])
+
+    def incr(self, namespace, key):
+        self._ready()
+        with _pool.writer(self.db_path) as conn:
+            row = conn.execute(
+                "INSERT INTO kv (namespace, key, value) VALUES (?, ?, '1') "
+                "ON CONFLICT(namespace, key) DO UPDATE SET value = CAST(value AS INTEGER) + 1, expires_at = NULL "
+                "RETURNING value",
+                (namespace, key)
+            ).fetchone()
+        return int(row[0])
+
+    def clear(self, namespace):
+        self._ready()
+        with _pool.writer(self.db_path) as conn:
+            conn.execute("DELETE FROM kv WHERE namespace = ?", (namespace,))
+
+
+def _make_store() -> StateStore:
+    backend = settings.STATE_BACKEND
+    if backend == "auto":
+        backend = "sqlite" if settings.WEB_CONCURRENCY > 1 else "memory"
+    if backend == "sqlite":
+        return SQLiteStateStore()
+    if backend != "memory":
+        logger.warning(f"STATE_BACKEND desconocido '{backend}', usando memory")
+    return MemoryStateStore()
+
+
+state: StateStore = _make_store()
+
+
+class GenerationWatch:
+    """Tells a worker that another worker bumped a shared generation counter.
+    Polled at most every CACHE_GENERATION_CHECK seconds; a no-op with the memory backend."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._generation = 0
+        self._checked = 0.0
+
+    def changed(self) -> bool:
+        if state.backend == "memory":
+            return False
+        now = time.monotonic()
+        if now - self._checked < settings.CACHE_GENERATION_CHECK:
+            return False
+        self._checked = now
+        try:
+            generation = state.generation(self.name)
+        except Exception as e:
+            logger.warning(f"Generation check failed for {self.name}: {e}")
+            return False
+        if generation == self._generation:
+            return False
+        self._generation = generation
+        return True
+
+    def bump(self):
+        """Signal every other worker (this one already knows)."""
+        if state.backend != "memory":
+            self._generation = state.bump(self.name)
+
+
+# ── Leader election ──
+
+_leader_handles: dict[str, Any] = {}
+
+
+def is_leader(name: str = "background") -> bool:
+    """True in exactly one worker: the first to take an exclusive flock on
+    DATA_DIR/.<name>.lock. The lock is held for the process lifetime and the
+    OS releases it if the worker dies, so a restarted worker can take over."""
+    if name in _leader_handles:
+        return True
+    try:
+        import fcntl
+    except ImportError:  # non-POSIX dev machine: single process assumed
+        return True
+    handle = open(os.path.join(DB_DIR, f".{name}.lock"), "w")
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return False
+    handle.write(str(os.getpid()))
+    handle.flush()
+    _leader_handles[name] = handle
+    return True
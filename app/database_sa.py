@@ -1,42 +1,114 @@
 """
-SQLAlchemy session manager — coexists with raw sqlite3 connections.
-Uses same WAL-mode DB files but manages its own connections via NullPool.
+SQLAlchemy session manager — shares connections with the raw sqlite3 pool.
+Each DB file has one engine whose only connection is the pool's writer, so
+ORM and raw writes are serialized by the same lock and never contend across
+connections. Read-only work uses get_read_session(): its engine borrows one
+of the pool's WAL readers, so listing clients or rendering a remision PDF
+never holds the writer. Engines and sessionmakers are cached per DB file.
 """
-import os
-from sqlalchemy import create_engine, event
+from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
-from app.core.database import get_db_path
+from sqlalchemy.pool import NullPool
+from app.core.database import get_db_path, _pool
 
 Base = declarative_base()
 
-# Engine cache: one per tenant DB
+# Engine + sessionmaker caches: one per DB file (writer and reader)
 _engines: dict[str, any] = {}
+_sessionmakers: dict[str, sessionmaker] = {}
+_read_engines: dict[str, any] = {}
+_read_sessionmakers: dict[str, sessionmaker] = {}
+
+
+class _BorrowedConnection:
+    """DBAPI connection handed to SQLAlchemy: proxies a pooled connection and
+    gives it back (release()) on close() instead of closing it."""
+
+    __slots__ = ("_conn", "_release")
+
+    def __init__(self, conn, release):
+        object.__setattr__(self, "_conn", conn)
+        object.__setattr__(self, "_release", release)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._conn, name, value)
+
+    def close(self):
+        release = self._release
+        if release is not None:
+            object.__setattr__(self, "_release", None)
+            release()
+
+
+def _borrowed_engine(creator):
+    # NullPool calls the creator on every checkout and close() on every checkin;
+    # the session commits/rolls back itself, so reset on return is disabled
+    return create_engine("sqlite://", creator=creator, poolclass=NullPool,
+                         pool_reset_on_return=None, echo=False)
+
+
+def pooled_engine(db_path: str):
+    """Engine that borrows the raw pool's writer connection for db_path.
+    Each ORM checkout holds the pool's writer lock on the calling thread
+    until the session releases it."""
+    def _creator():
+        db_pool, conn = _pool.acquire_writer(db_path)
+        return _BorrowedConnection(conn, lambda: _pool.release_writer(db_pool))
+
+    return _borrowed_engine(_creator)
+
+
+def pooled_read_engine(db_path: str):
+    """Engine that borrows one of the raw pool's read-only connections (query_only)."""
+    def _creator():
+        db_pool, conn = _pool.acquire_reader(db_path)
+        return _BorrowedConnection(conn, lambda: _pool.release_reader(db_pool, conn))
+
+    return _borrowed_engine(_creator)
+
+
+def _drop_engine(db_path: str):
+    """Dispose the engine of a DB evicted from the raw connection pool."""
+    for sessionmakers, engines in ((_sessionmakers, _engines), (_read_sessionmakers, _read_engines)):
+        sessionmakers.pop(db_path, None)
+        engine = engines.pop(db_path, None)
+        if engine is not None:
+            engine.dispose()
+
+
+_pool.add_eviction_listener(_drop_engine)
 
 
 def _get_engine(tenant_id: str):
     db_path = get_db_path(tenant_id)
     if db_path not in _engines:
-        engine = create_engine(
-            f"sqlite:///{db_path}",
-            echo=False,
-            connect_args={"check_same_thread": False},
-            poolclass=None,  # NullPool — no connection pooling
-        )
-
-        @event.listens_for(engine, "connect")
-        def _set_pragmas(dbapi_conn, _connection_record):
-            dbapi_conn.execute("PRAGMA journal_mode=WAL")
-            dbapi_conn.execute("PRAGMA foreign_keys=ON")
-            dbapi_conn.execute("PRAGMA busy_timeout=5000")
-
-        _engines[db_path] = engine
+        _engines[db_path] = pooled_engine(db_path)
     return _engines[db_path]
 
 
 def get_session(tenant_id: str):
-    """Return a new SQLAlchemy session for the tenant."""
-    engine = _get_engine(tenant_id)
-    Session = sessionmaker(bind=engine)
+    """Return a new SQLAlchemy session for the tenant (cached sessionmaker)."""
+    db_path = get_db_path(tenant_id)
+    Session = _sessionmakers.get(db_path)
+    if Session is None:
+        Session = sessionmaker(bind=_get_engine(tenant_id))
+        _sessionmakers[db_path] = Session
+    return Session()
+
+
+def get_read_session(tenant_id: str):
+    """Session for queries only, on a WAL reader: never blocks (or waits for) writes.
+    Flushing from it fails (the connection is query_only)."""
+    db_path = get_db_path(tenant_id)
+    Session = _read_sessionmakers.get(db_path)
+    if Session is None:
+        engine = _read_engines.get(db_path)
+        if engine is None:
+            engine = _read_engines[db_path] = pooled_read_engine(db_path)
+        Session = _read_sessionmakers[db_path] = sessionmaker(bind=engine, autoflush=False)
     return Session()
 
 
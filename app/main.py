@@ -1,5 +1,10 @@
 from fastapi import FastAPI
 from app.core.config import settings
+from app.core.migrations import start_background_migrations
+from app.core.maintenance import start_maintenance_scheduler
+from app.core.backup import start_backup_scheduler
+from app.core.state import is_leader
+from app.services.movement_writer import movement_writer
 from app.routers import admin, webhook, api, orders, usage, auth
 
 app = FastAPI(
@@ -15,6 +20,21 @@ app.include_router(orders.router)
 app.include_router(usage.router)
 app.include_router(auth.router)
 
+@app.on_event('startup')
+def start_background_jobs():
+    """Migration batch, off-peak maintenance and backups — in one worker only
+    when running with WEB_CONCURRENCY > 1 (file-lock leader)."""
+    if not is_leader():
+        return
+    start_background_migrations()
+    start_maintenance_scheduler()
+    start_backup_scheduler()
+
+@app.on_event('shutdown')
+def flush_movements():
+    """Commit movements still queued in the group-commit writer."""
+    movement_writer.close()
+
 @app.get('/')
 def read_root():
     return {'status': 'API is running', 'mode':'webhook'}
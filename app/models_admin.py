@@ -1,56 +1,30 @@
 """SQLAlchemy models for admin.db — tenant management."""
-from sqlalchemy import Column, String, DateTime, create_engine, event
+from sqlalchemy import Column, String, DateTime
 from sqlalchemy.orm import sessionmaker, declarative_base
-import os
+from app.core.database import ADMIN_DB
 
 AdminBase = declarative_base()
-ADMIN_DB = os.path.join("/app/data", "admin.db")
-os.makedirs(os.path.dirname(ADMIN_DB), exist_ok=True)
 
 _admin_engine = None
+_AdminSession = None
 
 
 def _get_admin_engine():
     global _admin_engine
     if _admin_engine is None:
-        _admin_engine = create_engine(
-            f"sqlite:///{ADMIN_DB}",
-            echo=False,
-            connect_args={"check_same_thread": False},
-            poolclass=None,
-        )
-
-        @event.listens_for(_admin_engine, "connect")
-        def _set_pragmas(dbapi_conn, _connection_record):
-            dbapi_conn.execute("PRAGMA journal_mode=WAL")
-            dbapi_conn.execute("PRAGMA foreign_keys=ON")
-            dbapi_conn.execute("PRAGMA busy_timeout=5000")
-
-        AdminBase.metadata.create_all(_admin_engine)
-
-        # Ensure columns exist (idempotent)
-        with _admin_engine.connect() as c:
-            for col, col_type in [
-                ("telegram_id", "TEXT DEFAULT ''"),
-                ("tenant_id", "TEXT DEFAULT ''"),
-                ("sheet_id", "TEXT DEFAULT ''"),
-                ("business_type", "TEXT DEFAULT ''"),
-                ("nit", "TEXT DEFAULT ''"),
-                ("address", "TEXT DEFAULT ''"),
-                ("description", "TEXT DEFAULT ''"),
-            ]:
-                try:
-                    c.execute(f"ALTER TABLE tenants ADD COLUMN {col} {col_type}")
-                except:
-                    pass
-            c.commit()
-
+        # Schema (tenants + profile columns) is owned by the admin migrations
+        from app.core.database import init_admin_db
+        from app.database_sa import pooled_engine
+        init_admin_db()
+        _admin_engine = pooled_engine(ADMIN_DB)
     return _admin_engine
 
 
 def get_admin_session():
-    Session = sessionmaker(bind=_get_admin_engine())
-    return Session()
+    global _AdminSession
+    if _AdminSession is None:
+        _AdminSession = sessionmaker(bind=_get_admin_engine())
+    return _AdminSession()
 
 
 class TenantProfile(AdminBase):
@@ -1,8 +1,15 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from typing import Optional
 from app.services.factory import get_tenant_service
-from app.core.database import get_admin_conn
+from app.core.database import get_admin_conn, pool_stats
+from app.core.migrations import migration_status
+from app.core.executor import executor_stats
+from app.core.maintenance import scheduler, maintenance_history
+from app.core import backup
+from app.core.auth import invalidate_tenant_cache, require_admin
+from app.core.config import settings
+from app.core.cache import cache_stats
 
 router = APIRouter(
     prefix='/admin',
@@ -22,8 +29,75 @@ def list_tenants():
     return {"tenants": service.list_all()}
 
 
+@router.get('/db-stats')
+def db_stats():
+    """SQLite pool metrics per DB file, executor queue depth per lane, cache, tenant registry
+    and movements group-commit stats."""
+    from app.services.tenant_registry import registry
+    from app.services.movement_writer import movement_writer
+    return {"pools": pool_stats(), "executor": executor_stats(), "caches": cache_stats(),
+            "tenant_registry": registry.stats(), "movement_writer": movement_writer.stats()}
+
+
+@router.get('/migrations')
+def migrations():
+    """Progress of the background tenant schema migration batch."""
+    return migration_status()
+
+
+@router.get('/maintenance')
+def maintenance(db_file: Optional[str] = None, limit: int = 50):
+    """Scheduler status plus recent per-DB results (size, WAL, free pages, duration)."""
+    return {"scheduler": scheduler.stats(), "history": maintenance_history(db_file, limit)}
+
+
+@router.post('/maintenance/run', dependencies=[Depends(require_admin)])
+def run_maintenance():
+    """Start a maintenance pass now, outside the off-peak window."""
+    if not scheduler.run_in_background():
+        raise HTTPException(status_code=409, detail="Ya hay un mantenimiento en curso")
+    return {"status": "started"}
+
+
+@router.get('/backups')
+def list_backups():
+    """Snapshots (newest first) plus backup scheduler status."""
+    return {"status": backup.backup_status(), "snapshots": backup.list_snapshots()}
+
+
+@router.post('/backups', dependencies=[Depends(require_admin)])
+def create_backup():
+    """Start an online snapshot of every DB file now."""
+    if not backup.run_backup_in_background():
+        raise HTTPException(status_code=409, detail="Ya hay un backup en curso")
+    return {"status": "started"}
+
+
+@router.post('/backups/{snapshot_id}/verify', dependencies=[Depends(require_admin)])
+def verify_backup(snapshot_id: str):
+    """Full integrity_check of every file in the snapshot."""
+    try:
+        return backup.verify_snapshot(snapshot_id)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@router.post('/backups/{snapshot_id}/restore', dependencies=[Depends(require_admin)])
+def restore_backup(snapshot_id: str, db_file: Optional[str] = None):
+    """Restore one DB file (or the whole snapshot) over the live data."""
+    # Pool eviction and the migration memo are per process: other workers would
+    # keep serving from connections and caches that predate the restore
+    if settings.WEB_CONCURRENCY > 1:
+        raise HTTPException(status_code=409,
+                            detail="Restaurar requiere un solo worker (WEB_CONCURRENCY=1); reinicia con un worker")
+    try:
+        return backup.restore_snapshot(snapshot_id, db_file)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
 @router.post('/create-pyme')
-async def create_new_pyme(pyme: TenantCreateSchema):
+def create_new_pyme(pyme: TenantCreateSchema):
     service = get_tenant_service()
     
     try:
@@ -68,4 +142,5 @@ def update_tenant(tenant_id: str, update: TenantUpdateSchema):
         for col, val in updates.items():
             conn.execute(f"UPDATE tenants SET {col} = ? WHERE id = ?", (val, tenant_id))
         conn.commit()
+    invalidate_tenant_cache(tenant_id)
     return {"status": "updated"}
@@ -1,13 +1,30 @@
-from fastapi import APIRouter, HTTPException, Query, Depends, Request
+from fastapi import APIRouter, HTTPException, Query, Depends, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
 from typing import Optional, List
+import anyio
+import base64
 import datetime
+import hashlib
+import json
+import os
+import sqlite3
 from app.services.inventory_service import InventoryService
 from app.services.analytics_service import AnalyticsService
+from app.services.inventory_repository import SORT_COLUMNS, parse_date
+from app.services.catalog_io import (CatalogIOError, detect_format, export_csv, export_xlsx,
+                                     get_import_status, spool_path, start_import)
+from app.services.stock_ledger import StockChange, StockError
+from app.services.product_updates import apply_sku_edits, update_selection
 from app.services.factory import get_inventory_service as _get_inventory_service
 from app.core.config import settings
 from app.core.auth import get_current_tenant
-from app.core.database import get_conn
+from app.core.database import get_conn, get_read_conn, get_data_version
+from app.core.executor import run_db, DEFAULT, ANALYTICS
+from app.core.cache import cached_payload
+from functools import partial
 
 router = APIRouter(
     prefix='/api',
@@ -47,6 +64,16 @@ class InventoryResponse(BaseModel):
     products: List[ProductSchema]
     total: int
     custom_columns: Optional[list] = None
+    next_cursor: Optional[str] = None
+    change_cursor: Optional[int] = None
+
+class InventoryChangesResponse(BaseModel):
+    products: List[ProductSchema]
+    deleted: List[str]
+    cursor: int
+    has_more: bool
+    reset: bool = False
+    custom_columns: Optional[list] = None
 
 class MovementSchema(BaseModel):
     timestamp: str
@@ -67,13 +94,60 @@ def get_inventory_service(tenant: dict = Depends(get_current_tenant)):
         tenant_id=tenant.get('tenant_id', '')
     )
 
-# --- Endpoints ---
 
+def get_tenant_inventory_service(inventory_service: InventoryService = Depends(get_inventory_service)):
+    """Para rutas que escriben o leen directamente la DB del tenant: el token de
+    administrador no tiene inventario (servicio dummy), asi que se rechaza."""
+    if inventory_service.tenant_id == "admin":
+        raise HTTPException(status_code=403, detail="El token de administrador no tiene inventario propio")
+    return inventory_service
+
+# --- Conditional GET ---
+
+def _etag(tenant_id: str, key: tuple, version: int) -> str:
+    """Strong ETag: changes with the tenant's data version and with the request key."""
+    digest = hashlib.blake2b(repr((tenant_id, key)).encode(), digest_size=8).hexdigest()
+    return f'"{digest}-{version}"'
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison (RFC 9110 §13.1.2): proxies may have added W/
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+def _render_json(loader) -> bytes:
+    return JSONResponse(jsonable_encoder(loader())).body
 
 
+async def _versioned_response(request: Request, tenant_id: str, key: tuple, loader, lane: str = DEFAULT) -> Response:
+    """Read payload with an ETag from the tenant's data version.
+
+    A matching If-None-Match costs one single-row read: 304, no query and no
+    serialization. Otherwise the rendered JSON comes from the versioned cache.
+    The admin token has no tenant DB (dummy service): no version, no ETag.
+    """
+    if tenant_id == "admin":
+        body = await run_db(_render_json, loader, lane=lane, tenant_id=tenant_id)
+        return Response(content=body, media_type="application/json")
+    version = await run_db(get_data_version, tenant_id, tenant_id=tenant_id)
+    etag = _etag(tenant_id, key, version)
+    # no-cache: the browser keeps the body but revalidates every time
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache", "Vary": "Authorization"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    body = await run_db(cached_payload, tenant_id, key + ("json",), partial(_render_json, loader), version,
+                        lane=lane, tenant_id=tenant_id)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+# --- Endpoints ---
+
 
 @router.post('/products')
-async def create_product(
+def create_product(
     data: ProductSchema,
     token: str = Query(...),
     inventory_service: InventoryService = Depends(get_inventory_service)
@@ -89,7 +163,10 @@ async def create_product(
         row = [new_uuid, sku, data.name, data.category, data.stock, data.unit,
                data.cost, data.price, data.expiration_date, data.location,
                data.invima, data.lote]
-        inventory_service.inventory_sheet.append_row(row)
+        try:
+            inventory_service.inventory_sheet.append_row(row)
+        except sqlite3.IntegrityError:
+            raise HTTPException(status_code=409, detail=f"Ya existe un producto con SKU {sku}")
         inventory_service._log_movement("CREACION", sku, data.name, data.stock, "Admin", "Creacion manual")
         log.info(f"CREATE OK | sku={sku} | uuid={new_uuid}")
         product = {
@@ -100,63 +177,229 @@ async def create_product(
             "location": data.location or "", "invima": data.invima or "", "lote": data.lote or ""
         }
         return {"status": "created", "product": product}
+    except HTTPException:
+        raise
     except Exception as e:
         log.error(f"CREATE FAIL | {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 @router.get('/inventory', response_model=InventoryResponse)
 async def get_inventory(
+    request: Request,
     token: str = Query(...),
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    cursor: Optional[str] = None,
+    sort: Optional[str] = Query(None, pattern=f"^({'|'.join(SORT_COLUMNS)})$"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    q: Optional[str] = Query(None, max_length=100),
+    category: Optional[str] = None,
+    location: Optional[str] = None,
+    low_stock: bool = False,
+    stock: Optional[str] = Query(None, pattern="^(low|out|normal)$"),
+    expiring_days: Optional[int] = Query(None, ge=0, le=3650),
     inventory_service: InventoryService = Depends(get_inventory_service)
 ):
-    """Obtiene todos los productos del inventario."""
+    """Obtiene los productos del inventario.
+    Sin parametros devuelve todo el catalogo; con limit/filtros/sort pagina en el servidor
+    (keyset: pasar next_cursor como cursor para la siguiente pagina)."""
+    tid = inventory_service.tenant_id
+    if limit is None and cursor is None and sort is None and not (q or category or location or low_stock or stock) \
+            and expiring_days is None:
+        return await _versioned_response(request, tid, ("inventory",), partial(_inventory_payload, inventory_service))
+
+    filters = {"category": category, "location": location, "low_stock": low_stock, "stock_level": stock, "search": q}
+    if expiring_days is not None:
+        filters["expiring_before"] = (datetime.date.today() + datetime.timedelta(days=expiring_days)).isoformat()
+    page = {"sort": sort or "name", "descending": order == "desc", "limit": limit,
+            "after": _decode_cursor(cursor, sort or "name", order) if cursor else None}
+    key = ("inventory_page", tuple(sorted(filters.items())), tuple(sorted(page.items())))
+    return await _versioned_response(request, tid, key, partial(_inventory_page_payload, inventory_service, page, filters))
+
+
+def _encode_cursor(sort: str, order: str, key: tuple) -> str:
+    raw = json.dumps([sort, order, key[0], key[1]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str, sort: str, order: str) -> tuple:
     try:
-        rows = inventory_service.inventory_sheet.get_all_values()
-        if not rows or len(rows) < 2:
-            return {"products": [], "total": 0}
-        
-        products = []
-        for i, row in enumerate(rows[1:], start=2):  # Saltamos header
-            if len(row) < 8:  # Mínimo requerido
-                continue
-            
-            # Mapeo de columnas según estructura del Sheet
-            product = {
-                "uuid": str(row[0]) if len(row) > 0 else "",
-                "sku": str(row[1]) if len(row) > 1 else "",
-                "name": str(row[2]) if len(row) > 2 else "Sin nombre",
-                "category": str(row[3]) if len(row) > 3 else "General",
-                "stock": int(row[4]) if len(row) > 4 and str(row[4]).isdigit() else 0,
-                "unit": str(row[5]) if len(row) > 5 else "UND",
-                "cost": float(row[6]) if len(row) > 6 and str(row[6]).replace('.','').isdigit() else 0,
-                "price": float(row[7]) if len(row) > 7 and str(row[7]).replace('.','').isdigit() else 0,
-                "expiration_date": str(row[8]) if len(row) > 8 else "",
-                "location": str(row[9]) if len(row) > 9 else "",
-                "invima": str(row[10]) if len(row) > 10 else "",
-                "lote": str(row[11]) if len(row) > 11 else ""
-            }
-            products.append(product)
-        
-        result = {"products": products, "total": len(products)}
-        
-        # Merge custom values
-        try:
-            custom_cols = _load_custom_columns(inventory_service.tenant_id)
-            if custom_cols:
-                for p in result["products"]:
-                    cv = _load_custom_values(inventory_service.tenant_id, p["sku"])
-                    for col in custom_cols:
-                        p[col["name"]] = cv.get(col["name"], "")
-                result["custom_columns"] = custom_cols
-        except Exception:
-            pass  # custom columns are optional
-        
+        c_sort, c_order, value, last_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor invalido")
+    if (c_sort, c_order) != (sort, order) or not isinstance(last_id, int):
+        raise HTTPException(status_code=400, detail="El cursor no corresponde a este orden")
+    return value, last_id
+
+
+def _merge_custom_values(tenant_id: str, result: dict):
+    """Add custom column values to each product in result (custom columns are optional)."""
+    if tenant_id == "admin":  # dummy service, no tenant DB
+        return
+    try:
+        custom_cols = _load_custom_columns(tenant_id)
+        if custom_cols:
+            values = _load_custom_values(tenant_id, [p["sku"] for p in result["products"]])
+            for p in result["products"]:
+                cv = values.get(p["sku"], {})
+                for col in custom_cols:
+                    p[col["name"]] = cv.get(col["id"], "")
+            result["custom_columns"] = custom_cols
+    except Exception:
+        pass
+
+
+def _inventory_payload(inventory_service: InventoryService) -> dict:
+    try:
+        # Read first: changes that land while loading are replayed by the feed, never lost
+        change_cursor = inventory_service.repo.change_cursor()
+        products = [p.to_dict() for p in inventory_service.repo.products()]
+        if not products:
+            return {"products": [], "total": 0, "change_cursor": change_cursor}
+
+        result = {"products": products, "total": len(products), "change_cursor": change_cursor}
+        _merge_custom_values(inventory_service.tenant_id, result)
         return result
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error leyendo inventario: {str(e)}")
 
+
+def _inventory_page_payload(inventory_service: InventoryService, page: dict, filters: dict) -> dict:
+    try:
+        repo = inventory_service.repo
+        records, next_key = repo.product_page(**page, **filters)
+        result = {
+            "products": [p.to_dict() for p in records],
+            "total": repo.count_products(**filters),
+            "next_cursor": _encode_cursor(page["sort"], "desc" if page["descending"] else "asc", next_key)
+                           if next_key else None,
+        }
+        _merge_custom_values(inventory_service.tenant_id, result)
+        return result
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error leyendo inventario: {str(e)}")
+
+@router.get('/inventory/categories')
+async def get_inventory_categories(
+    request: Request,
+    token: str = Query(...),
+    inventory_service: InventoryService = Depends(get_inventory_service)
+):
+    """Categorias distintas del catalogo (para filtrar la tabla paginada sin traer todo)."""
+    tid = inventory_service.tenant_id
+    return await _versioned_response(request, tid, ("categories",), partial(_categories_payload, inventory_service))
+
+
+def _categories_payload(inventory_service: InventoryService) -> dict:
+    return {"categories": inventory_service.repo.categories()}
+
+
+@router.get('/inventory/changes', response_model=InventoryChangesResponse)
+async def get_inventory_changes(
+    request: Request,
+    since: int = Query(..., ge=0),
+    limit: int = Query(1000, ge=1, le=5000),
+    token: str = Query(...),
+    inventory_service: InventoryService = Depends(get_inventory_service)
+):
+    """Productos creados/modificados/eliminados despues de `since` (change_cursor de
+    /inventory o cursor de la respuesta anterior). reset=true: recargar el inventario completo."""
+    tid = inventory_service.tenant_id
+    return await _versioned_response(request, tid, ("inventory_changes", since, limit),
+                                     partial(_inventory_changes_payload, inventory_service, since, limit))
+
+
+def _inventory_changes_payload(inventory_service: InventoryService, since: int, limit: int) -> dict:
+    try:
+        feed = inventory_service.repo.changes(since, limit)
+        if feed is None:
+            return {"products": [], "deleted": [], "cursor": since, "has_more": False, "reset": True}
+        result = {
+            "products": [p.to_dict() for p in feed["products"]],
+            "deleted": feed["deleted"],
+            "cursor": feed["cursor"],
+            "has_more": feed["has_more"],
+            "reset": False,
+        }
+        _merge_custom_values(inventory_service.tenant_id, result)
+        if feed["columns_changed"] and "custom_columns" not in result:
+            result["custom_columns"] = _load_custom_columns(inventory_service.tenant_id)
+        return result
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error leyendo cambios: {str(e)}")
+
+
+# ── Bulk import / export ──
+
+@router.post('/inventory/import', status_code=202)
+async def import_inventory(
+    request: Request,
+    token: str = Query(...),
+    format: Optional[str] = Query(None, pattern="^(csv|xlsx)$"),
+    create_columns: bool = False,
+    inventory_service: InventoryService = Depends(get_tenant_inventory_service)
+):
+    """Importa un CSV/XLSX enviado como cuerpo de la peticion (no multipart): upsert por SKU
+    en segundo plano. Responde con el job; el progreso se consulta en /inventory/import/{job_id}."""
+    limit = settings.IMPORT_MAX_MB * 1024 * 1024
+    path = spool_path()
+    size, head = 0, b""
+    try:
+        # anyio runs each disk write in a worker thread: the event loop only relays chunks
+        async with await anyio.open_file(path, "wb") as f:
+            async for chunk in request.stream():
+                head = head or chunk[:8]
+                size += len(chunk)
+                if size > limit:
+                    raise HTTPException(status_code=413, detail=f"Archivo demasiado grande (max {settings.IMPORT_MAX_MB} MB)")
+                await f.write(chunk)
+        if not size:
+            raise HTTPException(status_code=400, detail="Archivo vacio")
+    except BaseException:
+        os.remove(path)
+        raise
+    fmt = format or detect_format(head, request.headers.get("content-type", ""))
+    try:
+        tid = inventory_service.tenant_id
+        return await run_db(start_import, tid, path, fmt, create_columns, tenant_id=tid)
+    except CatalogIOError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+
+@router.get('/inventory/import/{job_id}')
+def get_import_job(
+    job_id: str,
+    token: str = Query(...),
+    inventory_service: InventoryService = Depends(get_tenant_inventory_service)
+):
+    """Progreso de una importacion: filas leidas, insertadas, actualizadas y errores por fila."""
+    job = get_import_status(inventory_service.tenant_id, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Importacion no encontrada")
+    return job
+
+
+@router.get('/inventory/export')
+async def export_inventory(
+    token: str = Query(...),
+    format: str = Query("csv", pattern="^(csv|xlsx)$"),
+    inventory_service: InventoryService = Depends(get_tenant_inventory_service)
+):
+    """Descarga el catalogo completo (con columnas personalizadas) sin armarlo en memoria."""
+    tid = inventory_service.tenant_id
+    filename = f"inventario-{datetime.date.today().isoformat()}.{format}"
+    headers = {"Content-Disposition": f"attachment; filename={filename}"}
+    if format == "csv":
+        return StreamingResponse(export_csv(tid), media_type="text/csv; charset=utf-8", headers=headers)
+    try:
+        path = await run_db(export_xlsx, tid, lane=ANALYTICS, tenant_id=tid)
+    except CatalogIOError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    return FileResponse(path, filename=filename, background=BackgroundTask(os.remove, path),
+                        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+
+
 @router.get('/products/{sku}')
-async def get_product(
+def get_product(
     sku: str,
     token: str = Query(...),
     inventory_service: InventoryService = Depends(get_inventory_service)
@@ -167,22 +410,10 @@ async def get_product(
         if not row_idx:
             raise HTTPException(status_code=404, detail="Producto no encontrado")
         
-        values = inventory_service.inventory_sheet.row_values(row_idx)
-        
-        return {
-            "uuid": values[0] if len(values) > 0 else "",
-            "sku": values[1] if len(values) > 1 else "",
-            "name": values[2] if len(values) > 2 else "",
-            "category": values[3] if len(values) > 3 else "",
-            "stock": int(values[4]) if len(values) > 4 and values[4].lstrip('-').isdigit() else 0,
-            "unit": values[5] if len(values) > 5 else "UND",
-            "cost": float(values[6]) if len(values) > 6 and values[6].replace('.','').replace('-','').isdigit() else 0,
-            "price": float(values[7]) if len(values) > 7 and values[7].replace('.','').replace('-','').isdigit() else 0,
-            "expiration_date": values[8] if len(values) > 8 else "",
-            "location": values[9] if len(values) > 9 else "",
-            "invima": values[10] if len(values) > 10 else "",
-            "lote": values[11] if len(values) > 11 else ""
-        }
+        product = inventory_service.repo.get_product(row_idx)
+        if not product:
+            raise HTTPException(status_code=404, detail="Producto no encontrado")
+        return product.to_dict()
     except HTTPException:
         raise
     except Exception as e:
@@ -201,6 +432,18 @@ async def update_product(
     """Actualiza campos de un producto existente.
     Solo actualiza los campos enviados en el body.
     Campos desconocidos se guardan como custom values."""
+    body = {}
+    if request:
+        try:
+            body = await request.json()
+        except Exception:
+            pass
+    return await run_db(_update_product, sku, updates, body, inventory_service,
+                        tenant_id=inventory_service.tenant_id)
+
+
+def _update_product(sku: str, updates: ProductUpdateSchema, body: dict,
+                    inventory_service: InventoryService) -> dict:
     import logging
     log = logging.getLogger('crud.product')
     try:
@@ -211,43 +454,17 @@ async def update_product(
             raise HTTPException(status_code=404, detail="Producto no encontrado")
         
         log.info(f"PATCH FOUND | sku={sku} | name={current_name} | row={row_idx}")
-        
-        # Mapeo de campos a índices de columna (1-based)
-        field_to_col = {
-            'name': 3,
-            'category': 4,
-            'stock': 5,
-            'unit': 6,
-            'cost': 7,
-            'price': 8,
-            'expiration_date': 9,
-            'location': 10,
-            'invima': 11,
-            'lote': 12
-        }
-        
+
         update_data = updates.dict(exclude_unset=True)
         log.info(f"PATCH FIELDS | sku={sku} | raw_body={update_data}")
-        
-        for field, value in update_data.items():
-            if field in field_to_col and value is not None:
-                col = field_to_col[field]
-                log.info(f"PATCH CELL | sku={sku} | field={field} | col={col} | value={value!r}")
-                inventory_service.inventory_sheet.update_cell(row_idx, col, value)
-        
-        # Handle custom fields from raw body
-        if request:
-            import json
-            try:
-                body = await request.json()
-                known = set(ProductUpdateSchema.__fields__.keys())
-                for key, val in body.items():
-                    if key not in known and key != 'sku':
-                        _save_custom_value(inventory_service.tenant_id, sku, key, val)
-                        log.info(f"PATCH CUSTOM | sku={sku} | field={key} | value={val!r}")
-            except Exception:
-                pass
-        
+
+        # Known fields + custom fields from the raw body: one UPDATE, one transaction
+        known = set(ProductUpdateSchema.__fields__.keys())
+        custom = {k: v for k, v in body.items() if k not in known} if isinstance(body, dict) else {}
+        values = {**custom, **update_data}
+        written = inventory_service.update_products({row_idx: values}).get(row_idx, [])
+        log.info(f"PATCH WRITE | sku={sku} | written={written}")
+
         log.info(f"PATCH OK | sku={sku} | fields_updated={list(update_data.keys())}")
         return {"status": "updated", "sku": sku, "changes": list(update_data.keys())}
         
@@ -258,8 +475,61 @@ async def update_product(
         logging.getLogger('api').error(f"PATCH /products/{sku}: {traceback.format_exc()}")
         raise HTTPException(status_code=500, detail=str(e))
 
+class BulkProductPatchSchema(BaseModel):
+    items: Optional[List[dict]] = None          # per-SKU edits: [{"sku": ..., "price": ..., "<columna>": ...}]
+    category: Optional[str] = None              # or one edit for a selection: category and/or skus
+    skus: Optional[List[str]] = None
+    values: Optional[dict] = None               # fields (and custom columns) to set on the selection
+    price_pct: Optional[float] = None           # +10 = raise prices 10%
+    cost_pct: Optional[float] = None
+    round_to: float = 0                         # round the new prices to a multiple of this
+
+
+@router.patch('/products')
+def bulk_update_products(
+    data: BulkProductPatchSchema,
+    token: str = Query(...),
+    inventory_service: InventoryService = Depends(get_tenant_inventory_service)
+):
+    """Edicion masiva en una sola transaccion: `items` (cambios por SKU) o una seleccion
+    (`category` y/o `skus`) con `values` y/o `price_pct`/`cost_pct` (ej. subir 10% una categoria)."""
+    tid = inventory_service.tenant_id
+    if data.items is not None:
+        if len(data.items) > 5000:
+            raise HTTPException(status_code=400, detail="Maximo 5000 productos por peticion")
+        edits = {}
+        for item in data.items:
+            sku = str(item.get("sku") or "").strip()
+            if not sku:
+                raise HTTPException(status_code=400, detail="Cada item necesita un sku")
+            try:
+                known = ProductUpdateSchema(**item).dict(exclude_unset=True)
+            except ValueError as e:
+                raise HTTPException(status_code=422, detail=f"{sku}: {e}")
+            edits[sku] = {**item, **known}
+        written, not_found = apply_sku_edits(tid, edits)
+        return {"status": "updated", "updated": len(written), "not_found": not_found}
+
+    if data.skus is not None and len(data.skus) > 5000:
+        raise HTTPException(status_code=400, detail="Maximo 5000 productos por peticion")
+    if data.category is None and data.skus is None:
+        raise HTTPException(status_code=400, detail="Envia items, category o skus")
+    if data.round_to < 0:
+        raise HTTPException(status_code=400, detail="round_to debe ser positivo")
+    values = data.values or {}
+    if values:
+        try:
+            values = {**values, **ProductUpdateSchema(**values).dict(exclude_unset=True)}
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+    if not values and data.price_pct is None and data.cost_pct is None:
+        raise HTTPException(status_code=400, detail="No hay cambios para aplicar")
+    updated = update_selection(tid, values, category=data.category, skus=data.skus,
+                               price_pct=data.price_pct, cost_pct=data.cost_pct, round_to=data.round_to)
+    return {"status": "updated", "updated": updated}
+
 @router.delete('/products/{sku}')
-async def delete_product(
+def delete_product(
     sku: str,
     token: str = Query(...),
     inventory_service: InventoryService = Depends(get_inventory_service)
@@ -282,38 +552,21 @@ async def delete_product(
 
 @router.get('/movements')
 async def get_movements(
+    request: Request,
     token: str = Query(...),
     limit: int = Query(100, ge=1, le=500),
     inventory_service: InventoryService = Depends(get_inventory_service)
 ):
     """Historial de movimientos."""
+    return await _versioned_response(request, inventory_service.tenant_id, ("movements", limit),
+                                     partial(_movements_payload, inventory_service, limit))
+
+
+def _movements_payload(inventory_service: InventoryService, limit: int) -> dict:
     try:
-        rows = inventory_service.history_sheet.get_all_values()
-        if not rows or len(rows) < 2:
-            return {"movements": [], "total": 0}
-        
-        # Ordenar por timestamp descendente (más reciente primero)
-        movements = []
-        for row in rows[1:]:  # Saltamos header
-            if len(row) < 7:
-                continue
-            movements.append({
-                "timestamp": str(row[0]),
-                "tx_id": str(row[1]),
-                "mov_type": str(row[2]),
-                "sku": str(row[3]),
-                "name": str(row[4]),
-                "qty": int(row[5]) if str(row[5]).replace('-','').isdigit() else 0,
-                "user": str(row[6]),
-                "notes": str(row[7]) if len(row) > 7 else ""
-            })
-        
-        # Ordenar por timestamp descendente y limitar
-        movements.sort(key=lambda x: x['timestamp'], reverse=True)
-        limited = movements[:limit]
-        
-        result = {"movements": limited, "total": len(movements)}
-        return result
+        # Most recent first; SQLite sorts on the timestamp index
+        movements = [m.to_dict() for m in inventory_service.repo.movements(limit=limit)]
+        return {"movements": movements, "total": inventory_service.repo.movement_count()}
         
     except Exception as e:
         import traceback, logging
@@ -322,37 +575,30 @@ async def get_movements(
 
 @router.get('/stats')
 async def get_stats(
+    request: Request,
     token: str = Query(...),
     inventory_service: InventoryService = Depends(get_inventory_service)
 ):
     """Estadisticas agregadas."""
+    # today in the key (and ETag): expiry counts change at midnight without any write
+    return await _versioned_response(request, inventory_service.tenant_id, ("stats", datetime.date.today()),
+                                     partial(_stats_payload, inventory_service))
+
+
+def _stats_payload(inventory_service: InventoryService) -> dict:
     try:
-        rows = inventory_service.inventory_sheet.get_all_values()
-        if not rows or len(rows) < 2:
+        repo = inventory_service.repo
+        # Aggregated in SQLite; only distinct expiration dates come back to Python
+        total_products, total_stock_value, low_stock_count = repo.stock_totals()
+        if not total_products:
             return {"total_products": 0, "total_stock_value": 0, "low_stock_count": 0, "expiring_count": 0}
 
-        total_products = 0
-        total_stock_value = 0.0
-        low_stock_count = 0
+        expiry_limit = datetime.date.today() + datetime.timedelta(days=30)
         expiring_count = 0
-        today = datetime.date.today()
-
-        for row in rows[1:]:
-            if len(row) < 8:
-                continue
-            total_products += 1
-            stock = int(row[4]) if len(row) > 4 and str(row[4]).isdigit() else 0
-            price = float(row[7]) if len(row) > 7 and str(row[7]).replace('.', '').isdigit() else 0
-            total_stock_value += stock * price
-            if 0 < stock <= 5:
-                low_stock_count += 1
-            if len(row) > 8 and row[8]:
-                try:
-                    exp_date = datetime.datetime.strptime(str(row[8]), "%Y-%m-%d").date()
-                    if (exp_date - today).days <= 30:
-                        expiring_count += 1
-                except Exception:
-                    pass
+        for exp_str, n in repo.expiration_counts():
+            expiry = parse_date(exp_str)
+            if expiry is not None and expiry <= expiry_limit:
+                expiring_count += n
 
         result = {
             "total_products": total_products,
@@ -363,11 +609,13 @@ async def get_stats(
         }
         # Count clients
         try:
-            from app.database_sa import get_session
+            from app.database_sa import get_read_session
             from app.models import Client
-            s = get_session(inventory_service.tenant_id)
-            result["total_clients"] = s.query(Client).count()
-            s.close()
+            s = get_read_session(inventory_service.tenant_id)
+            try:
+                result["total_clients"] = s.query(Client).count()
+            finally:
+                s.close()
         except: pass
         return result
     except Exception as e:
@@ -378,41 +626,32 @@ async def get_stats(
 
 @router.get('/alerts')
 async def get_alerts(
+    request: Request,
     token: str = Query(...),
     inventory_service: InventoryService = Depends(get_inventory_service)
 ):
     """Productos con stock bajo o proximos a vencer."""
-    try:
-        rows = inventory_service.inventory_sheet.get_all_values()
-        if not rows or len(rows) < 2:
-            return {"low_stock": [], "expiring": []}
+    return await _versioned_response(request, inventory_service.tenant_id, ("alerts", datetime.date.today()),
+                                     partial(_alerts_payload, inventory_service))
 
+
+def _alerts_payload(inventory_service: InventoryService) -> dict:
+    try:
         low_stock = []
         expiring = []
         today = datetime.date.today()
 
-        for row in rows[1:]:
-            if len(row) < 8:
-                continue
-            name = str(row[2]) if len(row) > 2 else ""
-            sku = str(row[1]) if len(row) > 1 else ""
-            if sku.endswith(".0"):
-                sku = sku[:-2]
-            stock = int(row[4]) if len(row) > 4 and str(row[4]).isdigit() else 0
-            unit = str(row[5]) if len(row) > 5 else "UND"
-            exp_str = str(row[8]) if len(row) > 8 else ""
-
-            if 0 < stock <= 5:
-                low_stock.append({"sku": sku, "name": name, "stock": stock, "unit": unit})
-
-            if exp_str:
-                try:
-                    exp_date = datetime.datetime.strptime(exp_str, "%Y-%m-%d").date()
-                    days = (exp_date - today).days
-                    if days <= 30:
-                        expiring.append({"sku": sku, "name": name, "expiration_date": exp_str, "days_left": days})
-                except Exception:
-                    pass
+        for p in inventory_service.repo.products():
+            sku = p.sku[:-2] if p.sku.endswith(".0") else p.sku  # SKUs imported from Sheets as floats
+
+            if 0 < p.stock <= 5:
+                low_stock.append({"sku": sku, "name": p.name, "stock": p.stock, "unit": p.unit})
+
+            expiry = p.expiry
+            if expiry is not None:
+                days = (expiry - today).days
+                if days <= 30:
+                    expiring.append({"sku": sku, "name": p.name, "expiration_date": p.expiration_date, "days_left": days})
 
         result = {"low_stock": low_stock, "expiring": expiring}
         return result
@@ -424,59 +663,42 @@ async def get_alerts(
 
 @router.get('/analytics')
 async def get_analytics(
+    request: Request,
     token: str = Query(...),
     inventory_service: InventoryService = Depends(get_inventory_service)
 ):
     """Analitica completa."""
+    return await _versioned_response(request, inventory_service.tenant_id, ("analytics", datetime.date.today()),
+                                     partial(_analytics_payload, inventory_service), lane=ANALYTICS)
+
+
+def _analytics_payload(inventory_service: InventoryService) -> dict:
     try:
-        # Cargar datos
-        rows = inventory_service.inventory_sheet.get_all_values()
-        mov_rows = inventory_service.history_sheet.get_all_values()
         today = datetime.date.today()
 
         # --- INVENTARIO ---
-        products = []
-        for row in rows[1:]:
-            if len(row) < 8: continue
-            stock = int(row[4]) if len(row) > 4 and str(row[4]).isdigit() else 0
-            cost = float(row[6]) if len(row) > 6 and str(row[6]).replace('.','').replace('-','').isdigit() else 0
-            price = float(row[7]) if len(row) > 7 and str(row[7]).replace('.','').replace('-','').isdigit() else 0
-            products.append({
-                "sku": str(row[1]) if len(row) > 1 else "",
-                "name": str(row[2]) if len(row) > 2 else "",
-                "category": str(row[3]) if len(row) > 3 else "General",
-                "stock": stock,
-                "cost": cost,
-                "price": price,
-                "expiration_date": str(row[8]) if len(row) > 8 else "",
-                "unit": str(row[5]) if len(row) > 5 else "UND",
-            })
+        products = [{
+            "sku": p.sku, "name": p.name, "category": p.category,
+            "stock": p.stock, "cost": p.cost, "price": p.price,
+            "expiration_date": p.expiration_date, "unit": p.unit,
+        } for p in inventory_service.repo.products()]
+        by_sku = {p["sku"]: p for p in products}
 
         # --- MOVIMIENTOS (ultimos 90 dias) ---
         cutoff = today - datetime.timedelta(days=90)
         movements = []
-        for row in mov_rows[1:]:
-            if len(row) < 7: continue
-            ts_str = str(row[0])
-            try:
-                # Probar formato completo con hora: "2026-07-23 14:30:00"
-                ts = datetime.datetime.strptime(ts_str[:19], "%Y-%m-%d %H:%M:%S")
-            except:
-                try:
-                    # Fallback: solo fecha
-                    ts = datetime.datetime.strptime(ts_str[:10], "%Y-%m-%d")
-                except:
-                    continue
-            if ts.date() < cutoff: continue
+        for m in inventory_service.repo.movements(since=cutoff.isoformat()):
+            ts = m.at
+            if ts is None: continue
             movements.append({
                 "datetime": ts.isoformat(),
                 "date": str(ts.date()),
-                "type": str(row[2]),
-                "sku": str(row[3]),
-                "name": str(row[4]),
-                "qty": int(row[5]) if str(row[5]).replace('-','').isdigit() else 0,
-                "user": str(row[6]),
-                "notes": str(row[7]) if len(row) > 7 else "",
+                "type": m.mov_type,
+                "sku": m.sku,
+                "name": m.name,
+                "qty": m.qty,
+                "user": m.user,
+                "notes": m.notes,
             })
 
         # --- REVENUE POR PRODUCTO ---
@@ -488,7 +710,7 @@ async def get_analytics(
                 sales_by_product[sku] = {"name": m["name"], "units_sold": 0, "revenue": 0.0}
             sales_by_product[sku]["units_sold"] += abs(m["qty"])
             # Buscar precio del producto
-            prod = next((p for p in products if p["sku"] == sku), None)
+            prod = by_sku.get(sku)
             price = prod["price"] if prod else 0
             sales_by_product[sku]["revenue"] += abs(m["qty"]) * price
 
@@ -502,7 +724,7 @@ async def get_analytics(
         revenue_by_category = {}
         for m in movements:
             if m["type"] != "VENTA": continue
-            prod = next((p for p in products if p["sku"] == m["sku"]), None)
+            prod = by_sku.get(m["sku"])
             cat = prod["category"] if prod else "General"
             price = prod["price"] if prod else 0
             if cat not in revenue_by_category:
@@ -524,7 +746,7 @@ async def get_analytics(
             if m["type"] != "VENTA": continue
             d = m["date"]
             if d in daily_sales:
-                prod = next((p for p in products if p["sku"] == m["sku"]), None)
+                prod = by_sku.get(m["sku"])
                 price = prod["price"] if prod else 0
                 daily_sales[d] += abs(m["qty"]) * price
 
@@ -559,13 +781,11 @@ async def get_analytics(
         # --- STOCK HEALTH ---
         expiring_list = []
         for p in products:
-            if p["expiration_date"]:
-                try:
-                    exp_d = datetime.datetime.strptime(p["expiration_date"], "%Y-%m-%d").date()
-                    days = (exp_d - today).days
-                    if days <= 30:
-                        expiring_list.append({"sku": p["sku"], "name": p["name"], "days_left": days})
-                except: pass
+            exp_d = parse_date(p["expiration_date"])
+            if exp_d is not None:
+                days = (exp_d - today).days
+                if days <= 30:
+                    expiring_list.append({"sku": p["sku"], "name": p["name"], "days_left": days})
 
         out_of_stock = [p for p in products if p["stock"] <= 0]
         low_stock = [p for p in products if 0 < p["stock"] <= 5]
@@ -574,10 +794,10 @@ async def get_analytics(
         recommendations = []
         rec_details = {}
         # Productos clase A con stock bajo
-        a_low = [i for i in abc_items if i["class"] == "A" and any(
-            p["sku"] == i["sku"] and p["stock"] <= 5 for p in products)]
+        a_low = [i for i in abc_items if i["class"] == "A"
+                 and i["sku"] in by_sku and by_sku[i["sku"]]["stock"] <= 5]
         if a_low:
-            items = [{"sku": i["sku"], "name": i["name"], "stock": next((p["stock"] for p in products if p["sku"] == i["sku"]), 0)} for i in a_low]
+            items = [{"sku": i["sku"], "name": i["name"], "stock": by_sku[i["sku"]]["stock"]} for i in a_low]
             recommendations.append(f"⚠️ {len(a_low)} productos clase A (alta rentabilidad) tienen stock bajo. Prioriza reabastecerlos.")
             rec_details["a_low_stock"] = items
         # Productos sin ventas en 90 dias con stock alto
@@ -642,24 +862,30 @@ class ReceiveOrderRequest(BaseModel):
 
 
 @router.post('/receive-order')
-async def receive_order(
+def receive_order(
     data: ReceiveOrderRequest,
     token: str = Query(...),
     inventory_service: InventoryService = Depends(get_inventory_service)
 ):
     """Registra la recepcion de un pedido: suma stock por cada producto."""
+    rows = inventory_service._find_product_rows_by_keywords([item.sku for item in data.items])
+    changes = {}
+    for i, item in enumerate(data.items):
+        row_idx, _ = rows[item.sku]
+        if row_idx:
+            changes[i] = StockChange(row_idx, item.quantity, "COMPRA", data.user_name, "Recepcion de pedido")
+
+    # One transaction for the whole order; items that can't apply are reported, not fatal
+    results = dict(zip(changes, inventory_service.apply_stock_changes(list(changes.values()), atomic=False)))
     messages = []
-    for item in data.items:
-        row_idx, real_name = inventory_service._find_product_row_by_keyword(item.sku, exact_match=True)
-        if not row_idx:
+    for i, item in enumerate(data.items):
+        result = results.get(i)
+        if result is None or result.error == "not_found":
             messages.append(f"⚠️ {item.name}: no encontrado en inventario")
-            continue
-        current_stock = int(inventory_service.inventory_sheet.cell(row_idx, 5).value or 0)
-        new_stock = current_stock + item.quantity
-        inventory_service.inventory_sheet.update_cell(row_idx, 5, new_stock)
-        inventory_service._log_movement("COMPRA", item.sku, real_name, item.quantity, data.user_name, "Recepcion de pedido")
-        messages.append(f"✅ {real_name}: {current_stock} → {new_stock}")
-
+        elif not result.ok:
+            messages.append(f"⚠️ {result.name or item.name}: stock insuficiente")
+        else:
+            messages.append(f"✅ {result.name}: {result.previous_stock} → {result.stock}")
 
     return {"status": "ok", "messages": messages}
 
@@ -684,11 +910,11 @@ class SupplierUpdateSchema(BaseModel):
 
 
 @router.get('/suppliers')
-async def list_suppliers(
+def list_suppliers(
     inventory_service: InventoryService = Depends(get_inventory_service)
 ):
     """Lista todos los proveedores del tenant."""
-    with get_conn(inventory_service.tenant_id) as conn:
+    with get_read_conn(inventory_service.tenant_id) as conn:
         rows = conn.execute(
             "SELECT id, name, contact, phone, email, address, notes, created_at FROM suppliers ORDER BY name"
         ).fetchall()
@@ -696,7 +922,7 @@ async def list_suppliers(
 
 
 @router.post('/suppliers')
-async def create_supplier(
+def create_supplier(
     data: SupplierSchema,
     inventory_service: InventoryService = Depends(get_inventory_service)
 ):
@@ -711,7 +937,7 @@ async def create_supplier(
 
 
 @router.patch('/suppliers/{supplier_id}')
-async def update_supplier(
+def update_supplier(
     supplier_id: int,
     updates: SupplierUpdateSchema,
     inventory_service: InventoryService = Depends(get_inventory_service)
@@ -735,7 +961,7 @@ async def update_supplier(
 
 
 @router.delete('/suppliers/{supplier_id}')
-async def delete_supplier(
+def delete_supplier(
     supplier_id: int,
     inventory_service: InventoryService = Depends(get_inventory_service)
 ):
@@ -757,11 +983,11 @@ class CustomColumnSchema(BaseModel):
 
 
 @router.get('/custom-columns')
-async def list_custom_columns(
+def list_custom_columns(
     inventory_service: InventoryService = Depends(get_inventory_service)
 ):
     """Lista las columnas personalizadas del tenant."""
-    with get_conn(inventory_service.tenant_id) as conn:
+    with get_read_conn(inventory_service.tenant_id) as conn:
         rows = conn.execute(
             "SELECT id, name, col_type, created_at FROM custom_columns ORDER BY id"
         ).fetchall()
@@ -769,7 +995,7 @@ async def list_custom_columns(
 
 
 @router.post('/custom-columns')
-async def create_custom_column(
+def create_custom_column(
     data: CustomColumnSchema,
     inventory_service: InventoryService = Depends(get_inventory_service)
 ):
@@ -789,7 +1015,7 @@ async def create_custom_column(
 
 
 @router.delete('/custom-columns/{column_id}')
-async def delete_custom_column(
+def delete_custom_column(
     column_id: int,
     inventory_service: InventoryService = Depends(get_inventory_service)
 ):
@@ -804,42 +1030,26 @@ async def delete_custom_column(
 # ── Helpers for custom values ──
 
 def _load_custom_columns(tenant_id: str) -> list[dict]:
-    with get_conn(tenant_id) as conn:
-        rows = conn.execute("SELECT id, name, col_type FROM custom_columns ORDER BY id").fetchall()
-    return [dict(r) for r in rows]
+    """Column definitions, cached per tenant data version (treat as read-only)."""
+    def _load() -> list[dict]:
+        with get_read_conn(tenant_id) as conn:
+            rows = conn.execute("SELECT id, name, col_type FROM custom_columns ORDER BY id").fetchall()
+        return [dict(r) for r in rows]
+    return cached_payload(tenant_id, ("custom_columns",), _load)
 
 
-def _load_custom_values(tenant_id: str, sku: str) -> dict:
-    with get_conn(tenant_id) as conn:
-        rows = conn.execute(
-            "SELECT cc.name, pcv.value FROM product_custom_values pcv "
-            "JOIN custom_columns cc ON cc.id = pcv.column_id "
-            "WHERE pcv.product_sku = ?", (sku,)
-        ).fetchall()
-    return {r['name']: r['value'] for r in rows}
-
-
-def _merge_custom_into_product(product: dict, custom_values: dict) -> dict:
-    result = dict(product)
-    result.update(custom_values)
-    return result
-
+_CUSTOM_VALUES_SQL = ("SELECT product_sku, column_id, value FROM product_custom_values "
+                      "WHERE product_sku IN (SELECT value FROM json_each(?))")
 
-def _save_custom_value(tenant_id: str, sku: str, column_name: str, value: any):
-    with get_conn(tenant_id) as conn:
-        col = conn.execute(
-            "SELECT id, col_type FROM custom_columns WHERE name = ?", (column_name,)
-        ).fetchone()
-        if not col:
-            return
-        # Type coercion
-        str_value = str(value) if value is not None else None
-        conn.execute(
-            "INSERT OR REPLACE INTO product_custom_values (product_sku, column_id, value) VALUES (?, ?, ?)",
-            (sku, col['id'], str_value)
-        )
-        conn.commit()
 
+def _load_custom_values(tenant_id: str, skus: list[str]) -> dict[str, dict[int, str]]:
+    """{sku: {column id: value}} for a whole page in one query (PK index on product_sku)."""
+    values: dict[str, dict[int, str]] = {}
+    with get_read_conn(tenant_id) as conn:
+        rows = conn.execute(_CUSTOM_VALUES_SQL, (json.dumps(skus),)).fetchall()
+    for sku, column_id, value in rows:
+        values.setdefault(sku, {})[column_id] = value
+    return values
 
 
 # ── Clients (SQLAlchemy) ──
@@ -863,13 +1073,13 @@ class ClientUpdateSchema(BaseModel):
 
 
 @router.get('/clients')
-async def list_clients(
+def list_clients(
     inventory_service: InventoryService = Depends(get_inventory_service)
 ):
     """Lista todos los clientes del tenant."""
-    from app.database_sa import get_session
+    from app.database_sa import get_read_session
     from app.models import Client
-    session = get_session(inventory_service.tenant_id)
+    session = get_read_session(inventory_service.tenant_id)
     try:
         clients = session.query(Client).order_by(Client.name).all()
         return {"clients": [{"id": c.id, "name": c.name, "contact": c.contact,
@@ -880,7 +1090,7 @@ async def list_clients(
 
 
 @router.post('/clients')
-async def create_client(
+def create_client(
     data: ClientSchema,
     inventory_service: InventoryService = Depends(get_inventory_service)
 ):
@@ -903,7 +1113,7 @@ async def create_client(
 
 
 @router.patch('/clients/{client_id}')
-async def update_client(
+def update_client(
     client_id: int,
     updates: ClientUpdateSchema,
     inventory_service: InventoryService = Depends(get_inventory_service)
@@ -932,7 +1142,7 @@ async def update_client(
 
 
 @router.delete('/clients/{client_id}')
-async def delete_client(
+def delete_client(
     client_id: int,
     inventory_service: InventoryService = Depends(get_inventory_service)
 ):
@@ -975,13 +1185,13 @@ class RemisionCreateSchema(BaseModel):
 
 
 @router.get('/remisiones')
-async def list_remisiones(
+def list_remisiones(
     inventory_service: InventoryService = Depends(get_inventory_service)
 ):
     """Lista todas las remisiones del tenant."""
-    from app.database_sa import get_session
+    from app.database_sa import get_read_session
     from app.models import Remision, Client
-    session = get_session(inventory_service.tenant_id)
+    session = get_read_session(inventory_service.tenant_id)
     try:
         remisiones = session.query(Remision).order_by(Remision.created_at.desc()).all()
         result = []
@@ -998,14 +1208,14 @@ async def list_remisiones(
 
 
 @router.get('/remisiones/{remision_id}')
-async def get_remision(
+def get_remision(
     remision_id: int,
     inventory_service: InventoryService = Depends(get_inventory_service)
 ):
     """Obtiene una remision con sus items."""
-    from app.database_sa import get_session
+    from app.database_sa import get_read_session
     from app.models import Remision
-    session = get_session(inventory_service.tenant_id)
+    session = get_read_session(inventory_service.tenant_id)
     try:
         r = session.query(Remision).filter(Remision.id == remision_id).first()
         if not r:
@@ -1023,7 +1233,7 @@ async def get_remision(
 
 
 @router.post('/remisiones')
-async def create_remision(
+def create_remision(
     data: RemisionCreateSchema,
     token: str = Query(...),
     inventory_service: InventoryService = Depends(get_inventory_service)
@@ -1041,14 +1251,13 @@ async def create_remision(
         if not client:
             raise HTTPException(status_code=404, detail="Cliente no encontrado")
 
-        # Validate stock for each item
+        rows = inventory_service._find_product_rows_by_keywords([item.product_sku for item in data.items])
+        changes = {}
         for item in data.items:
-            row_idx, _ = inventory_service._find_product_row_by_keyword(item.product_sku, exact_match=True)
+            row_idx, _ = rows[item.product_sku]
             if not row_idx:
                 raise HTTPException(status_code=404, detail=f"Producto no encontrado: {item.product_sku}")
-            current_stock = int(inventory_service.inventory_sheet.cell(row_idx, 5).value or 0)
-            if current_stock < item.quantity:
-                raise HTTPException(status_code=400, detail=f"Stock insuficiente para {item.product_name}")
+            changes[StockChange(row_idx, -item.quantity, "REMISION", "Web", f"Remision {uid}")] = item
 
         total = sum(i.quantity * i.unit_price for i in data.items)
 
@@ -1064,9 +1273,18 @@ async def create_remision(
             )
             session.add(ri)
 
+        # Stock check + deduction run on the session's writer connection: one commit for everything
+        try:
+            inventory_service.apply_stock_changes(list(changes), atomic=True)
+        except StockError as e:
+            item = changes[e.result.change]
+            raise HTTPException(status_code=400, detail=f"Stock insuficiente para {item.product_name}")
+
         session.commit()
         remision_id = remision.id
     except HTTPException:
+        try: session.rollback()
+        except: pass
         raise
     except Exception as e:
         try: session.rollback()
@@ -1075,18 +1293,6 @@ async def create_remision(
     finally:
         try: session.close()
         except: pass
-        try: session.bind.dispose()
-        except: pass
-
-    # Deduct stock — separate connection, after SA fully released
-    import time
-    time.sleep(0.1)
-    for item in data.items:
-        row_idx, _ = inventory_service._find_product_row_by_keyword(item.product_sku, exact_match=True)
-        current_stock = int(inventory_service.inventory_sheet.cell(row_idx, 5).value or 0)
-        inventory_service.inventory_sheet.update_cell(row_idx, 5, current_stock - item.quantity)
-        inventory_service._log_movement("REMISION", item.product_sku, item.product_name,
-                                        -item.quantity, "Web", f"Remision {uid}")
 
     return {"status": "created", "id": remision_id, "uid": uid}
 
@@ -1097,7 +1303,11 @@ async def remision_pdf(
     inventory_service: InventoryService = Depends(get_inventory_service)
 ):
     """Genera PDF de una remision."""
-    from app.database_sa import get_session
+    return await run_db(_remision_pdf, remision_id, inventory_service, lane=ANALYTICS, tenant_id=inventory_service.tenant_id)
+
+
+def _remision_pdf(remision_id: int, inventory_service: InventoryService):
+    from app.database_sa import get_read_session
     from app.models import Remision
     from io import BytesIO
     from fastapi.responses import StreamingResponse
@@ -1106,63 +1316,63 @@ async def remision_pdf(
     from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
     from reportlab.lib.styles import getSampleStyleSheet
 
-    session = get_session(inventory_service.tenant_id)
+    # Load everything first and close the session: rendering holds no connection
+    session = get_read_session(inventory_service.tenant_id)
     try:
         r = session.query(Remision).filter(Remision.id == remision_id).first()
         if not r:
             raise HTTPException(status_code=404, detail="Remision no encontrada")
-
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=30, bottomMargin=30)
-        styles = getSampleStyleSheet()
-        elements = []
-
-        # Header
+        uid, notes, total_amount, created_at = r.uid, r.notes, r.total_amount, r.created_at
         client_name = r.client.name if r.client else "Sin cliente"
-        elements.append(Paragraph(f"<b>REMISION {r.uid}</b>", styles["Title"]))
-        elements.append(Spacer(1, 6))
-        elements.append(Paragraph(f"Cliente: {client_name}", styles["Normal"]))
-        elements.append(Paragraph(f"Fecha: {str(r.created_at)[:16]}", styles["Normal"]))
-        if r.notes:
-            elements.append(Paragraph(f"Notas: {r.notes}", styles["Normal"]))
-        elements.append(Spacer(1, 12))
-
-        # Items table
-        data = [["Producto", "SKU", "Cant.", "Unit.", "Precio", "Subtotal"]]
-        for item in r.items:
-            data.append([
-                item.product_name, item.product_sku, str(item.quantity),
-                item.unit, f"${item.unit_price:,.0f}", f"${item.subtotal:,.0f}"
-            ])
-        data.append(["", "", "", "", "TOTAL", f"${r.total_amount:,.0f}"])
-
-        table = Table(data, colWidths=[140, 70, 50, 40, 70, 70])
-        table.setStyle(TableStyle([
-            ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#4F46E5")),
-            ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
-            ("FONTSIZE", (0, 0), (-1, -1), 9),
-            ("ALIGN", (2, 1), (3, -1), "CENTER"),
-            ("ALIGN", (4, 1), (-1, -1), "RIGHT"),
-            ("GRID", (0, 0), (-1, -2), 0.5, colors.grey),
-            ("BACKGROUND", (0, -1), (-1, -1), colors.HexColor("#EEF2FF")),
-            ("FONTNAME", (0, -1), (-1, -1), "Helvetica-Bold"),
-        ]))
-        elements.append(table)
-
-        doc.build(elements)
-        buffer.seek(0)
-
-        return StreamingResponse(
-            buffer,
-            media_type="application/pdf",
-            headers={"Content-Disposition": f"attachment; filename=remision-{r.uid}.pdf"}
-        )
+        items = [(i.product_name, i.product_sku, i.quantity, i.unit, i.unit_price, i.subtotal) for i in r.items]
     finally:
         session.close()
 
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=30, bottomMargin=30)
+    styles = getSampleStyleSheet()
+    elements = []
+
+    # Header
+    elements.append(Paragraph(f"<b>REMISION {uid}</b>", styles["Title"]))
+    elements.append(Spacer(1, 6))
+    elements.append(Paragraph(f"Cliente: {client_name}", styles["Normal"]))
+    elements.append(Paragraph(f"Fecha: {str(created_at)[:16]}", styles["Normal"]))
+    if notes:
+        elements.append(Paragraph(f"Notas: {notes}", styles["Normal"]))
+    elements.append(Spacer(1, 12))
+
+    # Items table
+    data = [["Producto", "SKU", "Cant.", "Unit.", "Precio", "Subtotal"]]
+    for name, sku, quantity, unit, unit_price, subtotal in items:
+        data.append([name, sku, str(quantity), unit, f"${unit_price:,.0f}", f"${subtotal:,.0f}"])
+    data.append(["", "", "", "", "TOTAL", f"${total_amount:,.0f}"])
+
+    table = Table(data, colWidths=[140, 70, 50, 40, 70, 70])
+    table.setStyle(TableStyle([
+        ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#4F46E5")),
+        ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
+        ("FONTSIZE", (0, 0), (-1, -1), 9),
+        ("ALIGN", (2, 1), (3, -1), "CENTER"),
+        ("ALIGN", (4, 1), (-1, -1), "RIGHT"),
+        ("GRID", (0, 0), (-1, -2), 0.5, colors.grey),
+        ("BACKGROUND", (0, -1), (-1, -1), colors.HexColor("#EEF2FF")),
+        ("FONTNAME", (0, -1), (-1, -1), "Helvetica-Bold"),
+    ]))
+    elements.append(table)
+
+    doc.build(elements)
+    buffer.seek(0)
+
+    return StreamingResponse(
+        buffer,
+        media_type="application/pdf",
+        headers={"Content-Disposition": f"attachment; filename=remision-{uid}.pdf"}
+    )
+
 
 @router.get('/tenant-info')
-async def get_tenant_info(
+def get_tenant_info(
     token: str = Query(...),
     inventory_service: InventoryService = Depends(get_inventory_service)
 ):
@@ -1176,7 +1386,7 @@ async def get_tenant_info(
         "token": token,
         "pyme_name": tenant.get("pyme_name", token),
         "business_type": tenant.get("business_type", "PyME"),
-        "tenant_id": tenant.get("id", ""),
+        "tenant_id": tenant.get("tenant_id", ""),
         "nit": tenant.get("nit", ""),
         "address": tenant.get("address", ""),
         "description": tenant.get("description", ""),
@@ -1195,7 +1405,7 @@ class ProfileUpdateSchema(BaseModel):
 
 
 @router.patch('/profile')
-async def update_profile(
+def update_profile(
     updates: ProfileUpdateSchema,
     token: str = Query(...),
     inventory_service: InventoryService = Depends(get_inventory_service)
@@ -1215,6 +1425,8 @@ async def update_profile(
         for col, val in changed.items():
             setattr(tenant, col, val)
         session.commit()
+        from app.core.auth import invalidate_tenant_cache
+        invalidate_tenant_cache(tenant.tenant_id)
         return {"status": "updated"}
     except HTTPException:
         raise
@@ -25,7 +25,7 @@ def login(data: LoginRequest):
     # Admin bypass
     if data.token == '3HF784F':
         return LoginResponse(
-            access_token=create_token(tenant_id="admin", original_token="3HF784F"),
+            access_token=create_token(tenant_id="admin", original_token="3HF784F", pyme_name="Admin"),
             tenant_id="admin",
             token="3HF784F",
         )
@@ -42,7 +42,8 @@ def login(data: LoginRequest):
     except Exception as e:
         raise HTTPException(status_code=503, detail="Servicio temporalmente no disponible")
 
-    jwt_token = create_token(tenant_id=tenant_id, original_token=data.token)
+    jwt_token = create_token(tenant_id=tenant_id, original_token=data.token,
+                             pyme_name=info["pyme_name"], sheet_id=info["sheet_id"])
     return LoginResponse(
         access_token=jwt_token,
         tenant_id=tenant_id,
@@ -38,6 +38,7 @@ def get_stats(
 def get_admin_stats(days: int = Query(30, ge=1, le=90)):
     """Admin: agrega stats de todos los tenants con desglose por PyME."""
     import os, glob
+    from app.core.database import DB_DIR
     from app.services.tenant_service import TenantService
 
     all_stats = {
@@ -56,7 +57,7 @@ def get_admin_stats(days: int = Query(30, ge=1, le=90)):
     except Exception:
         tenant_names = {}
 
-    for db_file in glob.glob(os.path.join("/app/data", "usage_*.db")):
+    for db_file in glob.glob(os.path.join(DB_DIR, "usage_*.db")):
         try:
             tid = db_file.split("usage_")[1].replace(".db", "")
             tracker = UsageTracker(tenant_id=tid)
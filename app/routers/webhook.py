@@ -5,6 +5,8 @@ from fastapi import APIRouter, Request, BackgroundTasks
 from app.core.config import settings
 from app.services.factory import get_inventory_service, get_tenant_service
 from app.services.ia_service import interpret_intent
+from app.core.executor import run_db, AI
+from app.core.state import state
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -22,7 +24,9 @@ router = APIRouter(
 TELEGRAM_SAFE_TEXT_LIMIT = 3800
 
 # Estado pendiente para resolucion multi-match: {user_id: {action, intent, matches, query}}
-pending_resolution: dict[str, dict] = {}
+# Vive en el state store para que cualquier worker pueda resolver la respuesta
+PENDING_NAMESPACE = "pending_resolution"
+PENDING_TTL = 1800
 
 
 def escape_markdown_v2(text):
@@ -120,7 +124,7 @@ async def process_telegram_update(data: dict):
 
         # 2. Verificar usuario en el sistema
         tenant_service = get_tenant_service()
-        tenant = tenant_service.get_tenant_by_user(str(user_id))
+        tenant = await run_db(tenant_service.get_tenant_by_user, str(user_id))
 
         # Flujo A: usuario nuevo (no registrado)
         if not tenant:
@@ -131,7 +135,7 @@ async def process_telegram_update(data: dict):
                     return
 
                 token = parts[1].strip()
-                success, msg = tenant_service.link_user(str(user_id), token)
+                success, msg = await run_db(tenant_service.link_user, str(user_id), token)
                 await send_telegram_message(chat_id, msg)
             else:
                 safe_name = escape_markdown_v2(user_name)
@@ -144,25 +148,25 @@ async def process_telegram_update(data: dict):
 
         # Flujo B: usuario registrado (negocio activo)
 
-        inventory_service = get_inventory_service(
-            sheet_id=tenant['sheet_id'],
-            tenant_id=tenant['tenant_id']
+        tenant_id = tenant['tenant_id']
+        inventory_service = await run_db(
+            get_inventory_service, sheet_id=tenant['sheet_id'], tenant_id=tenant_id
         )
 
         # Verificar si el usuario esta resolviendo un multi-match pendiente
-        pending = pending_resolution.get(str(user_id))
+        pending = await run_db(state.get, PENDING_NAMESPACE, str(user_id))
         if pending:
             logger.info(f" Resolviendo multi-match pendiente: {pending['action']} | respuesta: {text}")
-            resolve_matches = inventory_service._find_products_by_keyword(text)
+            resolve_matches = await run_db(inventory_service._find_products_by_keyword, text, tenant_id=tenant_id)
             pending_skus = {m["sku"] for m in pending["matches"]}
             hits = [m for m in resolve_matches if m["sku"] in pending_skus]
 
             if len(hits) == 1:
                 # Ejecutar la accion original con el producto seleccionado
-                pending_resolution.pop(str(user_id), None)
+                await run_db(state.delete, PENDING_NAMESPACE, str(user_id))
                 intent = pending["intent"].copy()
                 intent["producto"] = hits[0]["name"]
-                response_text = inventory_service.process_instruction(intent, user_name)
+                response_text = await run_db(inventory_service.process_instruction, intent, user_name, tenant_id=tenant_id)
                 await send_telegram_message(chat_id, response_text)
                 return
             else:
@@ -176,14 +180,14 @@ async def process_telegram_update(data: dict):
                 return
 
         # 3. Interpretar intencion con IA
-        intent_json = interpret_intent(text)
+        intent_json = await run_db(interpret_intent, text, lane=AI)
 
         # 4. Ejecutar en su inventario especifico
-        response_text = inventory_service.process_instruction(intent_json, user_name)
+        response_text = await run_db(inventory_service.process_instruction, intent_json, user_name, tenant_id=tenant_id)
 
         # 5. Si hay multi-match pendiente, guardarlo para el proximo mensaje
         if inventory_service.pending_multi_match:
-            pending_resolution[str(user_id)] = inventory_service.pending_multi_match
+            await run_db(state.set, PENDING_NAMESPACE, str(user_id), inventory_service.pending_multi_match, ttl=PENDING_TTL)
             logger.info(f" Multi-match pendiente guardado para user {user_id}: {inventory_service.pending_multi_match['action']}")
 
         # 6. Responder
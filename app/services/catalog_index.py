@@ -0,0 +1,210 @@
+"""
+CatalogIndex — warm per-tenant product index for the Telegram hot path.
+
+Resolving one product name used to take several SQL round trips per message
+(code probe, exact name, search tiers). The index keeps, per tenant:
+  - records by id (with stock, for the multi-match menu)
+  - code_key(sku/invima/lote) → ids, same precedence as product_codes
+  - folded name → ids, and a token → ids inverted index for word-prefix search
+It loads lazily and is checked against the tenant data version on every use
+(one PK read). When the version moved, the change_log feed tells which SKUs
+to re-read, so a sale patches one entry instead of reloading the catalog.
+Indexes live in the "catalog" named cache: LRU across tenants within
+CATALOG_MAX_BYTES.
+"""
+import bisect
+import heapq
+import logging
+import re
+import threading
+from typing import Optional
+
+from app.core.cache import get_named_cache
+from app.core.config import settings
+from app.core.database import get_data_version
+from app.core.migrations import code_key, fold_text
+from app.services.inventory_repository import InventoryRepository, ProductRecord
+
+logger = logging.getLogger(__name__)
+
+_CODE_RANK = {"sku": 0, "invima": 1, "lote": 2}
+_WORD = re.compile(r"\w+")
+_PATCH_LIMIT = 5000  # more pending changes than this: rebuild instead
+_ENTRY_BYTES = 1024
+
+
+def _tokens(folded: str) -> list[str]:
+    return _WORD.findall(folded)
+
+
+class CatalogIndex:
+    """In-memory lookups over one tenant's catalog. Thread-safe; returns records (treat as read-only)."""
+
+    def __init__(self, tenant_id: str):
+        self.tenant_id = tenant_id
+        self.version = -1
+        self.cursor = 0
+        self.nbytes = 0
+        self._lock = threading.RLock()
+        self._products: dict[int, ProductRecord] = {}
+        self._codes: dict[str, list[tuple[int, int]]] = {}   # code_key → sorted [(kind rank, id)]
+        self._names: dict[str, set[int]] = {}
+        self._postings: dict[str, set[int]] = {}
+        self._sorted_tokens: Optional[list[str]] = None      # rebuilt lazily after patches
+
+    # ── Building ──
+
+    def _add(self, record: ProductRecord):
+        self._products[record.id] = record
+        for kind, rank in _CODE_RANK.items():
+            key = code_key(getattr(record, kind))
+            if key:
+                bisect.insort(self._codes.setdefault(key, []), (rank, record.id))
+        folded = fold_text(record.name)
+        self._names.setdefault(folded, set()).add(record.id)
+        for token in set(_tokens(folded)):
+            if token not in self._postings:
+                self._sorted_tokens = None
+            self._postings.setdefault(token, set()).add(record.id)
+        self.nbytes += self._record_bytes(record)
+
+    def _remove(self, product_id: int):
+        record = self._products.pop(product_id, None)
+        if record is None:
+            return
+        for kind, rank in _CODE_RANK.items():
+            key = code_key(getattr(record, kind))
+            entries = self._codes.get(key)
+            if entries and (rank, product_id) in entries:
+                entries.remove((rank, product_id))
+                if not entries:
+                    del self._codes[key]
+        folded = fold_text(record.name)
+        self._names.get(folded, set()).discard(product_id)
+        if not self._names.get(folded):
+            self._names.pop(folded, None)
+        for token in set(_tokens(folded)):
+            ids = self._postings.get(token)
+            if ids is not None:
+                ids.discard(product_id)
+                if not ids:
+                    del self._postings[token]
+                    self._sorted_tokens = None
+        self.nbytes -= self._record_bytes(record)
+
+    @staticmethod
+    def _record_bytes(record: ProductRecord) -> int:
+        # Measured ~1 KB per product (record, its strings, index slots); names dominate the rest
+        return _ENTRY_BYTES + 2 * len(record.name)
+
+    def load(self, repo: InventoryRepository):
+        """Full (re)build. Version and cursor are read first: later writes get patched in."""
+        with self._lock:
+            version = get_data_version(self.tenant_id)
+            cursor = repo.change_cursor()
+            self._products.clear()
+            self._codes.clear()
+            self._names.clear()
+            self._postings.clear()
+            self._sorted_tokens = None
+            self.nbytes = 0
+            for record in repo.iter_products():
+                self._add(record)
+            self.version, self.cursor = version, cursor
+        logger.debug(f"Catalog index {self.tenant_id}: {len(self._products)} products, ~{self.nbytes >> 10} KB")
+
+    def refresh(self, repo: InventoryRepository) -> bool:
+        """Bring the index up to the current data version. Returns True if anything was re-read."""
+        version = get_data_version(self.tenant_id)
+        if version == self.version:
+            return False
+        with self._lock:
+            if version == self.version:
+                return False
+            feed = repo.changes(self.cursor, limit=_PATCH_LIMIT)
+            if feed is None or feed["has_more"]:
+                self.load(repo)
+                return True
+            for sku in feed["deleted"]:
+                for product_id in self._ids_for_sku(sku):
+                    self._remove(product_id)
+            for record in feed["products"]:
+                self._remove(record.id)
+                for product_id in self._ids_for_sku(record.sku):  # SKU now owned by another row
+                    self._remove(product_id)
+                self._add(record)
+            self.version, self.cursor = version, feed["cursor"]
+        return True
+
+    def _ids_for_sku(self, sku: str) -> list[int]:
+        return [pid for rank, pid in self._codes.get(code_key(sku), ())
+                if rank == 0 and self._products[pid].sku.upper() == sku.upper()]
+
+    # ── Lookups ──
+
+    def __len__(self):
+        return len(self._products)
+
+    def resolve_code(self, code: str) -> Optional[ProductRecord]:
+        """Like InventoryRepository.resolve_code(): sku beats invima beats lote, then lowest id."""
+        with self._lock:
+            entries = self._codes.get(code_key(code))
+            return self._products[entries[0][1]] if entries else None
+
+    def by_name(self, text: str) -> Optional[ProductRecord]:
+        """Product whose name equals text, ignoring case and accents (lowest id if several)."""
+        with self._lock:
+            ids = self._names.get(fold_text(text))
+            return self._products[min(ids)] if ids else None
+
+    def _prefix_ids(self, word: str) -> set[int]:
+        if self._sorted_tokens is None:
+            self._sorted_tokens = sorted(self._postings)
+        tokens = self._sorted_tokens
+        ids: set[int] = set()
+        i = bisect.bisect_left(tokens, word)
+        while i < len(tokens) and tokens[i].startswith(word):
+            ids |= self._postings[tokens[i]]
+            i += 1
+        return ids
+
+    def search(self, text: str, limit: int = 10) -> list[ProductRecord]:
+        """Names where every query word starts a name word ("jab az" → "Jabón Azul Rey").
+        Whole-word hits first, then shorter names. Empty if nothing matches: callers
+        fall back to InventoryRepository.search_products() for substrings and typos."""
+        words = _tokens(fold_text(text))
+        if not words:
+            return []
+        with self._lock:
+            ids: Optional[set[int]] = None
+            for word in sorted(set(words), key=len, reverse=True):  # longest word: smallest posting set first
+                found = self._prefix_ids(word)
+                ids = found if ids is None else ids & found
+                if not ids:
+                    return []
+            exact = [self._postings.get(w, ()) for w in set(words)]
+            products = self._products
+
+            def rank(product_id: int):
+                record = products[product_id]
+                return -sum(product_id in hits for hits in exact), len(record.name), product_id
+
+            return [products[i] for i in heapq.nsmallest(limit, ids, key=rank)]
+
+
+def get_catalog(tenant_id: str, repo: Optional[InventoryRepository] = None) -> CatalogIndex:
+    """The tenant's index, loaded on first use and refreshed to the current data version."""
+    repo = repo or InventoryRepository(tenant_id)
+    cache = get_named_cache("catalog", max_entries=settings.CATALOG_MAX_TENANTS,
+                            max_bytes=settings.CATALOG_MAX_BYTES, default_ttl=settings.CATALOG_TTL,
+                            sizeof=lambda index: index.nbytes)
+
+    def _build() -> CatalogIndex:
+        index = CatalogIndex(tenant_id)
+        index.load(repo)
+        return index
+
+    index = cache.get_or_load(tenant_id, _build)
+    if index.refresh(repo):
+        cache.set(tenant_id, index)  # re-account its size (and restart its TTL)
+    return index
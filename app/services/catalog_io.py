@@ -0,0 +1,477 @@
+"""
+Catalog import/export — CSV/XLSX, streamed.
+
+Import: the upload is spooled to a temp file, then a background job reads it
+row by row, validates, and upserts by SKU in IMPORT_BATCH_ROWS batches: one
+transaction per batch with executemany for inserts, updates, custom values
+and the CREACION/AJUSTE movements. Memory stays flat whatever the file size.
+Progress and row errors live in the shared state store, so any worker can
+answer GET /api/inventory/import/{job_id}.
+
+Upsert rules: a known SKU is updated (case-insensitive). Only the file's columns
+are written, and blank cells keep the current value. A new SKU needs a name;
+a row without SKU gets a generated one. Headers match product fields in
+English or Spanish ("precio", "cantidad", ...) or custom column names; other
+headers are ignored, or created as text custom columns with create_columns.
+
+Export: keyset pages of EXPORT_PAGE_ROWS (a fresh read connection per page),
+written to the response as they are read. XLSX uses openpyxl (optional
+dependency) in write-only mode.
+"""
+import csv
+import datetime
+import io
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from typing import Iterator, Optional
+
+from app.core.config import settings
+from app.core.database import get_conn, get_read_conn
+from app.core.migrations import fold_text
+from app.core.state import state
+from app.services.inventory_repository import parse_date
+from app.services.movement_writer import insert_movements
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ["sku", "name", "category", "stock", "unit", "cost", "price",
+          "expiration_date", "location", "invima", "lote"]
+
+_ALIASES = {
+    "sku": ("sku", "codigo", "cod", "referencia", "ref"),
+    "name": ("name", "nombre", "producto", "descripcion"),
+    "category": ("category", "categoria"),
+    "stock": ("stock", "cantidad", "existencias"),
+    "unit": ("unit", "unidad"),
+    "cost": ("cost", "costo", "precio compra", "purchase price"),
+    "price": ("price", "precio", "precio venta"),
+    "expiration_date": ("expiration date", "vencimiento", "fecha vencimiento"),
+    "location": ("location", "ubicacion"),
+    "invima": ("invima", "registro invima"),
+    "lote": ("lote",),
+}
+_NEW_DEFAULTS = {"category": "General", "stock": 0, "unit": "UND", "cost": 0, "price": 0,
+                 "expiration_date": "", "location": "", "invima": "", "lote": ""}
+
+_JOBS = "catalog_import"
+_ACTIVE = "catalog_import_active"
+_JOB_TTL = 24 * 3600
+_ACTIVE_TTL = 600  # refreshed every batch; a job lost with its worker unblocks the tenant after this
+_slots = threading.BoundedSemaphore(max(1, settings.IMPORT_CONCURRENCY))
+_EXISTING_SQL = "SELECT id, sku, name, stock FROM products WHERE sku IN ({})"  # one batch's rows by SKU
+
+
+class CatalogIOError(Exception):
+    """Bad upload, missing optional dependency or an import already running; message is user-facing."""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _header_key(text) -> str:
+    return " ".join(fold_text(str(text or "")).replace("_", " ").split())
+
+
+_FIELD_BY_HEADER = {_header_key(alias): field for field, aliases in _ALIASES.items() for alias in aliases}
+
+
+# ── Reading ──
+
+def detect_format(head: bytes, content_type: str = "") -> str:
+    """'xlsx' for a zip container (or the xlsx MIME type), else 'csv'."""
+    if head.startswith(b"PK\x03\x04") or "spreadsheetml" in content_type:
+        return "xlsx"
+    return "csv"
+
+
+def _csv_rows(path: str) -> Iterator[list]:
+    with open(path, newline="", encoding="utf-8-sig", errors="replace") as f:
+        sample = f.read(8192)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;\t|")
+        except csv.Error:
+            dialect = csv.excel
+        yield from csv.reader(f, dialect)
+
+
+def _openpyxl(message: str):
+    """openpyxl is optional: without it XLSX is refused with 501 and CSV still works."""
+    try:
+        import openpyxl
+    except ImportError:
+        raise CatalogIOError(message, status_code=501)
+    return openpyxl
+
+
+def _xlsx_rows(path: str) -> Iterator[list]:
+    openpyxl = _openpyxl("Importar XLSX requiere openpyxl en el servidor; sube el archivo como CSV")
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        for row in workbook.active.iter_rows(values_only=True):
+            yield list(row)
+    finally:
+        workbook.close()
+
+
+def read_rows(path: str, fmt: str) -> Iterator[list]:
+    return _xlsx_rows(path) if fmt == "xlsx" else _csv_rows(path)
+
+
+# ── Cell parsing ──
+
+def _text(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))  # Excel stores codes like 7702001 as floats
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return _date(value)
+    return str(value).strip()
+
+
+_THOUSANDS_DOTS = re.compile(r"-?[1-9]\d{0,2}(\.\d{3})+")
+
+
+def _number(value) -> float:
+    """Plain numbers, plus the es-CO format: '.' groups thousands, ',' is the decimal mark.
+    1.500 → 1500, 1.234,50 → 1234.5, 12,5 → 12.5; with both marks the last one is the
+    decimal (1,234.50 → 1234.5)."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).replace("$", "").replace(" ", "")
+    if _THOUSANDS_DOTS.fullmatch(text):
+        return float(text.replace(".", ""))
+    if "," in text:
+        if "." in text and text.rindex(".") > text.rindex(","):
+            return float(text.replace(",", ""))                   # 1,234.50
+        return float(text.replace(".", "").replace(",", "."))    # 1.234,50
+    return float(text)
+
+
+def _stock(value) -> int:
+    number = _number(value)
+    if not number.is_integer() or number < 0:
+        raise ValueError
+    return int(number)
+
+
+def _date(value) -> str:
+    if isinstance(value, datetime.datetime):
+        return value.date().isoformat()
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    text = str(value).strip()
+    if parse_date(text[:10]):
+        return text[:10]
+    return datetime.datetime.strptime(text, "%d/%m/%Y").date().isoformat()
+
+
+_PARSERS = {"stock": (_stock, "cantidad invalida"), "cost": (_number, "costo invalido"),
+            "price": (_number, "precio invalido"), "expiration_date": (_date, "fecha invalida (AAAA-MM-DD)")}
+
+
+# ── Import job ──
+
+class _Row:
+    __slots__ = ("line", "sku", "values", "custom")
+
+    def __init__(self, line: int, sku: str, values: dict, custom: dict):
+        self.line = line
+        self.sku = sku
+        self.values = values    # field → parsed value, None for blank cells
+        self.custom = custom    # custom column id → text
+
+
+class ImportJob:
+    """One upload being upserted. Call run() in a background thread."""
+
+    def __init__(self, tenant_id: str, path: str, fmt: str, create_columns: bool = False, user: str = "Importacion"):
+        self.tenant_id = tenant_id
+        self.path = path
+        self.fmt = fmt
+        self.create_columns = create_columns
+        self.user = user
+        self.id = uuid.uuid4().hex[:12]
+        self.tx_id = str(uuid.uuid4())[:6]
+        self.fields: list[str] = []                # product fields present in the file
+        self.columns: list[tuple[int, str]] = []   # (position, field) for product fields
+        self.custom_columns: list[tuple[int, int]] = []  # (position, custom column id)
+        self.sku_position = 0
+        self.status = {
+            "id": self.id, "status": "queued", "format": fmt, "rows": 0, "inserted": 0, "updated": 0,
+            "skipped": 0, "errors": [], "ignored_columns": [], "created_columns": [],
+            "started_at": None, "finished_at": None, "elapsed_ms": None, "message": "",
+        }
+
+    # ── Progress ──
+
+    def _save(self):
+        state.set(_JOBS, f"{self.tenant_id}:{self.id}", self.status, ttl=_JOB_TTL)
+        if self.status["status"] in ("queued", "running"):
+            state.set(_ACTIVE, self.tenant_id, self.id, ttl=_ACTIVE_TTL)
+        else:
+            state.delete(_ACTIVE, self.tenant_id)
+
+    def _error(self, line: int, sku: str, message: str):
+        self.status["skipped"] += 1
+        if len(self.status["errors"]) < settings.IMPORT_MAX_ERRORS:
+            self.status["errors"].append({"line": line, "sku": sku, "error": message})
+
+    # ── Header ──
+
+    def _map_header(self, header: list):
+        with get_conn(self.tenant_id) as conn:
+            existing = {fold_text(r["name"]): r["id"] for r in conn.execute("SELECT id, name FROM custom_columns")}
+            for position, cell in enumerate(header):
+                title = _text(cell)
+                key = _header_key(title)
+                if not key:
+                    continue
+                field = _FIELD_BY_HEADER.get(key)
+                if field and field not in self.fields:
+                    self.fields.append(field)
+                    self.columns.append((position, field))
+                elif fold_text(title) in existing:
+                    self.custom_columns.append((position, existing[fold_text(title)]))
+                elif self.create_columns and not field:
+                    column_id = conn.execute("INSERT INTO custom_columns (name, col_type) VALUES (?, 'text')",
+                                             (title,)).lastrowid
+                    existing[fold_text(title)] = column_id
+                    self.custom_columns.append((position, column_id))
+                    self.status["created_columns"].append(title)
+                else:
+                    self.status["ignored_columns"].append(title)
+        self.sku_position = next((p for p, f in self.columns if f == "sku"), len(header))
+        if "sku" not in self.fields and "name" not in self.fields:
+            raise CatalogIOError("El archivo debe tener una columna SKU o Nombre")
+
+    def _parse(self, line: int, cells: list) -> Optional[_Row]:
+        values = {}
+        for position, field in self.columns:
+            cell = cells[position] if position < len(cells) else None
+            if cell is None or _text(cell) == "":
+                values[field] = None
+                continue
+            parser, message = _PARSERS.get(field, (_text, ""))
+            try:
+                values[field] = parser(cell)
+            except (ValueError, TypeError):
+                sku = values.get("sku") or (_text(cells[self.sku_position]) if self.sku_position < len(cells) else "")
+                self._error(line, sku, f"{message}: {_text(cell)}")
+                return None
+        custom = {}
+        for position, column_id in self.custom_columns:
+            text = _text(cells[position]) if position < len(cells) else ""
+            if text:
+                custom[column_id] = text
+        sku = (values.pop("sku", None) or "").upper()
+        if not sku:
+            if not values.get("name"):
+                return None  # blank line
+            sku = f"GEN-{uuid.uuid4().hex[:8].upper()}"
+        return _Row(line, sku, values, custom)
+
+    # ── Writing ──
+
+    def _write_batch(self, batch: list[_Row]):
+        fields = [f for f in self.fields if f != "sku"]
+        now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        inserts, updates, movements, custom = [], [], [], []
+        with get_conn(self.tenant_id) as conn:
+            existing = {
+                row["sku"].upper(): row for row in conn.execute(
+                    _EXISTING_SQL.format(", ".join("?" * len(batch))), [r.sku for r in batch])
+            }
+            for r in batch:
+                current = existing.get(r.sku)
+                if current is None:
+                    if not r.values.get("name"):
+                        self._error(r.line, r.sku, "nombre requerido para un producto nuevo")
+                        continue
+                    record = {**_NEW_DEFAULTS, **{k: v for k, v in r.values.items() if v is not None}}
+                    inserts.append((str(uuid.uuid4())[:8], r.sku, *(record[f] for f in FIELDS[1:])))
+                    if record["stock"]:
+                        movements.append((now, self.tx_id, "CREACION", r.sku, record["name"],
+                                          record["stock"], self.user, "Importacion"))
+                    sku = r.sku
+                    self.status["inserted"] += 1
+                else:
+                    updates.append((*(r.values.get(f) for f in fields), current["id"]))
+                    stock = r.values.get("stock")
+                    if stock is not None and stock != (current["stock"] or 0):
+                        movements.append((now, self.tx_id, "AJUSTE", current["sku"], r.values.get("name") or current["name"],
+                                          stock - (current["stock"] or 0), self.user, "Importacion"))
+                    sku = current["sku"]
+                    self.status["updated"] += 1
+                custom.extend((sku, column_id, value) for column_id, value in r.custom.items())
+            if inserts:
+                conn.executemany(
+                    f"INSERT INTO products (uuid, {', '.join(FIELDS)}) VALUES ({', '.join('?' * (len(FIELDS) + 1))})",
+                    inserts
+                )
+            if updates and fields:
+                assignments = ", ".join(f"{f} = coalesce(?, {f})" for f in fields)
+                conn.executemany(
+                    f"UPDATE products SET {assignments}, updated_at = datetime('now','localtime') WHERE id = ?",
+                    updates
+                )
+            insert_movements(conn, movements)
+            conn.executemany(
+                "INSERT OR REPLACE INTO product_custom_values (product_sku, column_id, value) VALUES (?, ?, ?)",
+                custom
+            )
+
+    def _import(self):
+        rows = read_rows(self.path, self.fmt)
+        header = next(rows, None)
+        if header is None:
+            raise CatalogIOError("El archivo esta vacio")
+        self._map_header(header)
+        seen: set[str] = set()
+        batch: list[_Row] = []
+        for line, cells in enumerate(rows, start=2):
+            self.status["rows"] += 1
+            row = self._parse(line, cells)
+            if row is None:
+                continue
+            if row.sku in seen:
+                self._error(line, row.sku, "SKU repetido en el archivo")
+                continue
+            seen.add(row.sku)
+            batch.append(row)
+            if len(batch) >= settings.IMPORT_BATCH_ROWS:
+                self._write_batch(batch)
+                batch = []
+                self._save()
+        if batch:
+            self._write_batch(batch)
+
+    def _wait_for_slot(self):
+        """Block until an import slot is free, renewing the tenant's claim meanwhile:
+        a job queued longer than _ACTIVE_TTL must not let a second import in."""
+        while not _slots.acquire(timeout=_ACTIVE_TTL / 3):
+            state.set(_ACTIVE, self.tenant_id, self.id, ttl=_ACTIVE_TTL)
+
+    def run(self):
+        self._wait_for_slot()
+        try:
+            started = time.perf_counter()
+            self.status.update(status="running", started_at=datetime.datetime.now().isoformat(timespec="seconds"))
+            self._save()
+            try:
+                self._import()
+                self.status["status"] = "done"
+            except CatalogIOError as e:
+                self.status.update(status="failed", message=str(e))
+            except Exception as e:
+                logger.error(f"Import {self.id} ({self.tenant_id}) failed: {e}", exc_info=True)
+                self.status.update(status="failed", message=str(e))
+            finally:
+                try:
+                    os.remove(self.path)
+                except OSError:
+                    pass
+                self.status.update(finished_at=datetime.datetime.now().isoformat(timespec="seconds"),
+                                   elapsed_ms=round((time.perf_counter() - started) * 1000))
+                self._save()
+        finally:
+            _slots.release()
+        logger.info(f"Import {self.id} ({self.tenant_id}): {self.status['status']} | rows={self.status['rows']} "
+                    f"inserted={self.status['inserted']} updated={self.status['updated']} skipped={self.status['skipped']}")
+
+
+def spool_path() -> str:
+    """Temp file for an upload; the import job deletes it when done."""
+    fd, path = tempfile.mkstemp(prefix="import-", suffix=".upload")
+    os.close(fd)
+    return path
+
+
+def start_import(tenant_id: str, path: str, fmt: str, create_columns: bool = False) -> dict:
+    """Queue an import of the spooled file. One import per tenant at a time
+    (claimed with an atomic state.add, so two uploads can't both pass the check)."""
+    try:
+        if fmt == "xlsx":
+            _openpyxl("Importar XLSX requiere openpyxl en el servidor; sube el archivo como CSV")
+        job = ImportJob(tenant_id, path, fmt, create_columns)
+        if not state.add(_ACTIVE, tenant_id, job.id, ttl=_ACTIVE_TTL):
+            raise CatalogIOError("Ya hay una importacion en curso", status_code=409)
+    except CatalogIOError:
+        os.remove(path)
+        raise
+    job._save()
+    threading.Thread(target=job.run, name=f"catalog-import-{job.id}", daemon=True).start()
+    return dict(job.status)
+
+
+def get_import_status(tenant_id: str, job_id: str) -> Optional[dict]:
+    return state.get(_JOBS, f"{tenant_id}:{job_id}")
+
+
+# ── Export ──
+
+def _custom_columns(tenant_id: str) -> list[tuple[int, str]]:
+    with get_read_conn(tenant_id) as conn:
+        return [(r["id"], r["name"]) for r in conn.execute("SELECT id, name FROM custom_columns ORDER BY id")]
+
+
+def export_rows(tenant_id: str) -> Iterator[list]:
+    """Header, then one list per product (custom columns last), in id order."""
+    columns = _custom_columns(tenant_id)
+    yield FIELDS + [name for _, name in columns]
+    last_id = 0
+    while True:
+        with get_read_conn(tenant_id) as conn:
+            page = conn.execute(
+                f"SELECT id, {', '.join(FIELDS)} FROM products WHERE id > ? ORDER BY id LIMIT ?",
+                (last_id, settings.EXPORT_PAGE_ROWS)
+            ).fetchall()
+            if not page:
+                return
+            values: dict[tuple[str, int], str] = {}
+            if columns:
+                placeholders = ", ".join("?" * len(page))
+                for r in conn.execute(
+                    f"SELECT product_sku, column_id, value FROM product_custom_values WHERE product_sku IN ({placeholders})",
+                    [row["sku"] for row in page]
+                ):
+                    values[(r["product_sku"].upper(), r["column_id"])] = r["value"]
+        for row in page:
+            sku = row["sku"].upper()
+            yield [row[f] if row[f] is not None else "" for f in FIELDS] + \
+                  [values.get((sku, column_id), "") for column_id, _ in columns]
+        last_id = page[-1]["id"]
+
+
+def export_csv(tenant_id: str) -> Iterator[bytes]:
+    """UTF-8 CSV with BOM (Excel reads the accents), one chunk per page."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write("\ufeff")
+    for i, row in enumerate(export_rows(tenant_id)):
+        writer.writerow(row)
+        if i % settings.EXPORT_PAGE_ROWS == 0:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+
+def export_xlsx(tenant_id: str) -> str:
+    """Write the catalog to a temp .xlsx (write-only workbook, constant memory); caller deletes it."""
+    openpyxl = _openpyxl("Exportar XLSX requiere openpyxl en el servidor; usa format=csv")
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet("Inventario")
+    for row in export_rows(tenant_id):
+        sheet.append(row)
+    fd, path = tempfile.mkstemp(prefix="export-", suffix=".xlsx")
+    os.close(fd)
+    workbook.save(path)
+    return path
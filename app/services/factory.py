@@ -11,12 +11,22 @@ class _DummyInventoryService:
     def __init__(self):
         self.inventory_sheet = _DummySheet()
         self.history_sheet = _DummySheet()
+        self.repo = _DummyRepository()
         self.pending_multi_match = None
         self.tenant_id = "admin"
 
     def _find_product_row_by_keyword(self, *args, **kwargs):
         return None, None
 
+    def _find_product_rows_by_keywords(self, queries):
+        return {q: (None, None) for q in queries}
+
+    def apply_stock_changes(self, changes, atomic=True):
+        return []
+
+    def update_products(self, edits):
+        return {}
+
     def _log_movement(self, *args, **kwargs):
         pass
 
@@ -33,6 +43,26 @@ class _DummyCell:
     value = ''
 
 
+class _DummyRepository:
+    def products(self): return []
+    def iter_products(self, batch=1000): return iter(())
+    def get_product(self, product_id): return None
+    def get_product_by_sku(self, sku): return None
+    def resolve_code(self, code): return None
+    def resolve_codes(self, codes): return {}
+    def search_products(self, text, limit=10): return []
+    def count_products(self, **filters): return 0
+    def categories(self): return []
+    def product_page(self, **kwargs): return [], None
+    def change_cursor(self): return 0
+    def changes(self, since, limit=1000):
+        return {"cursor": since, "has_more": False, "products": [], "deleted": [], "columns_changed": False}
+    def stock_totals(self, low_stock=5): return 0, 0.0, 0
+    def expiration_counts(self): return []
+    def movements(self, limit=None, since=None): return []
+    def movement_count(self): return 0
+
+
 def get_inventory_service(sheet_id: str = "", tenant_id: str = ""):
     """Returns InventoryService (SQLite). Admin gets dummy service."""
     if not tenant_id:
@@ -0,0 +1,476 @@
+"""
+InventoryRepository — typed reads over a tenant's products and movements.
+
+SheetAdapter.get_all_values() stringifies every value to look like gspread;
+parsing it back with isdigit() heuristics zeroed negative stock and decimal
+prices. The repository returns compact __slots__ records with native
+int/float values instead (coerced in SQL, so legacy TEXT cells still come
+back typed), and lets SQLite do ordering and filtering on indexed columns.
+"""
+import datetime
+from difflib import SequenceMatcher
+from functools import lru_cache
+from typing import Iterator, Optional
+
+from app.core.database import get_read_conn
+from app.core.migrations import code_key, fold_text
+
+
+@lru_cache(maxsize=4096)
+def parse_date(value: str) -> Optional[datetime.date]:
+    """'YYYY-MM-DD' → date (None if empty/invalid). Memoized: catalogs repeat dates a lot."""
+    if not value:
+        return None
+    try:
+        return datetime.datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        return None
+
+
+def parse_timestamp(value: str) -> Optional[datetime.datetime]:
+    """Movement timestamp ('YYYY-MM-DD HH:MM:SS', or just the date) → datetime."""
+    if not value:
+        return None
+    try:
+        return datetime.datetime.fromisoformat(value[:19])
+    except ValueError:
+        try:
+            return datetime.datetime.strptime(value[:10], "%Y-%m-%d")
+        except ValueError:
+            return None
+
+
+class ProductRecord:
+    """One products row. id is the rowid (row_idx elsewhere)."""
+
+    __slots__ = ("id", "uuid", "sku", "name", "category", "stock", "unit", "cost", "price",
+                 "expiration_date", "location", "invima", "lote")
+
+    FIELDS = __slots__[1:]  # API fields, in SheetAdapter column order
+
+    def __init__(self, id, uuid, sku, name, category, stock, unit, cost, price,
+                 expiration_date, location, invima, lote):
+        self.id = id
+        self.uuid = uuid
+        self.sku = sku
+        self.name = name
+        self.category = category
+        self.stock = stock
+        self.unit = unit
+        self.cost = cost
+        self.price = price
+        self.expiration_date = expiration_date
+        self.location = location
+        self.invima = invima
+        self.lote = lote
+
+    @property
+    def expiry(self) -> Optional[datetime.date]:
+        return parse_date(self.expiration_date)
+
+    def to_dict(self) -> dict:
+        return {f: getattr(self, f) for f in self.FIELDS}
+
+    def __repr__(self):
+        return f"ProductRecord(id={self.id}, sku={self.sku!r}, stock={self.stock})"
+
+
+class MovementRecord:
+    """One movements row (ledger entry)."""
+
+    __slots__ = ("id", "timestamp", "tx_id", "mov_type", "sku", "name", "qty", "user", "notes")
+
+    FIELDS = __slots__[1:]
+
+    def __init__(self, id, timestamp, tx_id, mov_type, sku, name, qty, user, notes):
+        self.id = id
+        self.timestamp = timestamp
+        self.tx_id = tx_id
+        self.mov_type = mov_type
+        self.sku = sku
+        self.name = name
+        self.qty = qty
+        self.user = user
+        self.notes = notes
+
+    @property
+    def at(self) -> Optional[datetime.datetime]:
+        return parse_timestamp(self.timestamp)
+
+    def to_dict(self) -> dict:
+        return {f: getattr(self, f) for f in self.FIELDS}
+
+    def __repr__(self):
+        return f"MovementRecord(id={self.id}, {self.mov_type} {self.sku} {self.qty})"
+
+
+# NULLs become ''/0 and numeric columns are CAST, so records never need re-parsing
+_PRODUCT_SELECT = """
+    SELECT id, coalesce(uuid, ''), sku, coalesce(name, ''), coalesce(category, ''),
+           CAST(coalesce(stock, 0) AS INTEGER), coalesce(unit, ''),
+           CAST(coalesce(cost, 0) AS REAL), CAST(coalesce(price, 0) AS REAL),
+           coalesce(expiration_date, ''), coalesce(location, ''),
+           coalesce(invima, ''), coalesce(lote, '')
+    FROM products
+"""
+
+# v1 databases wrote (type, quantity); later rows use (mov_type, qty)
+_MOVEMENT_SELECT = """
+    SELECT id, coalesce(timestamp, ''), coalesce(tx_id, ''), coalesce(mov_type, type, ''),
+           coalesce(sku, ''), coalesce(name, ''), CAST(coalesce(qty, quantity, 0) AS INTEGER),
+           coalesce(user, ''), coalesce(notes, '')
+    FROM movements
+"""
+
+
+# sku beats invima beats lote when one code matches several products
+_CODE_ORDER = "CASE kind WHEN 'sku' THEN 0 WHEN 'invima' THEN 1 ELSE 2 END, product_id"
+
+# Statements shared with tests/test_query_plans.py, which checks each one's index use
+_BY_SKU_SQL = _PRODUCT_SELECT + " WHERE sku = ?"
+_RESOLVE_CODE_SQL = (_PRODUCT_SELECT + " WHERE id = (SELECT product_id FROM product_codes WHERE code = ? "
+                     f"ORDER BY {_CODE_ORDER} LIMIT 1)")
+_RESOLVE_CODES_SQL = "SELECT code, product_id FROM product_codes WHERE code IN ({}) ORDER BY " + _CODE_ORDER
+_EXPIRATION_COUNTS_SQL = ("SELECT expiration_date, count(*) FROM products "
+                          "WHERE expiration_date IS NOT NULL AND expiration_date != '' GROUP BY expiration_date")
+_CHANGES_SQL = "SELECT seq, entity, key FROM change_log WHERE seq > ? ORDER BY seq LIMIT ?"
+
+def _movements_query(limit: Optional[int], since: Optional[str]) -> tuple[str, tuple]:
+    sql = _MOVEMENT_SELECT
+    params: list = []
+    if since:
+        sql += " WHERE timestamp >= ?"
+        params.append(since)
+    sql += " ORDER BY timestamp DESC, id DESC"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+    return sql, tuple(params)
+
+
+# Inventory page sort keys → column (all indexed; id is the rowid)
+SORT_COLUMNS = {
+    "name": "name", "sku": "sku", "category": "category", "location": "location",
+    "stock": "stock", "price": "price", "expiration_date": "expiration_date", "created": "id",
+}
+
+
+def _like(text: str) -> str:
+    return "%" + text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+def _keyset(col: str, descending: bool, value, last_id: int) -> tuple[str, list]:
+    """WHERE clause for rows after (value, last_id) in ORDER BY col, id.
+    SQLite sorts NULLs first, so they come before everything ascending and last descending."""
+    if col == "id":
+        return ("id < ?" if descending else "id > ?"), [last_id]
+    if value is None:
+        if descending:
+            return f"({col} IS NULL AND id < ?)", [last_id]
+        return f"(({col} IS NULL AND id > ?) OR {col} IS NOT NULL)", [last_id]
+    if descending:
+        return f"(({col}, id) < (?, ?) OR {col} IS NULL)", [value, last_id]
+    return f"({col}, id) > (?, ?)", [value, last_id]
+
+
+def _phrase(text: str) -> str:
+    """FTS5 string literal; with the trigram tokenizer a phrase is a substring match."""
+    return '"' + text.replace('"', '""') + '"'
+
+
+def _trigrams(text: str) -> set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _similarity(query: str, name: str) -> float:
+    """0..1: query inside name or name inside query (trigram coverage), or the
+    words of one found in the other allowing typos ("cemneto" ~ "cemento")."""
+    q3, n3 = _trigrams(query), _trigrams(name)
+    if not q3 or not n3:
+        return 0.0
+    shared = len(q3 & n3)
+    coverage = max(shared / len(q3), shared / len(n3))
+    query_words = [w for w in query.split() if len(w) >= 3] or [query]
+    name_words = [w for w in name.split() if len(w) >= 3] or [name]
+
+    def words_found(words, other):
+        return sum(max(SequenceMatcher(None, w, o).ratio() for o in other) for w in words) / len(words)
+
+    return max(coverage, words_found(query_words, name_words), words_found(name_words, query_words))
+
+
+FUZZY_MIN_SCORE = 0.75   # below this a product isn't offered as a match
+FUZZY_MARGIN = 0.1       # only matches this close to the best one are returned
+
+
+class InventoryRepository:
+    """Read-only typed access to one tenant DB (reader connections only)."""
+
+    def __init__(self, tenant_id: str):
+        self.tenant_id = tenant_id
+
+    def _fetch(self, sql: str, params: tuple, record) -> list:
+        with get_read_conn(self.tenant_id) as conn:
+            cur = conn.cursor()
+            # Build records straight from the row tuple (no sqlite3.Row in between)
+            cur.row_factory = lambda _cur, row: record(*row)
+            return cur.execute(sql, params).fetchall()
+
+    # ── Products ──
+
+    def products(self) -> list[ProductRecord]:
+        """Whole catalog, newest first (same order as the sheet view)."""
+        return self._fetch(_PRODUCT_SELECT + " ORDER BY id DESC", (), ProductRecord)
+
+    def iter_products(self, batch: int = 1000) -> Iterator[ProductRecord]:
+        """Stream the catalog without materializing it (exports, aggregates)."""
+        with get_read_conn(self.tenant_id) as conn:
+            cur = conn.cursor()
+            cur.row_factory = lambda _cur, row: ProductRecord(*row)
+            cur.execute(_PRODUCT_SELECT + " ORDER BY id DESC")
+            while rows := cur.fetchmany(batch):
+                yield from rows
+
+    def get_product(self, product_id: int) -> Optional[ProductRecord]:
+        rows = self._fetch(_PRODUCT_SELECT + " WHERE id = ?", (product_id,), ProductRecord)
+        return rows[0] if rows else None
+
+    def get_product_by_sku(self, sku: str) -> Optional[ProductRecord]:
+        rows = self._fetch(_BY_SKU_SQL, (sku.strip(),), ProductRecord)
+        return rows[0] if rows else None
+
+    # ── Identifier lookups ──
+
+    def resolve_code(self, code: str) -> Optional[ProductRecord]:
+        """Product whose sku, invima or lote equals code (normalized with code_key())."""
+        key = code_key(code)
+        if not key:
+            return None
+        rows = self._fetch(_RESOLVE_CODE_SQL, (key,), ProductRecord)
+        return rows[0] if rows else None
+
+    def resolve_codes(self, codes) -> dict[str, ProductRecord]:
+        """Batch resolve_code(): {code as given: product} for the codes that match, in one query."""
+        keys: dict[str, list[str]] = {}
+        for code in codes:
+            key = code_key(code)
+            if key:
+                keys.setdefault(key, []).append(code)
+        if not keys:
+            return {}
+        best: dict[str, int] = {}
+        with get_read_conn(self.tenant_id) as conn:
+            for i in range(0, len(keys), 500):
+                chunk = list(keys)[i:i + 500]
+                for key, product_id in conn.execute(_RESOLVE_CODES_SQL.format(",".join("?" * len(chunk))), chunk):
+                    best.setdefault(key, product_id)
+        records = {r.id: r for r in self._by_ids(list(dict.fromkeys(best.values())))}
+        return {code: records[pid] for key, pid in best.items() if pid in records for code in keys[key]}
+
+    # ── Search ──
+
+    def has_search_index(self) -> bool:
+        """products_fts exists (migration v7 on a SQLite build with FTS5)."""
+        with get_read_conn(self.tenant_id) as conn:
+            return conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'products_fts'"
+            ).fetchone() is not None
+
+    def _fts_ids(self, match: str, limit: int) -> list[int]:
+        with get_read_conn(self.tenant_id) as conn:
+            return [r[0] for r in conn.execute(
+                "SELECT rowid FROM products_fts WHERE products_fts MATCH ? ORDER BY rank LIMIT ?", (match, limit)
+            )]
+
+    def _by_ids(self, ids: list[int]) -> list[ProductRecord]:
+        """Records for ids, in the order given."""
+        if not ids:
+            return []
+        by_id = {r.id: r for r in self._fetch(
+            _PRODUCT_SELECT + f" WHERE id IN ({','.join('?' * len(ids))})", tuple(ids), ProductRecord
+        )}
+        return [by_id[i] for i in ids if i in by_id]
+
+    def search_products(self, text: str, limit: int = 10) -> list[ProductRecord]:
+        """Best name matches for free text (bot lookups), best first.
+
+        Names containing the text (accent/case-insensitive) win, ranked by bm25.
+        Otherwise trigram candidates are scored with _similarity(), which covers
+        typos and names contained in a longer phrase ("vendi cemento gris bolsa");
+        failing that, names containing any of the words (ranked, at most 5)."""
+        query = fold_text(text)
+        if not query:
+            return []
+        if len(query) < 3 or not self.has_search_index():
+            return self._fetch(_PRODUCT_SELECT + " WHERE name LIKE ? ESCAPE '\\' LIMIT ?",
+                               (_like(query), limit), ProductRecord)
+
+        hits = self._by_ids(self._fts_ids("name : " + _phrase(query), limit))
+        if hits:
+            return hits
+
+        trigrams = " OR ".join(_phrase(t) for t in sorted(_trigrams(query)))
+        candidates = self._by_ids(self._fts_ids(f"name : ({trigrams})", max(limit * 5, 50)))
+        scored = sorted(((_similarity(query, fold_text(r.name)), r) for r in candidates),
+                        key=lambda sr: -sr[0])
+        if scored and scored[0][0] >= FUZZY_MIN_SCORE:
+            cutoff = max(FUZZY_MIN_SCORE, scored[0][0] - FUZZY_MARGIN)
+            return [r for score, r in scored if score >= cutoff][:limit]
+
+        # Last resort, as the old word-level fallback: names containing any query word
+        words = [_phrase(w) for w in dict.fromkeys(query.split()) if len(w) >= 3]
+        if len(words) < 2:
+            return []
+        return self._by_ids(self._fts_ids(f"name : ({' OR '.join(words)})", min(limit, 5)))
+
+    # ── Filtered pages ──
+
+    def _filters(self, category: Optional[str] = None, location: Optional[str] = None, low_stock: bool = False,
+                 expiring_before: Optional[str] = None, search: Optional[str] = None,
+                 stock_level: Optional[str] = None) -> tuple[list[str], list]:
+        where: list[str] = []
+        params: list = []
+        if category:
+            where.append("category = ?")
+            params.append(category)
+        if location:
+            where.append("location = ?")
+            params.append(location)
+        if low_stock or stock_level == "low":
+            where.append("stock BETWEEN 1 AND 5")
+        elif stock_level == "out":
+            # As a subquery it is always a covering probe of idx_products_stock; written
+            # inline, the planner would rather walk the sort index to fill the page
+            where.append("id IN (SELECT id FROM products WHERE stock <= 0 OR stock IS NULL)")
+        elif stock_level == "normal":
+            where.append("stock > 5")
+        if expiring_before:
+            where.append("expiration_date > '' AND expiration_date <= ?")
+            params.append(expiring_before)
+        if search and len(fold_text(search)) >= 3 and self.has_search_index():
+            where.append("id IN (SELECT rowid FROM products_fts WHERE products_fts MATCH ?)")
+            params.append(_phrase(fold_text(search)))
+        elif search:
+            pattern = _like(search.strip())
+            where.append("(name LIKE ? ESCAPE '\\' OR sku LIKE ? ESCAPE '\\' "
+                         "OR lote LIKE ? ESCAPE '\\' OR invima LIKE ? ESCAPE '\\')")
+            params.extend([pattern] * 4)
+        return where, params
+
+    def categories(self) -> list[str]:
+        """Distinct non-empty categories, sorted (feeds the table's filter dropdown)."""
+        with get_read_conn(self.tenant_id) as conn:
+            rows = conn.execute("SELECT DISTINCT category FROM products WHERE category > '' ORDER BY category")
+            return [r[0] for r in rows]
+
+    def count_products(self, **filters) -> int:
+        where, params = self._filters(**filters)
+        sql = "SELECT count(*) FROM products" + (" WHERE " + " AND ".join(where) if where else "")
+        with get_read_conn(self.tenant_id) as conn:
+            return conn.execute(sql, params).fetchone()[0]
+
+    def product_page(self, sort: str = "name", descending: bool = False, limit: Optional[int] = None,
+                     after: Optional[tuple] = None, **filters) -> tuple[list[ProductRecord], Optional[tuple]]:
+        """Keyset page: rows after `after` = (sort value, id) in (sort, id) order.
+        Returns (records, key of the last row or None on the last page) — pass
+        the key back as `after` for the next page."""
+        col = SORT_COLUMNS[sort]
+        sql, params = self._page_query(sort, descending, limit, after, **filters)
+        records = self._fetch(sql, params, ProductRecord)
+        if limit is None or len(records) <= limit:
+            return records, None
+        records = records[:limit]
+        last = records[-1]
+        if col == "id":
+            return records, (last.id, last.id)
+        # Records carry coalesced values; the cursor needs the raw column (may be NULL)
+        with get_read_conn(self.tenant_id) as conn:
+            value = conn.execute(f"SELECT {col} FROM products WHERE id = ?", (last.id,)).fetchone()[0]
+        return records, (value, last.id)
+
+    def _page_query(self, sort: str, descending: bool, limit: Optional[int], after: Optional[tuple],
+                    **filters) -> tuple[str, tuple]:
+        """(sql, params) for product_page(); LIMIT asks one extra row to detect a next page."""
+        col = SORT_COLUMNS[sort]
+        where, params = self._filters(**filters)
+        if after is not None:
+            clause, extra = _keyset(col, descending, *after)
+            where.append(clause)
+            params.extend(extra)
+        direction = "DESC" if descending else "ASC"
+        sql = _PRODUCT_SELECT
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY {col} {direction}" + (f", id {direction}" if col != "id" else "")
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit + 1)
+        return sql, tuple(params)
+
+    def stock_totals(self, low_stock: int = 5) -> tuple[int, float, int]:
+        """(products, stock value, products with 0 < stock <= low_stock) in one aggregate."""
+        with get_read_conn(self.tenant_id) as conn:
+            count, value, low = conn.execute(
+                """SELECT count(*),
+                          total(CAST(coalesce(stock, 0) AS INTEGER) * CAST(coalesce(price, 0) AS REAL)),
+                          total(CAST(coalesce(stock, 0) AS INTEGER) BETWEEN 1 AND ?)
+                   FROM products""",
+                (low_stock,)
+            ).fetchone()
+        return count, value, int(low)
+
+    def expiration_counts(self) -> list[tuple[str, int]]:
+        """(expiration_date, products) per distinct non-empty date; parse with parse_date()."""
+        with get_read_conn(self.tenant_id) as conn:
+            return [tuple(r) for r in conn.execute(_EXPIRATION_COUNTS_SQL)]
+
+    # ── Change feed ──
+
+    def change_cursor(self) -> int:
+        """Sequence number of the latest change_log entry (0 if none yet)."""
+        with get_read_conn(self.tenant_id) as conn:
+            row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'").fetchone()
+        return row[0] if row else 0
+
+    def changes(self, since: int, limit: int = 1000) -> Optional[dict]:
+        """What changed after `since`, compacted to current state, or None when
+        entries after `since` were already pruned (caller must reload).
+
+        {"cursor": seq to resume from, "has_more": bool, "products": [ProductRecord],
+         "deleted": [sku], "columns_changed": bool}"""
+        with get_read_conn(self.tenant_id) as conn:
+            oldest = conn.execute("SELECT min(seq) FROM change_log").fetchone()[0]
+            latest = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'").fetchone()
+            latest = latest[0] if latest else 0
+            # since ahead of the log means the DB was replaced (restore); behind it, pruned
+            if since > latest or (since < latest and (oldest is None or since < oldest - 1)):
+                return None
+            rows = conn.execute(_CHANGES_SQL, (since, limit + 1)).fetchall()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        # SKUs compare case-insensitively (COLLATE NOCASE); keep the spelling last logged
+        touched = {r["key"].upper(): r["key"] for r in rows if r["entity"] == "product"}
+        skus = list(touched)
+        current: dict[str, ProductRecord] = {}
+        for i in range(0, len(skus), 500):
+            chunk = skus[i:i + 500]
+            for record in self._fetch(_PRODUCT_SELECT + f" WHERE sku IN ({','.join('?' * len(chunk))})",
+                                      tuple(chunk), ProductRecord):
+                current[record.sku.upper()] = record
+        return {
+            "cursor": rows[-1]["seq"] if rows else since,
+            "has_more": has_more,
+            "products": [current[s] for s in skus if s in current],
+            "deleted": [touched[s] for s in skus if s not in current],
+            "columns_changed": any(r["entity"] == "column" for r in rows),
+        }
+
+    # ── Movements ──
+
+    def movements(self, limit: Optional[int] = None, since: Optional[str] = None) -> list[MovementRecord]:
+        """Newest first. since: 'YYYY-MM-DD[ HH:MM:SS]' lower bound on timestamp (indexed)."""
+        return self._fetch(*_movements_query(limit, since), MovementRecord)
+
+    def movement_count(self) -> int:
+        with get_read_conn(self.tenant_id) as conn:
+            return conn.execute("SELECT count(*) FROM movements").fetchone()[0]
@@ -3,11 +3,17 @@ InventoryServiceSQLite — same interface as InventoryService, SQLite backend.
 Drop-in replacement. api.py and webhook.py work unchanged.
 """
 import datetime
+import sqlite3
 import uuid
 import logging
 import sys
 import unicodedata
-from app.core.database import get_conn, init_tenant_db
+from app.core.database import get_conn, get_read_conn, init_tenant_db
+from app.services.catalog_index import get_catalog
+from app.services.inventory_repository import InventoryRepository
+from app.services.movement_writer import movement_writer
+from app.services.product_updates import EDITABLE_FIELDS, apply_product_edits
+from app.services.stock_ledger import StockChange, StockResult, apply_stock_changes
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -31,6 +37,9 @@ MOVEMENTS_COLS = {
 }
 MOVEMENTS_COL_NAMES = ['timestamp', 'tx_id', 'mov_type', 'sku', 'name', 'qty', 'user', 'notes']
 
+# Exact-name step of _find_product_row_by_keyword (idx_products_name)
+_EXACT_NAME_SQL = "SELECT rowid, name FROM products WHERE name = ? LIMIT 1"
+
 
 class _Cell:
     """Mimics gspread Cell object."""
@@ -52,9 +61,12 @@ class SheetAdapter:
     def _conn(self):
         return get_conn(self._tenant_id)
 
+    def _read_conn(self):
+        return get_read_conn(self._tenant_id)
+
     def get_all_values(self) -> list[list]:
         """Returns 2D array: [header_row, ...data_rows]. Matches gspread format."""
-        with self._conn() as conn:
+        with self._read_conn() as conn:
             cols = ', '.join(self._col_names)
             rows = conn.execute(f"SELECT {cols} FROM {self._table} ORDER BY rowid DESC").fetchall()
 
@@ -65,7 +77,7 @@ class SheetAdapter:
 
     def row_values(self, row_idx: int) -> list:
         """Get row values by 1-indexed position. Returns list of strings."""
-        with self._conn() as conn:
+        with self._read_conn() as conn:
             cols = ', '.join(self._col_names)
             row = conn.execute(
                 f"SELECT {cols} FROM {self._table} WHERE rowid = ?",
@@ -78,7 +90,7 @@ class SheetAdapter:
     def cell(self, row_idx: int, col_idx: int) -> _Cell:
         """Get cell value by 1-indexed position. Returns object with .value attribute."""
         col_name = self._col_names[col_idx - 1] if col_idx <= len(self._col_names) else 'uuid'
-        with self._conn() as conn:
+        with self._read_conn() as conn:
             val = conn.execute(
                 f"SELECT {col_name} FROM {self._table} WHERE rowid = ?",
                 (row_idx,)
@@ -123,6 +135,7 @@ class InventoryService:
         self.tenant_id = tenant_id
         self.inventory_sheet = SheetAdapter(tenant_id, 'products', INVENTORY_COL_NAMES)
         self.history_sheet = SheetAdapter(tenant_id, 'movements', MOVEMENTS_COL_NAMES)
+        self.repo = InventoryRepository(tenant_id)  # typed reads for the dashboard
         self.pending_multi_match = None
 
     # ── Normalization helpers (same as original) ──
@@ -142,6 +155,26 @@ class InventoryService:
 
     # ── Product search (SQL, not sheet scan) ──
 
+    @staticmethod
+    def _strip_code_prefix(query_norm: str) -> str:
+        """'sku abc-1' / 'lote 123' / 'invima ...' → the bare code."""
+        for prefix in ["sku ", "lote ", "invima ", "inv "]:
+            if query_norm.startswith(prefix):
+                query_norm = query_norm[len(prefix):].strip()
+        return query_norm
+
+    def _find_product_rows_by_keywords(self, queries: list[str]) -> dict[str, tuple]:
+        """Batch _find_product_row_by_keyword(q, exact_match=True): {query: (row_idx, name)}.
+        Codes resolve in one query; only the rest fall back to exact name lookups."""
+        cleaned = {q: self._strip_code_prefix(self._normalize(q)) for q in dict.fromkeys(queries)}
+        by_code = self.repo.resolve_codes(set(cleaned.values()))
+        found = {}
+        for query, code in cleaned.items():
+            product = by_code.get(code)
+            found[query] = (product.id, product.name) if product else \
+                self._find_product_row_by_keyword(query, exact_match=True)
+        return found
+
     def _find_product_row_by_keyword(self, query: str, exact_match: bool = False):
         """Search by SKU, name, invima, or lote. Returns (row_idx, name) or (None, None).
         Same signature as InventoryService for api.py compatibility."""
@@ -149,59 +182,22 @@ class InventoryService:
         if not query_norm:
             return None, None
 
-        query_clean = query_norm
-        for prefix in ["sku ", "lote ", "invima ", "inv "]:
-            if query_clean.startswith(prefix):
-                query_clean = query_clean[len(prefix):].strip()
-        if query_clean.endswith(".0"):
-            query_clean = query_clean[:-2]
-
-        with get_conn(self.tenant_id) as conn:
-            # 1. Exact match by SKU, INVIMA, LOTE
-            row = conn.execute(
-                "SELECT rowid, name FROM products WHERE lower(sku) = ? OR lower(invima) = ? OR lower(lote) = ? LIMIT 1",
-                (query_clean, query_clean, query_clean)
-            ).fetchone()
-            if row:
-                return row[0], row[1]
+        # 1. Exact match by SKU, INVIMA, LOTE (product_codes index)
+        product = self.repo.resolve_code(self._strip_code_prefix(query_norm))
+        if product:
+            return product.id, product.name
 
+        with get_read_conn(self.tenant_id) as conn:
             # 2. Exact name match
-            row = conn.execute(
-                "SELECT rowid, name FROM products WHERE lower(name) = ? LIMIT 1",
-                (query_norm,)
-            ).fetchone()
+            row = conn.execute(_EXACT_NAME_SQL, (query_norm,)).fetchone()
             if row:
                 return row[0], row[1]
 
-            # 3. Partial name match (only if exact_match=False)
-            if not exact_match:
-                row = conn.execute(
-                    "SELECT rowid, name FROM products WHERE lower(name) LIKE ? LIMIT 1",
-                    (f'%{query_norm}%',)
-                ).fetchone()
-                if row:
-                    return row[0], row[1]
-                
-                # Fallback: word-level match
-                words = query_norm.split()
-                if len(words) > 1:
-                    for word in words:
-                        if len(word) < 3:
-                            continue
-                        row = conn.execute(
-                            "SELECT rowid, name FROM products WHERE lower(name) LIKE ? LIMIT 1",
-                            (f'%{word}%',)
-                        ).fetchone()
-                        if row:
-                            return row[0], row[1]
-                
-                # Fallback: reverse match — product name contained in query
-                row = conn.execute(
-                    "SELECT rowid, name FROM products WHERE ? LIKE '%' || lower(name) || '%' LIMIT 1",
-                    (query_norm,)
-                ).fetchone()
-                if row:
-                    return row[0], row[1]
+        # 3. Ranked partial/fuzzy name match (only if exact_match=False)
+        if not exact_match:
+            matches = self.repo.search_products(query_norm, limit=1)
+            if matches:
+                return matches[0].id, matches[0].name
 
         return None, None
 
@@ -211,55 +207,18 @@ class InventoryService:
         if not query_norm:
             return []
 
-        with get_conn(self.tenant_id) as conn:
-            # Try exact SKU/Invima/Lote match
-            row = conn.execute(
-                "SELECT rowid, sku, name, category, stock FROM products WHERE lower(sku) = ? OR lower(invima) = ? OR lower(lote) = ? LIMIT 1",
-                (query_norm, query_norm, query_norm)
-            ).fetchone()
-            if row:
-                return [{'row_idx': row[0], 'sku': row[1], 'name': row[2], 'category': row[3], 'stock': row[4]}]
-
-            # Try exact name match
-            row = conn.execute(
-                "SELECT rowid, sku, name, category, stock FROM products WHERE lower(name) = ? LIMIT 1",
-                (query_norm,)
-            ).fetchone()
-            if row:
-                return [{'row_idx': row[0], 'sku': row[1], 'name': row[2], 'category': row[3], 'stock': row[4]}]
-
-            # Partial name match (for fuzzy)
-            pattern = f'%{query_norm}%'
-            rows = conn.execute(
-                "SELECT rowid, sku, name, category, stock FROM products WHERE lower(name) LIKE ? LIMIT 10",
-                (pattern,)
-            ).fetchall()
-            
-            # Fallback: try matching each word of query individually
-            if not rows:
-                words = query_norm.split()
-                if len(words) > 1:
-                    for word in words:
-                        if len(word) < 3:
-                            continue
-                        rows = conn.execute(
-                            "SELECT rowid, sku, name, category, stock FROM products WHERE lower(name) LIKE ? LIMIT 5",
-                            (f'%{word}%',)
-                        ).fetchall()
-                        if rows:
-                            break
-            
-            # Fallback: try reverse match — product name contained in query
-            if not rows:
-                rows = conn.execute(
-                    "SELECT rowid, sku, name, category, stock FROM products WHERE ? LIKE '%' || lower(name) || '%' LIMIT 5",
-                    (query_norm,)
-                ).fetchall()
-            
-            return [
-                {'row_idx': r[0], 'sku': r[1], 'name': r[2], 'category': r[3], 'stock': r[4]}
-                for r in rows
-            ]
+        # Warm in-memory index: exact SKU/Invima/Lote, exact name, then word-prefix match
+        catalog = get_catalog(self.tenant_id, self.repo)
+        product = catalog.resolve_code(query_norm) or catalog.by_name(query_norm)
+        records = [product] if product else catalog.search(query_norm, limit=10)
+
+        # Substrings and typos: ranked FTS search
+        if not records:
+            records = self.repo.search_products(query_norm, limit=10)
+        return [
+            {'row_idx': r.id, 'sku': r.sku, 'name': r.name, 'category': r.category, 'stock': r.stock}
+            for r in records
+        ]
 
     # ── Movement logging ──
 
@@ -267,21 +226,17 @@ class InventoryService:
         """Delete a product by 1-indexed row position."""
         with get_conn(self.tenant_id) as conn:
             product = conn.execute(
-                "SELECT rowid, sku, name FROM products WHERE rowid = ?",
+                "SELECT id, sku, name FROM products WHERE id = ?",
                 (row_idx,)
             ).fetchone()
             if product:
-                conn.execute("DELETE FROM products WHERE rowid = ?", (product['rowid'],))
+                conn.execute("DELETE FROM products WHERE id = ?", (product['id'],))
 
     def _log_movement(self, mov_type, sku, name, qty, user, notes=""):
         logger.info(f"Registrando movimiento: {mov_type} | {sku}")
         ts = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         tx_id = str(uuid.uuid4())[:6]
-        with get_conn(self.tenant_id) as conn:
-            conn.execute(
-                "INSERT INTO movements (timestamp, tx_id, mov_type, sku, name, qty, user, notes) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
-                (ts, tx_id, mov_type, sku, name, qty, user, notes)
-            )
+        movement_writer.log(self.tenant_id, [(ts, tx_id, mov_type, sku, name, qty, user, notes)])
 
     # ── Create product ──
 
@@ -293,13 +248,16 @@ class InventoryService:
         price_val = price if price else 0
         cost_val = purchase_price if purchase_price else 0
 
-        with get_conn(self.tenant_id) as conn:
-            conn.execute(
-                """INSERT INTO products (uuid, sku, name, category, stock, unit, cost, price, expiration_date, location, invima, lote)
-                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-                (new_uuid, sku, name, category, initial_stock, unit, cost_val, price_val,
-                 expiration_date, location, invima, lote)
-            )
+        try:
+            with get_conn(self.tenant_id) as conn:
+                conn.execute(
+                    """INSERT INTO products (uuid, sku, name, category, stock, unit, cost, price, expiration_date, location, invima, lote)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                    (new_uuid, sku, name, category, initial_stock, unit, cost_val, price_val,
+                     expiration_date, location, invima, lote)
+                )
+        except sqlite3.IntegrityError:
+            return f"⚠️ Ya existe un producto con SKU `{self._escape(sku)}`\\."
 
         if initial_stock > 0:
             self._log_movement("CREACION", sku, name, initial_stock, user, "Stock Inicial")
@@ -320,30 +278,32 @@ class InventoryService:
                 f"{details_msg}\n"
                 f"📊 Stock inicial: {self._escape(initial_stock)}")
 
+    # ── Stock changes ──
+
+    def apply_stock_changes(self, changes: list[StockChange], atomic: bool = True) -> list[StockResult]:
+        """Conditional stock updates + movements in one transaction (see stock_ledger)."""
+        return apply_stock_changes(self.tenant_id, changes, atomic=atomic)
+
+    def _apply_one(self, row_idx, qty, mov_type, user, clamp=False) -> StockResult:
+        return self.apply_stock_changes([StockChange(row_idx, qty, mov_type, user, clamp=clamp)], atomic=False)[0]
+
+    # ── Field edits ──
+
+    def update_products(self, edits: dict[int, dict]) -> dict[int, list[str]]:
+        """One UPDATE per product, custom values included, in one transaction (see product_updates)."""
+        return apply_product_edits(self.tenant_id, edits)
+
     # ── Sale ──
 
     def _handle_sale(self, row_idx, name, qty, user):
         logger.info(f"Procesando venta: {name} | Cantidad: {qty}")
-        with get_conn(self.tenant_id) as conn:
-            product = conn.execute(
-                "SELECT sku, stock FROM products WHERE rowid = ?",
-                (row_idx,)
-            ).fetchone()
-            if not product:
-                return f"⚠️ Producto no encontrado\\."
+        result = self._apply_one(row_idx, -qty, "VENTA", user)
+        if result.error == "not_found":
+            return f"⚠️ Producto no encontrado\\."
+        if result.error == "insufficient":
+            return f"⚠️ *Stock Insuficiente*\n🛒 Producto: {self._escape(name)}\n📦 Tienes: {self._escape(result.stock)}\n🛒 Intentas vender: {self._escape(qty)}"
 
-            current_stock = product['stock']
-            if current_stock < qty:
-                return f"⚠️ *Stock Insuficiente*\n🛒 Producto: {self._escape(name)}\n📦 Tienes: {self._escape(current_stock)}\n🛒 Intentas vender: {self._escape(qty)}"
-
-            new_stock = current_stock - qty
-            conn.execute(
-                "UPDATE products SET stock = ?, updated_at = datetime('now','localtime') WHERE rowid = ?",
-                (new_stock, row_idx)
-            )
-            sku = product['sku']
-
-        self._log_movement("VENTA", sku, name, -qty, user)
+        new_stock = result.stock
         alert = f"\n⚠️ *Alerta:* ¡Stock bajo! ({new_stock})" if new_stock <= 5 else ""
         return f"✅ *Venta Registrada*\n🛒 {self._escape(name)}\n➖ {self._escape(qty)} unidades\n📦 Stock restante: {self._escape(new_stock)}{alert}"
 
@@ -351,117 +311,57 @@ class InventoryService:
 
     def _handle_purchase(self, row_idx, name, qty, user):
         logger.info(f"Procesando compra: {name} | Cantidad: {qty}")
-        with get_conn(self.tenant_id) as conn:
-            product = conn.execute(
-                "SELECT sku, stock FROM products WHERE rowid = ?",
-                (row_idx,)
-            ).fetchone()
-            if not product:
-                return f"⚠️ Producto no encontrado\\."
-
-            new_stock = product['stock'] + qty
-            conn.execute(
-                "UPDATE products SET stock = ?, updated_at = datetime('now','localtime') WHERE rowid = ?",
-                (new_stock, row_idx)
-            )
-            sku = product['sku']
-
-        self._log_movement("COMPRA", sku, name, qty, user)
-        return f"✅ *Compra Registrada*\n🛒 {self._escape(name)}\n➕ {self._escape(qty)} unidades\n📦 Stock actual: {self._escape(new_stock)}"
+        result = self._apply_one(row_idx, qty, "COMPRA", user)
+        if not result.ok:
+            return f"⚠️ Producto no encontrado\\."
+        return f"✅ *Compra Registrada*\n🛒 {self._escape(name)}\n➕ {self._escape(qty)} unidades\n📦 Stock actual: {self._escape(result.stock)}"
 
     # ── Adjustment ──
 
     def _handle_adjustment(self, row_idx, name, qty, user):
         logger.info(f"Procesando ajuste: {name} | Cantidad: {qty}")
-        with get_conn(self.tenant_id) as conn:
-            product = conn.execute(
-                "SELECT sku, stock FROM products WHERE rowid = ?",
-                (row_idx,)
-            ).fetchone()
-            if not product:
-                return f"⚠️ Producto no encontrado\\."
-
-            new_stock = max(0, product['stock'] + qty)
-            conn.execute(
-                "UPDATE products SET stock = ?, updated_at = datetime('now','localtime') WHERE rowid = ?",
-                (new_stock, row_idx)
-            )
-            sku = product['sku']
-
-        self._log_movement("AJUSTE", sku, name, qty, user)
-        return f"✅ *Ajuste Realizado*\n🛒 {self._escape(name)}\n🔧 Cambio: {self._escape('+' if qty >= 0 else '')}{self._escape(qty)}\n📦 Stock actual: {self._escape(new_stock)}"
+        result = self._apply_one(row_idx, qty, "AJUSTE", user, clamp=True)
+        if not result.ok:
+            return f"⚠️ Producto no encontrado\\."
+        return f"✅ *Ajuste Realizado*\n🛒 {self._escape(name)}\n🔧 Cambio: {self._escape('+' if qty >= 0 else '')}{self._escape(qty)}\n📦 Stock actual: {self._escape(result.stock)}"
 
     # ── Update product ──
 
+    # Bot intent key → product column (None values mean "not mentioned")
+    _UPDATE_KEYS = {'precio': 'price', 'precio_compra': 'cost', 'fecha_vencimiento': 'expiration_date',
+                    'ubicacion': 'location', 'invima': 'invima', 'lote': 'lote'}
+
     def _handle_update(self, row_idx, name, intent):
         logger.info(f"Actualizando producto en fila {row_idx}: {intent}")
-        with get_conn(self.tenant_id) as conn:
-            product = conn.execute(
-                "SELECT rowid, name, sku, stock FROM products WHERE rowid = ?",
-                (row_idx,)
-            ).fetchone()
-            if not product:
-                return f"⚠️ Producto no encontrado\\."
-
-            current_name = product['name']
-            sku = product['sku']
-            updates = []
-            params = []
-
-            if intent.get('precio') is not None:
-                updates.append("price = ?"); params.append(intent['precio'])
-            if intent.get('precio_compra') is not None:
-                updates.append("cost = ?"); params.append(intent['precio_compra'])
-            if intent.get('cantidad') is not None:
-                new_stock = int(intent['cantidad'])
-                updates.append("stock = ?"); params.append(new_stock)
-            if intent.get('categoria'):
-                updates.append("category = ?"); params.append(intent['categoria'].title())
-            if intent.get('fecha_vencimiento') is not None:
-                updates.append("expiration_date = ?"); params.append(intent['fecha_vencimiento'])
-            if intent.get('ubicacion') is not None:
-                updates.append("location = ?"); params.append(intent['ubicacion'])
-            if intent.get('invima') is not None:
-                updates.append("invima = ?"); params.append(intent['invima'])
-            if intent.get('lote') is not None:
-                updates.append("lote = ?"); params.append(intent['lote'])
-            if intent.get('nombre'):
-                updates.append("name = ?"); params.append(intent['nombre'])
-            if intent.get('nuevo_sku') or intent.get('sku'):
-                new_sku = (intent.get('nuevo_sku') or intent.get('sku')).strip().upper()
-                updates.append("sku = ?"); params.append(new_sku)
-
-            if updates:
-                updates.append("updated_at = datetime('now','localtime')")
-                params.append(product['rowid'])
-                conn.execute(
-                    f"UPDATE products SET {', '.join(updates)} WHERE rowid = ?",
-                    params
-                )
-
-            # Save unknown fields as custom values
-            known_keys = {'precio', 'precio_compra', 'cantidad', 'categoria', 'fecha_vencimiento',
-                          'ubicacion', 'invima', 'lote', 'nombre', 'nuevo_sku', 'sku'}
-            for key, val in intent.items():
-                if key not in known_keys and val is not None and key not in ('accion', 'producto'):
-                    self._save_custom_field(sku, key, str(val))
-
-        return f"✅ *Producto Actualizado*\n🛒 {self._escape(current_name)}\n🔧 Campos modificados: {len(updates) - 1}"
-
-    # ── Custom fields ──
-
-    def _save_custom_field(self, sku: str, column_name: str, value):
-        """Save a custom field value for a product."""
-        with get_conn(self.tenant_id) as conn:
-            col = conn.execute(
-                "SELECT id FROM custom_columns WHERE name = ?", (column_name,)
-            ).fetchone()
-            if col:
-                conn.execute(
-                    "INSERT OR REPLACE INTO product_custom_values (product_sku, column_id, value) VALUES (?, ?, ?)",
-                    (sku, col['id'], str(value) if value is not None else None)
-                )
-                conn.commit()
+        values = {field: intent[key] for key, field in self._UPDATE_KEYS.items() if intent.get(key) is not None}
+        if intent.get('cantidad') is not None:
+            values['stock'] = int(intent['cantidad'])
+        if intent.get('categoria'):
+            values['category'] = intent['categoria'].title()
+        if intent.get('nombre'):
+            values['name'] = intent['nombre']
+        new_sku = intent.get('nuevo_sku') or intent.get('sku')
+        renames = {row_idx: new_sku.strip().upper()} if new_sku else None
+
+        # Any other key is a custom column value (unknown columns are skipped)
+        known_keys = set(self._UPDATE_KEYS) | {'cantidad', 'categoria', 'nombre', 'nuevo_sku', 'sku', 'accion', 'producto'}
+        for key, val in intent.items():
+            if key not in known_keys and key not in EDITABLE_FIELDS and val is not None:
+                values[key] = str(val)
+
+        # Read and write in one transaction: apply_product_edits joins it
+        try:
+            with get_conn(self.tenant_id) as conn:
+                product = conn.execute("SELECT name FROM products WHERE id = ?", (row_idx,)).fetchone()
+                if not product:
+                    return f"⚠️ Producto no encontrado\\."
+                written = apply_product_edits(self.tenant_id, {row_idx: values}, renames).get(row_idx, [])
+        except sqlite3.IntegrityError:
+            if not renames:
+                raise
+            return f"⚠️ Ya existe un producto con el SKU {self._escape(renames[row_idx])}\\."
+
+        return f"✅ *Producto Actualizado*\n🛒 {self._escape(product['name'])}\n🔧 Campos modificados: {len(written)}"
 
     # ── List / report ──
 
@@ -470,7 +370,7 @@ class InventoryService:
         loc_filter = intent.get('ubicacion')
         cat_filter = intent.get('categoria')
 
-        with get_conn(self.tenant_id) as conn:
+        with get_read_conn(self.tenant_id) as conn:
             query = "SELECT name, sku, stock, unit, expiration_date, location, category FROM products WHERE 1=1"
             params = []
 
@@ -482,11 +382,11 @@ class InventoryService:
                 query += " AND expiration_date != '' AND date(expiration_date) <= date('now', '+30 days')"
 
             if loc_filter:
-                query += " AND lower(location) = ?"
-                params.append(loc_filter.lower())
+                query += " AND location = ?"
+                params.append(loc_filter)
             if cat_filter:
-                query += " AND lower(category) = ?"
-                params.append(cat_filter.lower())
+                query += " AND category = ?"
+                params.append(cat_filter)
 
             query += " ORDER BY stock ASC, name ASC LIMIT 30"
             rows = conn.execute(query, params).fetchall()
@@ -511,23 +411,26 @@ class InventoryService:
     def _handle_list_remisiones(self):
         """Lista las ultimas remisiones del tenant."""
         try:
-            from app.database_sa import get_session
+            from app.database_sa import get_read_session
             from app.models import Remision
-            session = get_session(self.tenant_id)
-            remisiones = session.query(Remision).order_by(Remision.created_at.desc()).limit(10).all()
-            session.close()
-
-            if not remisiones:
-                return "📭 No hay remisiones registradas\\."
-
-            lines = [f"📋 *Ultimas Remisiones* ({len(remisiones)}):"]
-            for r in remisiones:
-                client_name = self._escape(r.client.name if r.client else "Sin cliente")
-                lines.append(
-                    f"• 🚚 REM\\-{r.uid} — {client_name}\\n"
-                    f"  📦 {len(r.items)} items \\| 💰 ${r.total_amount:,.0f} \\| 📅 {str(r.created_at)[:10]}"
-                )
-            return "\\n".join(lines)
+            session = get_read_session(self.tenant_id)
+            try:
+                remisiones = session.query(Remision).order_by(Remision.created_at.desc()).limit(10).all()
+
+                if not remisiones:
+                    return "📭 No hay remisiones registradas\\."
+
+                # client/items are lazy relationships: read them before the session closes
+                lines = [f"📋 *Ultimas Remisiones* ({len(remisiones)}):"]
+                for r in remisiones:
+                    client_name = self._escape(r.client.name if r.client else "Sin cliente")
+                    lines.append(
+                        f"• 🚚 REM\\-{r.uid} — {client_name}\\n"
+                        f"  📦 {len(r.items)} items \\| 💰 ${r.total_amount:,.0f} \\| 📅 {str(r.created_at)[:10]}"
+                    )
+                return "\\n".join(lines)
+            finally:
+                session.close()
         except Exception:
             return "❌ Error al consultar remisiones\\."
 
@@ -642,7 +545,7 @@ class InventoryService:
             elif action == "ACTUALIZAR":
                 return self._handle_update(row_idx, real_name, intent)
             elif action == "BUSCAR":
-                with get_conn(self.tenant_id) as conn:
+                with get_read_conn(self.tenant_id) as conn:
                     p = conn.execute(
                         "SELECT name, sku, category, stock, unit, price, cost, expiration_date, location, invima, lote FROM products WHERE rowid = ?",
                         (row_idx,)
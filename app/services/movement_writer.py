@@ -0,0 +1,243 @@
+"""
+MovementWriter — group commit for the movements ledger.
+
+Each _log_movement used to be its own transaction: one INSERT, one commit,
+one WAL fsync. The writer queues rows per tenant and a background thread
+writes them with one executemany + one commit per tenant every
+MOVEMENT_FLUSH_MS (or as soon as MOVEMENT_FLUSH_ROWS are queued), so a
+burst of N movements costs one fsync instead of N.
+
+Durability (MOVEMENT_DURABILITY, or wait= per call):
+  - wait:  log() returns after the batch holding its rows is committed and
+           raises if that commit failed. Concurrent callers share the commit.
+  - async: log() returns once the rows are queued. A crash can lose the last
+           few milliseconds of movements; failed batches are only logged.
+Rows logged from inside a write transaction on the same tenant (get_conn or
+an ORM session) are inserted inline instead: they must commit or roll back
+with that transaction, and the flusher would wait on the writer it holds.
+
+Each tenant in a batch is flushed on its own: a tenant whose writer is held
+by another thread is requeued and retried on the next pass, so it can't hold
+up the other tenants' commits. (A thread inside tenant A's transaction may be
+waiting on its tenant B rows; blocking on A would deadlock until timeout.)
+A tenant still busy after DB_CHECKOUT_TIMEOUT fails its batch as get_conn would.
+"""
+import atexit
+import logging
+import threading
+import time
+from typing import Iterable, Optional
+
+from app.core.config import settings
+from app.core.database import get_conn, in_write_transaction, try_get_conn
+
+logger = logging.getLogger(__name__)
+
+MOVEMENT_INSERT = ("INSERT INTO movements (timestamp, tx_id, mov_type, sku, name, qty, user, notes) "
+                   "VALUES (?, ?, ?, ?, ?, ?, ?, ?)")
+
+
+def insert_movements(conn, rows: list[tuple]):
+    """rows: (timestamp, tx_id, mov_type, sku, name, qty, user, notes)."""
+    conn.executemany(MOVEMENT_INSERT, rows)
+
+
+class _Ticket:
+    """Lets a wait-mode caller block until its batch is committed."""
+
+    __slots__ = ("done", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.error: Optional[BaseException] = None
+
+
+class MovementWriter:
+    """Per-tenant write-behind queue with one flusher thread (started on first use)."""
+
+    def __init__(self, flush_ms: float, flush_rows: int, max_pending: int):
+        self.flush_ms = flush_ms
+        self.flush_rows = flush_rows
+        self.max_pending = max_pending
+        self._cond = threading.Condition()
+        self._queues: dict[str, list[tuple[list[tuple], Optional[_Ticket]]]] = {}
+        self._pending = 0
+        self._writing = False
+        self._first_at: Optional[float] = None  # monotonic time the oldest queued row arrived
+        self._urgent = False
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+        self._busy_since: dict[str, float] = {}  # flusher thread only: tenant -> first busy pass
+        self.metrics = {
+            "queued": 0, "written": 0, "failed": 0, "inline": 0, "deferred": 0,
+            "batches": 0, "max_batch": 0, "flush_ms": 0.0, "max_flush_ms": 0.0,
+            "waits": 0, "wait_ms": 0.0, "max_wait_ms": 0.0, "backpressure_waits": 0,
+        }
+
+    # ── Producers ──
+
+    def log(self, tenant_id: str, rows: Iterable[tuple], wait: Optional[bool] = None):
+        """Queue movement rows for tenant_id. wait=None follows MOVEMENT_DURABILITY."""
+        rows = list(rows)
+        if not rows:
+            return
+        if self._closed or in_write_transaction(tenant_id):
+            with get_conn(tenant_id) as conn:
+                insert_movements(conn, rows)
+            with self._cond:
+                self.metrics["inline"] += len(rows)
+            return
+        if wait is None:
+            wait = settings.MOVEMENT_DURABILITY != "async"
+        ticket = _Ticket() if wait else None
+        started = time.perf_counter()
+        with self._cond:
+            if self._pending >= self.max_pending:
+                self.metrics["backpressure_waits"] += 1
+                while self._pending >= self.max_pending and not self._closed:
+                    self._cond.wait()
+            self._ensure_thread()
+            self._queues.setdefault(tenant_id, []).append((rows, ticket))
+            if not self._pending:
+                self._first_at = time.monotonic()
+            self._pending += len(rows)
+            self.metrics["queued"] += len(rows)
+            self._cond.notify_all()
+        if ticket is None:
+            return
+        ticket.done.wait()
+        waited = (time.perf_counter() - started) * 1000
+        with self._cond:
+            m = self.metrics
+            m["waits"] += 1
+            m["wait_ms"] += waited
+            m["max_wait_ms"] = max(m["max_wait_ms"], waited)
+        if ticket.error is not None:
+            raise ticket.error
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Write everything queued so far now. Returns False on timeout."""
+        with self._cond:
+            self._urgent = True
+            self._cond.notify_all()
+            return self._cond.wait_for(lambda: not self._pending and not self._writing, timeout)
+
+    # ── Flusher ──
+
+    def _ensure_thread(self):
+        """Caller holds _cond."""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._loop, name="movement-writer", daemon=True)
+            self._thread.start()
+
+    def _take_batch(self) -> Optional[dict]:
+        """Wait for rows, then for the batch window to close. None when closed and drained."""
+        with self._cond:
+            while not self._pending:
+                if self._closed:
+                    return None
+                self._cond.wait()
+            deadline = self._first_at + self.flush_ms / 1000
+            while self._pending < self.flush_rows and not (self._urgent or self._closed):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            queues, self._queues = self._queues, {}
+            self._pending, self._first_at, self._urgent = 0, None, False
+            self._writing = True
+            self._cond.notify_all()  # producers blocked on max_pending
+            return queues
+
+    def _loop(self):
+        while True:
+            queues = self._take_batch()
+            if queues is None:
+                return
+            busy = {}
+            try:
+                for tenant_id, entries in queues.items():
+                    if not self._write(tenant_id, entries):
+                        busy[tenant_id] = entries
+            finally:
+                with self._cond:
+                    self._writing = False
+                    if busy:
+                        self._requeue(busy)
+                    self._cond.notify_all()
+                    if busy and len(busy) == len(queues):
+                        # Nothing could be written: give the writers' holders a moment
+                        self._cond.wait(self.flush_ms / 1000)
+
+    def _requeue(self, busy: dict[str, list[tuple[list[tuple], Optional[_Ticket]]]]):
+        """Put busy tenants' entries back ahead of anything queued since. Caller holds _cond."""
+        for tenant_id, entries in busy.items():
+            self._queues[tenant_id] = entries + self._queues.get(tenant_id, [])
+            rows = sum(len(batch) for batch, _ in entries)
+            self._pending += rows
+            self.metrics["deferred"] += rows
+        if self._first_at is None:
+            self._first_at = time.monotonic()
+
+    def _write(self, tenant_id: str, entries: list[tuple[list[tuple], Optional[_Ticket]]]) -> bool:
+        """Insert and commit one tenant's entries, then release their waiters.
+        Returns False (nothing done) if another thread holds the tenant's writer."""
+        rows = [row for batch, _ in entries for row in batch]
+        started = time.perf_counter()
+        error = None
+        try:
+            with try_get_conn(tenant_id) as conn:
+                if conn is None:
+                    since = self._busy_since.setdefault(tenant_id, time.monotonic())
+                    if time.monotonic() - since < settings.DB_CHECKOUT_TIMEOUT:
+                        return False
+                    raise TimeoutError(f"Timeout esperando conexion writer para {tenant_id}")
+                insert_movements(conn, rows)
+        except Exception as e:
+            error = e
+            logger.error(f"Movement batch failed for {tenant_id} ({len(rows)} rows): {e}")
+        self._busy_since.pop(tenant_id, None)
+        elapsed = (time.perf_counter() - started) * 1000
+        with self._cond:
+            m = self.metrics
+            m["failed" if error else "written"] += len(rows)
+            m["batches"] += 1
+            m["max_batch"] = max(m["max_batch"], len(rows))
+            m["flush_ms"] += elapsed
+            m["max_flush_ms"] = max(m["max_flush_ms"], elapsed)
+        for _, ticket in entries:
+            if ticket is not None:
+                ticket.error = error
+                ticket.done.set()
+        return True
+
+    # ── Lifecycle / metrics ──
+
+    def close(self, timeout: float = 10.0):
+        """Drain the queue and stop the flusher. Later log() calls write inline."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def stats(self) -> dict:
+        with self._cond:
+            m = dict(self.metrics)
+            m["pending"] = self._pending
+        m["mode"] = settings.MOVEMENT_DURABILITY
+        m["avg_batch"] = round((m["written"] + m["failed"]) / m["batches"], 2) if m["batches"] else 0.0
+        m["avg_flush_ms"] = round(m["flush_ms"] / m["batches"], 2) if m["batches"] else 0.0
+        m["avg_wait_ms"] = round(m["wait_ms"] / m["waits"], 2) if m["waits"] else 0.0
+        for key in ("flush_ms", "max_flush_ms", "wait_ms", "max_wait_ms"):
+            m[key] = round(m[key], 2)
+        return m
+
+
+movement_writer = MovementWriter(
+    flush_ms=settings.MOVEMENT_FLUSH_MS,
+    flush_rows=settings.MOVEMENT_FLUSH_ROWS,
+    max_pending=settings.MOVEMENT_MAX_PENDING,
+)
+atexit.register(movement_writer.close)
@@ -9,8 +9,7 @@ import datetime
 from typing import Optional
 from contextlib import contextmanager
 
-DB_DIR = "/app/data"
-os.makedirs(DB_DIR, exist_ok=True)
+from app.core.database import DB_DIR
 
 
 class OrderService:
@@ -0,0 +1,169 @@
+"""
+Product field edits — one UPDATE per product, one transaction per request.
+
+The PATCH endpoint used to write each field with its own update_cell()
+(a SELECT, an UPDATE and a commit per field) and each custom value with
+another commit. Here a product's edit is a single UPDATE, a batch of edits
+is one executemany per distinct field set, and custom values go in with one
+executemany, all inside the same get_conn() transaction. Selection updates
+(a category or a list of SKUs) are one set-based UPDATE, so repricing a
+whole category doesn't touch rows one by one in Python.
+
+Stock set here is an absolute correction, as before; sales and purchases go
+through stock_ledger.
+"""
+import logging
+from typing import Optional
+
+from app.core.database import get_conn
+
+logger = logging.getLogger(__name__)
+
+EDITABLE_FIELDS = ("name", "category", "stock", "unit", "cost", "price",
+                   "expiration_date", "location", "invima", "lote")
+
+_TOUCH = "updated_at = datetime('now','localtime')"
+
+
+def split_fields(values: dict) -> tuple[dict, dict]:
+    """(product columns, custom values) from a patch body. None values and 'sku' are dropped."""
+    fields, custom = {}, {}
+    for key, value in values.items():
+        if value is None or key == "sku":
+            continue
+        (fields if key in EDITABLE_FIELDS else custom)[key] = value
+    return fields, custom
+
+
+def _custom_ids(conn, names) -> dict[str, int]:
+    names = list(set(names))
+    if not names:
+        return {}
+    rows = conn.execute(
+        f"SELECT id, name FROM custom_columns WHERE name IN ({', '.join('?' * len(names))})", names
+    ).fetchall()
+    return {r["name"]: r["id"] for r in rows}
+
+
+def apply_product_edits(tenant_id: str, edits: dict[int, dict],
+                        renames: Optional[dict[int, str]] = None) -> dict[int, list[str]]:
+    """edits: {product id: {field or custom column name: value}}. Returns {id: keys written}
+    for the products that exist; unknown custom columns are skipped, as before.
+    renames: {product id: new SKU} for products in edits. The SKU goes in the same UPDATE
+    and the product's custom values move to it (a taken SKU raises IntegrityError)."""
+    if not edits:
+        return {}
+    renames = renames or {}
+    written: dict[int, list[str]] = {}
+    with get_conn(tenant_id) as conn:
+        ids = list(edits)
+        skus = {}
+        for start in range(0, len(ids), 900):
+            chunk = ids[start:start + 900]
+            for row in conn.execute(
+                f"SELECT id, sku FROM products WHERE id IN ({', '.join('?' * len(chunk))})", chunk
+            ):
+                skus[row["id"]] = row["sku"]
+
+        groups: dict[tuple[str, ...], list[tuple]] = {}
+        custom_rows: list[tuple[int, dict]] = []
+        for product_id, values in edits.items():
+            if product_id not in skus:
+                continue
+            fields, custom = split_fields(values)
+            if product_id in renames:
+                fields["sku"] = renames[product_id]
+            if fields:
+                names = tuple(sorted(fields))
+                groups.setdefault(names, []).append((*(fields[f] for f in names), product_id))
+            custom_rows.append((product_id, custom))
+            written[product_id] = list(fields)
+
+        for names, params in groups.items():
+            assignments = ", ".join(f"{f} = ?" for f in names)
+            conn.executemany(f"UPDATE products SET {assignments}, {_TOUCH} WHERE id = ?", params)
+
+        moved = [(new, skus[pid]) for pid, new in renames.items() if pid in written and new != skus[pid]]
+        if moved:
+            conn.executemany("UPDATE OR REPLACE product_custom_values SET product_sku = ? WHERE product_sku = ?", moved)
+            skus.update((pid, new) for pid, new in renames.items() if pid in written)
+
+        column_ids = _custom_ids(conn, (name for _, custom in custom_rows for name in custom))
+        values = []
+        for product_id, custom in custom_rows:
+            for name, value in custom.items():
+                if name in column_ids:
+                    values.append((skus[product_id], column_ids[name], str(value)))
+                    written[product_id].append(name)
+        conn.executemany(
+            "INSERT OR REPLACE INTO product_custom_values (product_sku, column_id, value) VALUES (?, ?, ?)", values
+        )
+    return written
+
+
+def apply_sku_edits(tenant_id: str, edits: dict[str, dict]) -> tuple[dict[str, list[str]], list[str]]:
+    """Like apply_product_edits() keyed by exact SKU (case-insensitive).
+    Returns ({sku: keys written}, SKUs not found)."""
+    if not edits:
+        return {}, []
+    with get_conn(tenant_id) as conn:  # outer transaction: lookup and writes commit together
+        skus = list(edits)
+        ids: dict[str, int] = {}
+        for start in range(0, len(skus), 900):
+            chunk = skus[start:start + 900]
+            for row in conn.execute(
+                f"SELECT id, sku FROM products WHERE sku IN ({', '.join('?' * len(chunk))})", chunk
+            ):
+                ids[row["sku"].upper()] = row["id"]
+        by_id = {ids[sku.upper()]: values for sku, values in edits.items() if sku.upper() in ids}
+        written = apply_product_edits(tenant_id, by_id)
+    result = {sku: written[ids[sku.upper()]] for sku in edits if sku.upper() in ids}
+    return result, [sku for sku in edits if sku.upper() not in ids]
+
+
+def update_selection(tenant_id: str, values: dict, category: Optional[str] = None,
+                     skus: Optional[list[str]] = None, price_pct: Optional[float] = None,
+                     cost_pct: Optional[float] = None, round_to: float = 0) -> int:
+    """Same edit for every product in category and/or skus, as one UPDATE.
+    price_pct/cost_pct: relative change (+10 = 10% more), rounded to a multiple
+    of round_to when given. Returns how many products matched."""
+    where, where_params = [], []
+    if category is not None:
+        where.append("category = ?")
+        where_params.append(category)
+    if skus is not None:
+        where.append(f"sku IN ({', '.join('?' * len(skus))})")
+        where_params.extend(skus)
+    if not where or (skus is not None and not skus):
+        return 0
+    where_sql = " AND ".join(where)
+
+    fields, custom = split_fields(values)
+    assignments = [f"{f} = ?" for f in fields]
+    params: list = list(fields.values())
+    for column, pct in (("price", price_pct), ("cost", cost_pct)):
+        if pct is None or column in fields:
+            continue
+        if round_to:
+            assignments.append(f"{column} = round(coalesce({column}, 0) * ? / ?) * ?")
+            params.extend((1 + pct / 100, round_to, round_to))
+        else:
+            assignments.append(f"{column} = round(coalesce({column}, 0) * ?, 2)")
+            params.append(1 + pct / 100)
+
+    with get_conn(tenant_id) as conn:
+        if assignments:
+            matched = conn.execute(
+                f"UPDATE products SET {', '.join(assignments)}, {_TOUCH} WHERE {where_sql}",
+                params + where_params
+            ).rowcount
+        else:
+            matched = conn.execute(f"SELECT count(*) FROM products WHERE {where_sql}", where_params).fetchone()[0]
+        for name, column_id in _custom_ids(conn, custom).items():
+            conn.execute(
+                "INSERT OR REPLACE INTO product_custom_values (product_sku, column_id, value) "
+                f"SELECT sku, ?, ? FROM products WHERE {where_sql}",
+                [column_id, str(custom[name]), *where_params]
+            )
+    logger.info(f"Edicion masiva {tenant_id}: {matched} productos | campos={list(fields) + list(custom)}")
+    return matched
@@ -0,0 +1,116 @@
+"""
+Stock mutations — one conditional UPDATE per product, movements in the same transaction.
+
+The handlers used to SELECT stock, compute in Python, UPDATE, then log the
+movement in a second commit: several round trips per item, and two
+concurrent sales could both pass the stock check. Here each change is a
+single `UPDATE ... WHERE stock + delta >= 0 RETURNING`, so the check and
+the write are one statement, and the movement rows commit (or roll back)
+with the stock they describe.
+"""
+import datetime
+import logging
+import uuid
+from typing import Iterable, Optional
+
+from app.core.database import get_conn
+from app.services.movement_writer import insert_movements
+
+logger = logging.getLogger(__name__)
+
+
+class StockChange:
+    """Add delta to a product's stock and log it as a mov_type movement.
+    Negative deltas are rejected if stock would go below zero, unless clamp
+    (adjustments), which floors the result at zero instead."""
+
+    __slots__ = ("product_id", "delta", "mov_type", "user", "notes", "clamp")
+
+    def __init__(self, product_id: int, delta: int, mov_type: str, user: str, notes: str = "", clamp: bool = False):
+        self.product_id = product_id
+        self.delta = delta
+        self.mov_type = mov_type
+        self.user = user
+        self.notes = notes
+        self.clamp = clamp
+
+
+class StockResult:
+    """Outcome of one StockChange. error: None, 'not_found' or 'insufficient'
+    (stock is then the current stock, for the message)."""
+
+    __slots__ = ("change", "sku", "name", "stock", "error")
+
+    def __init__(self, change: StockChange, sku: str = "", name: str = "",
+                 stock: Optional[int] = None, error: Optional[str] = None):
+        self.change = change
+        self.sku = sku
+        self.name = name
+        self.stock = stock
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    @property
+    def previous_stock(self) -> Optional[int]:
+        return None if self.stock is None or not self.ok or self.change.clamp else self.stock - self.change.delta
+
+
+class StockError(Exception):
+    """An atomic batch was rolled back because one change could not apply."""
+
+    def __init__(self, result: StockResult):
+        super().__init__(f"{result.error}: product {result.change.product_id}")
+        self.result = result
+
+
+_UPDATE = "UPDATE products SET stock = {expr}, updated_at = datetime('now','localtime') WHERE id = ?"
+
+
+def _statement(change: StockChange) -> tuple[str, tuple]:
+    """The single UPDATE ... RETURNING for a change, with its params."""
+    if change.clamp:
+        sql = _UPDATE.format(expr="max(0, coalesce(stock, 0) + ?)")
+        params = (change.delta, change.product_id)
+    elif change.delta < 0:
+        sql = _UPDATE.format(expr="coalesce(stock, 0) + ?") + " AND coalesce(stock, 0) + ? >= 0"
+        params = (change.delta, change.product_id, change.delta)
+    else:
+        sql = _UPDATE.format(expr="coalesce(stock, 0) + ?")
+        params = (change.delta, change.product_id)
+    return sql + " RETURNING sku, name, stock", params
+
+
+def apply_stock_changes(tenant_id: str, changes: Iterable[StockChange], atomic: bool = True) -> list[StockResult]:
+    """Apply changes in one transaction, in order. Movements share one tx_id.
+
+    atomic=True: the first change that can't apply raises StockError and
+    nothing is written. atomic=False: failed changes are skipped and reported
+    in their StockResult; the others commit. Called inside another write
+    (e.g. an ORM session on the same thread) it joins that transaction."""
+    changes = list(changes)
+    if not changes:
+        return []
+    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    tx_id = str(uuid.uuid4())[:6]
+    results: list[StockResult] = []
+    movements = []
+    with get_conn(tenant_id) as conn:
+        for change in changes:
+            row = conn.execute(*_statement(change)).fetchone()
+            if row is None:
+                current = conn.execute("SELECT stock FROM products WHERE id = ?", (change.product_id,)).fetchone()
+                result = StockResult(change, stock=current[0] if current else None,
+                                     error="not_found" if current is None else "insufficient")
+                if atomic:
+                    raise StockError(result)
+                results.append(result)
+                continue
+            sku, name, stock = row
+            results.append(StockResult(change, sku, name, stock))
+            movements.append((timestamp, tx_id, change.mov_type, sku, name, change.delta, change.user, change.notes))
+        insert_movements(conn, movements)
+    logger.info(f"Stock {tx_id}: {len(movements)}/{len(changes)} cambios aplicados")
+    return results
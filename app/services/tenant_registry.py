@@ -0,0 +1,144 @@
+"""
+TenantRegistry — in-memory token → tenant and telegram_id → tenant indexes.
+
+Loaded once from admin.db (tenants + the indexed telegram_users table) and
+kept until something changes: create/link/delete/profile updates call
+invalidate(), which also reaches other workers through a state generation.
+Lookups are dict hits, whatever the number of tenants. A key that isn't in
+the indexes (e.g. a tenant created by another worker a moment ago) gets one
+indexed point query; misses are remembered briefly so bad tokens stay cheap.
+"""
+import logging
+import threading
+from typing import Optional
+
+from app.core.cache import get_named_cache
+from app.core.database import init_admin_db, get_admin_read_conn
+from app.core.state import GenerationWatch
+
+logger = logging.getLogger(__name__)
+
+_TENANT_COLUMNS = "id, tenant_id, pyme_name, sheet_id, token, business_type, nit, address, description, created_at"
+
+
+def _tenant_info(row) -> dict:
+    return {
+        "tenant_id": row["tenant_id"] or row["id"],
+        "pyme_name": row["pyme_name"],
+        "sheet_id": row["sheet_id"] or "",
+        "token": row["token"],
+        "business_type": row["business_type"] or "",
+        "nit": row["nit"] or "",
+        "address": row["address"] or "",
+        "description": row["description"] or "",
+        "created_at": row["created_at"] or "",
+    }
+
+
+class TenantRegistry:
+    """Thread-safe tenant indexes. Returned dicts are copies."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._epoch = 0  # bumped by invalidate(); a load that raced with it doesn't count
+        self._by_id: dict[str, dict] = {}
+        self._by_token: dict[str, str] = {}
+        self._by_telegram: dict[str, str] = {}
+        self._watch = GenerationWatch("tenant_registry")
+        self._misses = get_named_cache("tenant_registry_misses", default_ttl=30)
+        self.metrics = {"loads": 0, "hits": 0, "point_lookups": 0, "misses": 0}
+
+    # ── Loading ──
+
+    def _load(self):
+        epoch = self._epoch
+        init_admin_db()
+        with get_admin_read_conn() as conn:
+            tenants = conn.execute(f"SELECT {_TENANT_COLUMNS} FROM tenants").fetchall()
+            users = conn.execute("SELECT telegram_id, tenant_id FROM telegram_users").fetchall()
+        by_id = {}
+        for row in tenants:
+            info = _tenant_info(row)
+            by_id[info["tenant_id"]] = info
+        by_token = {info["token"]: tid for tid, info in by_id.items()}
+        by_telegram = {row["telegram_id"]: row["tenant_id"] for row in users if row["tenant_id"] in by_id}
+        self._by_id, self._by_token, self._by_telegram = by_id, by_token, by_telegram
+        self._loaded = epoch == self._epoch
+        self.metrics["loads"] += 1
+        logger.debug(f"Tenant registry: {len(by_id)} tenants, {len(by_telegram)} telegram users")
+
+    def _ensure(self):
+        if self._watch.changed():
+            self._loaded = False
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self._load()
+
+    def _remember(self, info: dict, telegram_id: Optional[str] = None):
+        with self._lock:
+            self._by_id[info["tenant_id"]] = info
+            self._by_token[info["token"]] = info["tenant_id"]
+            if telegram_id:
+                self._by_telegram[telegram_id] = info["tenant_id"]
+
+    def _point_lookup(self, kind: str, key: str, sql: str) -> Optional[dict]:
+        """Indexed query for a key missing from the indexes; misses cached for a short time."""
+        if self._misses.get((kind, key)):
+            self.metrics["misses"] += 1
+            return None
+        self.metrics["point_lookups"] += 1
+        with get_admin_read_conn() as conn:
+            row = conn.execute(sql, (key,)).fetchone()
+        if not row:
+            self.metrics["misses"] += 1
+            self._misses.set((kind, key), True)
+            return None
+        info = _tenant_info(row)
+        self._remember(info, key if kind == "telegram" else None)
+        return info
+
+    # ── Lookups ──
+
+    def get(self, tenant_id: str) -> Optional[dict]:
+        self._ensure()
+        info = self._by_id.get(tenant_id)
+        return dict(info) if info else None
+
+    def by_token(self, token: str) -> Optional[dict]:
+        self._ensure()
+        info = self._by_id.get(self._by_token.get(token))
+        if info is not None:
+            self.metrics["hits"] += 1
+            return dict(info)
+        info = self._point_lookup("token", token, f"SELECT {_TENANT_COLUMNS} FROM tenants WHERE token = ?")
+        return dict(info) if info else None
+
+    def by_telegram_id(self, telegram_id: str) -> Optional[dict]:
+        self._ensure()
+        info = self._by_id.get(self._by_telegram.get(telegram_id))
+        if info is not None:
+            self.metrics["hits"] += 1
+            return dict(info)
+        info = self._point_lookup(
+            "telegram", telegram_id,
+            f"SELECT {', '.join('t.' + c.strip() for c in _TENANT_COLUMNS.split(','))} "
+            "FROM telegram_users u JOIN tenants t ON t.id = u.tenant_id WHERE u.telegram_id = ?"
+        )
+        return dict(info) if info else None
+
+    # ── Invalidation ──
+
+    def invalidate(self):
+        """Reload on next lookup, here and in every other worker."""
+        self._epoch += 1
+        self._loaded = False
+        self._misses.invalidate()
+        self._watch.bump()
+
+    def stats(self) -> dict:
+        return {**self.metrics, "tenants": len(self._by_id), "telegram_users": len(self._by_telegram)}
+
+
+registry = TenantRegistry()
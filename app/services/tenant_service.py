@@ -1,15 +1,49 @@
 """
 TenantServiceSQLite — SQLite-backed tenant registry.
 Same interface as TenantService: create_tenant, get_tenant_by_user, link_user.
+Lookups (validate_token, get_tenant_by_user) go through the in-memory
+TenantRegistry; every write here invalidates it.
 """
 import uuid
 import datetime
 import logging
-from app.core.database import init_admin_db, init_tenant_db, get_admin_conn
+from app.core.database import init_admin_db, init_tenant_db, get_admin_conn, get_admin_read_conn
+from app.services.tenant_registry import registry
 
 logger = logging.getLogger(__name__)
 
 
+def _set_owner(conn, tenant_id: str, telegram_id: str, owner: bool):
+    """Add telegram_id to (or drop it from) the tenant's CSV owner list."""
+    row = conn.execute("SELECT telegram_id FROM tenants WHERE id = ?", (tenant_id,)).fetchone()
+    if row is None:
+        return
+    owners = [o.strip() for o in (row["telegram_id"] or "").split(",") if o.strip()]
+    if owner:
+        updated = owners if telegram_id in owners else owners + [telegram_id]
+    else:
+        updated = [o for o in owners if o != telegram_id]
+    if updated != owners:
+        conn.execute("UPDATE tenants SET telegram_id = ? WHERE id = ?", (",".join(updated), tenant_id))
+
+
+def _link_telegram_user(conn, telegram_id: str, tenant_id: str):
+    """Point telegram_id at tenant_id; the latest link wins (create_tenant and link_user alike).
+    A user moving between tenants leaves the old tenant's owner list."""
+    previous = conn.execute(
+        "SELECT tenant_id FROM telegram_users WHERE telegram_id = ?", (telegram_id,)
+    ).fetchone()
+    conn.execute(
+        "INSERT INTO telegram_users (telegram_id, tenant_id) VALUES (?, ?) "
+        "ON CONFLICT(telegram_id) DO UPDATE SET tenant_id = excluded.tenant_id, "
+        "linked_at = datetime('now', 'localtime')",
+        (telegram_id, tenant_id)
+    )
+    if previous and previous["tenant_id"] != tenant_id:
+        _set_owner(conn, previous["tenant_id"], telegram_id, owner=False)
+    _set_owner(conn, tenant_id, telegram_id, owner=True)
+
+
 class TenantService:
     """
     Drop-in replacement for the Google Sheets TenantService.
@@ -22,24 +56,7 @@ class TenantService:
     def validate_token(self, token: str):
         """Validate a token and return tenant info. Returns None if invalid."""
         try:
-            with get_admin_conn() as conn:
-                row = conn.execute(
-                    "SELECT tenant_id, pyme_name, sheet_id, token, business_type, nit, address, description, created_at FROM tenants WHERE token = ?",
-                    (token,)
-                ).fetchone()
-                if row:
-                    return {
-                        "tenant_id": row["tenant_id"],
-                        "pyme_name": row["pyme_name"],
-                        "sheet_id": row["sheet_id"] or "",
-                        "token": row["token"],
-                        "business_type": row["business_type"] or "",
-                        "nit": row["nit"] or "",
-                        "address": row["address"] or "",
-                        "description": row["description"] or "",
-                        "created_at": row["created_at"] or "",
-                    }
-            return None
+            return registry.by_token(token)
         except Exception:
             return None
 
@@ -58,10 +75,13 @@ class TenantService:
             # Register in admin DB
             with get_admin_conn() as conn:
                 conn.execute(
-                    """INSERT INTO tenants (telegram_id, tenant_id, pyme_name, sheet_id, token, created_at, business_type)
-                       VALUES (?, ?, ?, ?, ?, ?, ?)""",
-                    (str(telegram_id), new_uuid, name, '', token, timestamp, business_type)
+                    """INSERT INTO tenants (id, telegram_id, tenant_id, pyme_name, sheet_id, token, created_at, business_type)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                    (new_uuid, '', new_uuid, name, '', token, timestamp, business_type)
                 )
+                if telegram_id:
+                    _link_telegram_user(conn, str(telegram_id), new_uuid)
+            registry.invalidate()
 
             logger.info(f"Tenant creado: {name}")
 
@@ -76,35 +96,9 @@ class TenantService:
             raise Exception(f"Fallo al crear la infraestructura: {str(e)}")
 
     def get_tenant_by_user(self, telegram_id: str):
-        """Find tenant by Telegram user ID. Supports multiple users per tenant (CSV)."""
+        """Find tenant by Telegram user ID (telegram_users index, O(1))."""
         try:
-            with get_admin_conn() as conn:
-                rows = conn.execute(
-                    "SELECT tenant_id, pyme_name, sheet_id, token FROM tenants WHERE telegram_id LIKE ?",
-                    (f'%{telegram_id}%',)
-                ).fetchall()
-
-                for row in rows:
-                    # Check if telegram_id is in the comma-separated list
-                    owners = row['telegram_id'] if hasattr(row, 'telegram_id') else ''
-                    # Re-query to get telegram_id explicitly
-                    pass
-
-                # Simpler: iterate all and check
-                all_rows = conn.execute(
-                    "SELECT tenant_id, pyme_name, sheet_id, token, telegram_id FROM tenants"
-                ).fetchall()
-
-            for row in all_rows:
-                val = row['telegram_id'] or ''
-                if str(telegram_id) in val.split(','):
-                    return {
-                        "tenant_id": row['tenant_id'],
-                        "pyme_name": row['pyme_name'],
-                        "sheet_id": row['sheet_id'],
-                        "token": row['token'],
-                    }
-            return None
+            return registry.by_telegram_id(str(telegram_id))
         except Exception:
             return None
 
@@ -113,30 +107,22 @@ class TenantService:
         try:
             with get_admin_conn() as conn:
                 row = conn.execute(
-                    "SELECT tenant_id, pyme_name, telegram_id FROM tenants WHERE token = ?",
+                    "SELECT tenant_id, pyme_name FROM tenants WHERE token = ?",
                     (token,)
                 ).fetchone()
 
                 if not row:
                     return False, "❌ Token inválido o no encontrado\\."
 
-                current = row['telegram_id'] or ''
-                owners = [o.strip() for o in current.split(',') if o.strip()]
-
-                if str(telegram_id) not in owners:
-                    owners.append(str(telegram_id))
-                    new_val = ','.join(owners)
-                    conn.execute(
-                        "UPDATE tenants SET telegram_id = ? WHERE token = ?",
-                        (new_val, token)
-                    )
+                _link_telegram_user(conn, str(telegram_id), row['tenant_id'])
+            registry.invalidate()
 
-                pyme_name = row['pyme_name']
-                safe_pyme = str(pyme_name)
-                for c in ['_', '*', '[', ']', '(', ')', '~', '`', '>', '#', '+', '-', '=', '|', '{', '}', '.', '!']:
-                    safe_pyme = safe_pyme.replace(c, f"\\{c}")
+            pyme_name = row['pyme_name']
+            safe_pyme = str(pyme_name)
+            for c in ['_', '*', '[', ']', '(', ')', '~', '`', '>', '#', '+', '-', '=', '|', '{', '}', '.', '!']:
+                safe_pyme = safe_pyme.replace(c, f"\\{c}")
 
-                return True, f"✅ ¡Vinculación exitosa\\!\\nBienvenido a *{safe_pyme}*\\."
+            return True, f"✅ ¡Vinculación exitosa\\!\\nBienvenido a *{safe_pyme}*\\."
 
         except Exception as e:
             logger.error(f"Error vinculando: {e}")
@@ -145,7 +131,7 @@ class TenantService:
     def list_all(self):
         """List all tenants."""
         try:
-            with get_admin_conn() as conn:
+            with get_admin_read_conn() as conn:
                 rows = conn.execute(
                     "SELECT tenant_id, pyme_name, token, telegram_id, business_type, nit, address, description, created_at FROM tenants ORDER BY created_at DESC"
                 ).fetchall()
@@ -171,15 +157,22 @@ class TenantService:
         """Delete a tenant and its inventory database."""
         try:
             import os
-            from app.core.database import get_db_path
+            from app.core.database import get_db_path, close_tenant_db
+
+            from app.core.auth import invalidate_tenant_cache
 
             with get_admin_conn() as conn:
+                conn.execute("DELETE FROM telegram_users WHERE tenant_id = ?", (tenant_id,))
                 conn.execute("DELETE FROM tenants WHERE tenant_id = ?", (tenant_id,))
+            # Cached auth lookups and issued JWTs would keep the token alive in every worker
+            invalidate_tenant_cache(tenant_id)
 
-            # Remove inventory DB file
+            # Remove inventory DB file (close pooled handles first)
+            close_tenant_db(tenant_id)
             db_path = get_db_path(tenant_id)
-            if os.path.exists(db_path):
-                os.remove(db_path)
+            for path in (db_path, f"{db_path}-wal", f"{db_path}-shm"):
+                if os.path.exists(path):
+                    os.remove(path)
 
             return True
         except Exception as e:
@@ -8,8 +8,7 @@ import json
 from contextlib import contextmanager
 from typing import Optional
 
-DB_DIR = "/app/data"
-os.makedirs(DB_DIR, exist_ok=True)
+from app.core.database import DB_DIR
 
 
 class UsageTracker:
@@ -1,33 +1,29 @@
 'use client';
 
-import { useState, useEffect, useMemo } from 'react';
+import { useState, useEffect } from 'react';
 import { Edit3, Trash2, X, Plus, Columns } from 'lucide-react';
 import { Product, CustomColumn } from '@/types';
 import { confirmToast } from '@/lib/confirm';
-import { useInventoryStore } from '@/stores/inventoryStore';
+import { useInventoryStore, PAGE_SIZE } from '@/stores/inventoryStore';
 import { createCustomColumn, deleteCustomColumn } from '@/lib/api';
 import toast from 'react-hot-toast';
-const ITEMS_PER_PAGE = 10;
 
 type SortField = 'name' | 'stock' | 'price' | 'category' | 'expiration_date';
-type SortDir = 'asc' | 'desc';
+type StockFilter = 'low' | 'out' | 'normal';
 
 export default function InventoryTable({ token, jwt }: { token: string; jwt?: string }) {
   const {
-    products, loading, error, highlightSku, customColumns,
-    fetchProducts, createProduct, updateProduct, deleteProduct,
+    products, total, loading, error, highlightSku, customColumns, categories, query, page, cursors,
+    loadPage, setQuery, refresh, createProduct, updateProduct, deleteProduct,
   } = useInventoryStore();
 
   const [showColumnModal, setShowColumnModal] = useState(false);
   const [newColName, setNewColName] = useState('');
   const [newColType, setNewColType] = useState('text');
 
-  const [search, setSearch] = useState('');
-  const [categoryFilter, setCategoryFilter] = useState('');
-  const [stockFilter, setStockFilter] = useState('');
-  const [sortField, setSortField] = useState<SortField>('name');
-  const [sortDir, setSortDir] = useState<SortDir>('asc');
-  const [page, setPage] = useState(1);
+  const [search, setSearch] = useState(query.q || '');
+  const categoryFilter = query.category || '';
+  const stockFilter = query.stock || '';
   const [showFilters, setShowFilters] = useState(false);
   const [editing, setEditing] = useState<Product | null>(null);
   const [editForm, setEditForm] = useState<Partial<Product>>({});
@@ -36,9 +32,21 @@ export default function InventoryTable({ token, jwt }: { token: string; jwt?: st
   const [newProduct, setNewProduct] = useState({ name: '', category: 'General', stock: 0, unit: 'UND', cost: 0, price: 0, expiration_date: '', location: '', invima: '', lote: '', sku: '' });
 
   useEffect(() => {
-    fetchProducts(token, jwt);
+    refresh(token, jwt);
+    const interval = setInterval(() => refresh(token, jwt), 60000);
+    return () => clearInterval(interval);
   }, [token, jwt]);
 
+  // Search runs on the server: wait for a pause in typing
+  useEffect(() => {
+    const timer = setTimeout(() => setQuery(token, { q: search.trim() }, jwt), 300);
+    return () => clearTimeout(timer);
+  }, [search]);
+
+  const setCategoryFilter = (category: string) => setQuery(token, { category }, jwt);
+  const setStockFilter = (stock: string) => setQuery(token, { stock: (stock || undefined) as StockFilter | undefined }, jwt);
+  const clearFilters = () => setQuery(token, { category: '', stock: undefined }, jwt);
+
   const startEdit = (p: Product) => {
     setEditing(p);
     setEditForm({ name: p.name, category: p.category, stock: p.stock, unit: p.unit, price: p.price, cost: p.cost, expiration_date: p.expiration_date, location: p.location, invima: p.invima, lote: p.lote });
@@ -64,86 +72,24 @@ export default function InventoryTable({ token, jwt }: { token: string; jwt?: st
     await createProduct(token, newProduct, jwt);
     setShowCreate(false);
     setNewProduct({ name: '', category: 'General', stock: 0, unit: 'UND', cost: 0, price: 0, expiration_date: '', location: '', invima: '', lote: '', sku: '' });
-    setSearch('');
-    setCategoryFilter('');
-    setStockFilter('');
-    setPage(1);
     setSaving(false);
   };
 
-  // Extraer categorias unicas
-  const categories = useMemo(() => {
-    const cats = new Set(products.map(p => p.category).filter(Boolean));
-    return Array.from(cats).sort();
-  }, [products]);
-
-  // Filtrar
-  const filtered = useMemo(() => {
-    let result = [...products];
-
-    // Busqueda texto
-    if (search) {
-      const q = search.toLowerCase();
-      result = result.filter(p =>
-        p.name.toLowerCase().includes(q) ||
-        p.sku.toLowerCase().includes(q) ||
-        p.category.toLowerCase().includes(q)
-      );
-    }
-
-    // Filtro categoria
-    if (categoryFilter) {
-      result = result.filter(p => p.category === categoryFilter);
-    }
-
-    // Filtro stock
-    if (stockFilter === 'low') {
-      result = result.filter(p => p.stock > 0 && p.stock <= 5);
-    } else if (stockFilter === 'out') {
-      result = result.filter(p => p.stock <= 0);
-    } else if (stockFilter === 'normal') {
-      result = result.filter(p => p.stock > 5);
-    }
-
-    // Ordenar
-    result.sort((a, b) => {
-      let va: any, vb: any;
-      switch (sortField) {
-        case 'name': va = a.name; vb = b.name; break;
-        case 'stock': va = a.stock; vb = b.stock; break;
-        case 'price': va = a.price; vb = b.price; break;
-        case 'category': va = a.category; vb = b.category; break;
-        case 'expiration_date': va = a.expiration_date || ''; vb = b.expiration_date || ''; break;
-        default: return 0;
-      }
-      if (typeof va === 'string') {
-        return sortDir === 'asc' ? va.localeCompare(vb) : vb.localeCompare(va);
-      }
-      return sortDir === 'asc' ? va - vb : vb - va;
-    });
-
-    return result;
-  }, [products, search, categoryFilter, stockFilter, sortField, sortDir]);
-
-  // Paginacion
-  const totalPages = Math.ceil(filtered.length / ITEMS_PER_PAGE);
-  const paginated = filtered.slice((page - 1) * ITEMS_PER_PAGE, page * ITEMS_PER_PAGE);
-
-  // Reset page on filter change
-  useEffect(() => { setPage(1); }, [search, categoryFilter, stockFilter]);
+  // Paginacion (keyset: solo se avanza/retrocede pagina a pagina)
+  const totalPages = Math.max(1, Math.ceil(total / PAGE_SIZE));
+  const hasNext = page + 1 < cursors.length;
 
   const toggleSort = (field: SortField) => {
-    if (sortField === field) {
-      setSortDir(prev => prev === 'asc' ? 'desc' : 'asc');
+    if (query.sort === field) {
+      setQuery(token, { order: query.order === 'asc' ? 'desc' : 'asc' }, jwt);
     } else {
-      setSortField(field);
-      setSortDir('asc');
+      setQuery(token, { sort: field, order: 'asc' }, jwt);
     }
   };
 
   const SortIcon = ({ field }: { field: SortField }) => {
-    if (sortField !== field) return <span className="text-gray-300 ml-1">↕</span>;
-    return <span className="text-indigo-500 ml-1">{sortDir === 'asc' ? '↑' : '↓'}</span>;
+    if (query.sort !== field) return <span className="text-gray-300 ml-1">↕</span>;
+    return <span className="text-indigo-500 ml-1">{query.order === 'asc' ? '↑' : '↓'}</span>;
   };
 
   if (loading) {
@@ -163,7 +109,7 @@ export default function InventoryTable({ token, jwt }: { token: string; jwt?: st
       <div className="rounded-xl border border-red-200 bg-red-50 p-8 text-center">
         <span className="text-3xl block mb-3">⚠️</span>
         <p className="text-sm text-red-600 mb-4">{error}</p>
-        <button onClick={() => fetchProducts(token, jwt)}
+        <button onClick={() => refresh(token, jwt)}
           className="px-4 py-2 bg-indigo-600 text-white text-sm font-medium rounded-xl hover:bg-indigo-500 transition-colors">
           Reintentar
         </button>
@@ -181,7 +127,7 @@ export default function InventoryTable({ token, jwt }: { token: string; jwt?: st
             <span className="absolute left-3 top-1/2 -translate-y-1/2 text-sm text-gray-400">🔍</span>
             <input
               type="text"
-              placeholder="Buscar por nombre, SKU o categoria..."
+              placeholder="Buscar por nombre, SKU, lote o INVIMA..."
               className="w-full pl-10 pr-4 py-2 bg-gray-50 border border-gray-200 rounded-lg
                 text-sm text-gray-900 placeholder-gray-400
                 focus:outline-none focus:border-indigo-500 focus:ring-2 focus:ring-indigo-500/20"
@@ -221,7 +167,7 @@ export default function InventoryTable({ token, jwt }: { token: string; jwt?: st
 
           {/* Results count */}
           <span className="text-xs text-gray-400 ml-auto">
-            {filtered.length} de {products.length} productos
+            {total} productos
           </span>
         </div>
 
@@ -254,7 +200,7 @@ export default function InventoryTable({ token, jwt }: { token: string; jwt?: st
 
             {(categoryFilter || stockFilter) && (
               <button
-                onClick={() => { setCategoryFilter(''); setStockFilter(''); }}
+                onClick={clearFilters}
                 className="px-3 py-1.5 text-xs text-red-600 hover:bg-red-50 rounded-lg transition-colors"
               >
                 Limpiar filtros
@@ -309,7 +255,7 @@ export default function InventoryTable({ token, jwt }: { token: string; jwt?: st
                 <th key={col.id} className="text-left px-4 py-3 text-xs font-semibold text-gray-500 uppercase tracking-wider hidden xl:table-cell">
                   <div className="flex items-center gap-1 group">
                     {col.name}
-                    <button onClick={() => { deleteCustomColumn(token, col.id, jwt).then(() => fetchProducts(token, jwt)).catch(() => {}); }}
+                    <button onClick={() => { deleteCustomColumn(token, col.id, jwt).then(() => refresh(token, jwt)).catch(() => {}); }}
                       className="opacity-0 group-hover:opacity-100 text-red-400 hover:text-red-600 ml-1">
                       <X className="w-3 h-3" />
                     </button>
@@ -322,7 +268,7 @@ export default function InventoryTable({ token, jwt }: { token: string; jwt?: st
             </tr>
           </thead>
           <tbody className="divide-y divide-gray-50">
-            {paginated.map((product) => (
+            {products.map((product) => (
               <tr key={product.uuid} className={`hover:bg-gray-50/70 transition-colors ${highlightSku === product.sku ? 'animate-pulse bg-indigo-50 ring-2 ring-indigo-300' : ''}`}>
                 <td className="px-6 py-3.5 whitespace-nowrap">
                   <code className="text-xs font-medium text-gray-500 bg-gray-100 px-2 py-0.5 rounded">
@@ -406,7 +352,7 @@ export default function InventoryTable({ token, jwt }: { token: string; jwt?: st
       </div>
 
       {/* Empty state */}
-      {filtered.length === 0 && (
+      {products.length === 0 && (
         <div className="py-20 text-center">
           <span className="text-5xl block mb-4">📭</span>
           <p className="text-sm text-gray-400 font-medium">
@@ -416,7 +362,7 @@ export default function InventoryTable({ token, jwt }: { token: string; jwt?: st
           </p>
           {(search || categoryFilter || stockFilter) && (
             <button
-              onClick={() => { setSearch(''); setCategoryFilter(''); setStockFilter(''); }}
+              onClick={() => { setSearch(''); clearFilters(); }}
               className="mt-3 text-xs text-indigo-600 hover:text-indigo-500 font-medium"
             >
               Limpiar todos los filtros
@@ -426,60 +372,37 @@ export default function InventoryTable({ token, jwt }: { token: string; jwt?: st
       )}
 
       {/* Pagination */}
-      {totalPages > 1 && (
+      {(page > 0 || hasNext) && (
         <div className="px-6 py-3 border-t border-gray-100 flex items-center justify-between gap-4 flex-wrap">
           <span className="text-xs text-gray-400">
-            Pagina {page} de {totalPages}
+            Pagina {page + 1} de {totalPages}
           </span>
 
           <div className="flex items-center gap-1">
             <button
-              onClick={() => setPage(1)}
-              disabled={page === 1}
+              onClick={() => loadPage(token, 0, jwt)}
+              disabled={page === 0}
               className="px-2 py-1 text-xs rounded-md text-gray-500 hover:bg-gray-100 disabled:opacity-30 disabled:cursor-not-allowed transition-colors"
             >
               ⏮
             </button>
             <button
-              onClick={() => setPage(p => Math.max(1, p - 1))}
-              disabled={page === 1}
+              onClick={() => loadPage(token, page - 1, jwt)}
+              disabled={page === 0}
               className="px-3 py-1 text-xs rounded-md text-gray-600 hover:bg-gray-100 disabled:opacity-30 disabled:cursor-not-allowed transition-colors"
             >
               ‹ Anterior
             </button>
-
-            {generatePages(page, totalPages).map((p, i) =>
-              p === '...' ? (
-                <span key={`dots-${i}`} className="px-1 text-gray-400 text-xs">...</span>
-              ) : (
-                <button
-                  key={p}
-                  onClick={() => setPage(p as number)}
-                  className={`w-8 h-8 text-xs rounded-md font-medium transition-colors ${
-                    page === p
-                      ? 'bg-indigo-600 text-white shadow-sm'
-                      : 'text-gray-600 hover:bg-gray-100'
-                  }`}
-                >
-                  {p}
-                </button>
-              )
-            )}
-
+            <span className="w-8 h-8 flex items-center justify-center text-xs rounded-md font-medium bg-indigo-600 text-white shadow-sm">
+              {page + 1}
+            </span>
             <button
-              onClick={() => setPage(p => Math.min(totalPages, p + 1))}
-              disabled={page === totalPages}
+              onClick={() => loadPage(token, page + 1, jwt)}
+              disabled={!hasNext}
               className="px-3 py-1 text-xs rounded-md text-gray-600 hover:bg-gray-100 disabled:opacity-30 disabled:cursor-not-allowed transition-colors"
             >
               Siguiente ›
             </button>
-            <button
-              onClick={() => setPage(totalPages)}
-              disabled={page === totalPages}
-              className="px-2 py-1 text-xs rounded-md text-gray-500 hover:bg-gray-100 disabled:opacity-30 disabled:cursor-not-allowed transition-colors"
-            >
-              ⏭
-            </button>
           </div>
         </div>
       )}
@@ -675,7 +598,7 @@ export default function InventoryTable({ token, jwt }: { token: string; jwt?: st
                 {customColumns.map(col => (
                   <div key={col.id} className="flex items-center justify-between bg-gray-50 px-3 py-2 rounded-lg text-sm">
                     <span><span className="font-medium text-gray-800">{col.name}</span> <span className="text-gray-400 text-xs">({col.col_type})</span></span>
-                    <button onClick={() => { deleteCustomColumn(token, col.id, jwt).then(() => fetchProducts(token, jwt)).catch(() => {}); }}
+                    <button onClick={() => { deleteCustomColumn(token, col.id, jwt).then(() => refresh(token, jwt)).catch(() => {}); }}
                       className="text-red-400 hover:text-red-600 text-xs">Eliminar</button>
                   </div>
                 ))}
@@ -697,7 +620,7 @@ export default function InventoryTable({ token, jwt }: { token: string; jwt?: st
                 if (!newColName) return;
                 try {
                   await createCustomColumn(token, { name: newColName, col_type: newColType }, jwt);
-                  await fetchProducts(token, jwt);
+                  await refresh(token, jwt);
                   setNewColName('');
                   toast.success('Columna agregada');
                 } catch { toast.error('Error al crear columna'); }
@@ -712,20 +635,3 @@ export default function InventoryTable({ token, jwt }: { token: string; jwt?: st
     </div>
   );
 }
-
-function generatePages(current: number, total: number): (number | string)[] {
-  if (total <= 7) return Array.from({ length: total }, (_, i) => i + 1);
-  const pages: (number | string)[] = [1];
-
-  if (current > 3) pages.push('...');
-
-  const start = Math.max(2, current - 1);
-  const end = Math.min(total - 1, current + 1);
-
-  for (let i = start; i <= end; i++) pages.push(i);
-
-  if (current < total - 2) pages.push('...');
-
-  pages.push(total);
-  return pages;
-}
@@ -25,17 +25,48 @@ async function fetchWithRetry(url: string, options: RequestInit = {}, retries =
   throw new Error('Max retries');
 }
 
-import { Product, InventoryResponse, Stats, AlertsResponse, MovementsResponse, AnalyticsResponse, SuppliersResponse, CustomColumn, ClientsResponse, Client, Remision } from '@/types';
+import { Product, InventoryResponse, InventoryPageParams, InventoryChangesResponse, ImportJob, Stats, AlertsResponse, MovementsResponse, AnalyticsResponse, SuppliersResponse, CustomColumn, ClientsResponse, Client, Remision } from '@/types';
 
 export async function getInventory(tenantToken: string, jwt?: string): Promise<InventoryResponse> {
   const res = await fetchWithRetry(`${API_URL}/api/inventory?token=${tenantToken}`, {
-    cache: 'no-store',
+    cache: 'no-cache',  // revalidate with If-None-Match; 304 when unchanged
+    headers: authHeaders(jwt),
+  });
+  if (!res.ok) throw new Error('Error cargando inventario');
+  return res.json();
+}
+
+export async function getInventoryPage(tenantToken: string, params: InventoryPageParams, jwt?: string): Promise<InventoryResponse> {
+  const qs = new URLSearchParams({ token: tenantToken, limit: String(params.limit ?? 100) });
+  for (const [k, v] of Object.entries(params)) {
+    if (k !== 'limit' && v !== undefined && v !== null && v !== '' && v !== false) qs.set(k, String(v));
+  }
+  const res = await fetchWithRetry(`${API_URL}/api/inventory?${qs}`, {
+    cache: 'no-cache',
     headers: authHeaders(jwt),
   });
   if (!res.ok) throw new Error('Error cargando inventario');
   return res.json();
 }
 
+export async function getInventoryCategories(tenantToken: string, jwt?: string): Promise<{categories: string[]}> {
+  const res = await fetchWithRetry(`${API_URL}/api/inventory/categories?token=${tenantToken}`, {
+    cache: 'no-cache',
+    headers: authHeaders(jwt),
+  });
+  if (!res.ok) throw new Error('Error cargando categorias');
+  return res.json();
+}
+
+export async function getInventoryChanges(tenantToken: string, since: number, jwt?: string): Promise<InventoryChangesResponse> {
+  const res = await fetchWithRetry(`${API_URL}/api/inventory/changes?token=${tenantToken}&since=${since}`, {
+    cache: 'no-cache',
+    headers: authHeaders(jwt),
+  });
+  if (!res.ok) throw new Error('Error sincronizando inventario');
+  return res.json();
+}
+
 export async function updateProduct(token: string, product: Partial<Product>, jwt?: string): Promise<Product> {
   const res = await fetchWithRetry(`${API_URL}/api/products/${product.sku}?token=${token}`, {
     method: 'PATCH',
@@ -66,7 +97,7 @@ export async function createProduct(token: string, product: Partial<Product>, jw
 
 export async function getStats(token: string, jwt?: string): Promise<Stats> {
   const res = await fetchWithRetry(`${API_URL}/api/stats?token=${token}`, {
-    cache: 'no-store',
+    cache: 'no-cache',
     headers: authHeaders(jwt),
   });
   if (!res.ok) throw new Error('Error cargando estadisticas');
@@ -75,7 +106,7 @@ export async function getStats(token: string, jwt?: string): Promise<Stats> {
 
 export async function getAlerts(token: string, jwt?: string): Promise<AlertsResponse> {
   const res = await fetchWithRetry(`${API_URL}/api/alerts?token=${token}`, {
-    cache: 'no-store',
+    cache: 'no-cache',
     headers: authHeaders(jwt),
   });
   if (!res.ok) throw new Error('Error cargando alertas');
@@ -84,7 +115,7 @@ export async function getAlerts(token: string, jwt?: string): Promise<AlertsResp
 
 export async function getMovements(token: string, limit = 10, jwt?: string): Promise<MovementsResponse> {
   const res = await fetchWithRetry(`${API_URL}/api/movements?token=${token}&limit=${limit}`, {
-    cache: 'no-store',
+    cache: 'no-cache',
     headers: authHeaders(jwt),
   });
   if (!res.ok) throw new Error('Error cargando movimientos');
@@ -135,7 +166,7 @@ export async function deleteSupplier(token: string, id: number, jwt?: string): P
 
 export async function getAnalytics(token: string, jwt?: string): Promise<AnalyticsResponse> {
   const res = await fetchWithRetry(`${API_URL}/api/analytics?token=${token}`, {
-    cache: 'no-store',
+    cache: 'no-cache',
     headers: authHeaders(jwt),
   });
   if (!res.ok) throw new Error('Error cargando analitica');
@@ -173,6 +204,39 @@ export async function deleteCustomColumn(token: string, id: number, jwt?: string
   if (!res.ok) throw new Error('Error eliminando columna');
 }
 
+// ── Bulk import / export ──
+
+/** Sends the file as the raw request body (no multipart); the import runs in the background. */
+export async function importInventory(token: string, file: File, createColumns = false, jwt?: string): Promise<ImportJob> {
+  const res = await fetch(`${API_URL}/api/inventory/import?token=${token}&create_columns=${createColumns}`, {
+    method: 'POST',
+    headers: authHeaders(jwt, { 'Content-Type': file.type || 'application/octet-stream' }),
+    body: file,
+  });
+  if (!res.ok) {
+    const err = await res.json().catch(() => null);
+    throw new Error(err?.detail || 'Error importando inventario');
+  }
+  return res.json();
+}
+
+export async function getImportJob(token: string, jobId: string, jwt?: string): Promise<ImportJob> {
+  const res = await fetchWithRetry(`${API_URL}/api/inventory/import/${jobId}?token=${token}`, {
+    cache: 'no-store',
+    headers: authHeaders(jwt),
+  });
+  if (!res.ok) throw new Error('Error consultando importacion');
+  return res.json();
+}
+
+export async function exportInventory(token: string, format: 'csv' | 'xlsx' = 'csv', jwt?: string): Promise<Blob> {
+  const res = await fetch(`${API_URL}/api/inventory/export?token=${token}&format=${format}`, {
+    headers: authHeaders(jwt),
+  });
+  if (!res.ok) throw new Error('Error exportando inventario');
+  return res.blob();
+}
+
 
 // ── Clients ──
 
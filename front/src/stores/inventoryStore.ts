@@ -1,40 +1,99 @@
 import { create } from 'zustand';
-import { Product, CustomColumn } from '@/types';
+import { Product, CustomColumn, InventoryPageParams } from '@/types';
 import {
-  getInventory, updateProduct as apiUpdateProduct,
+  getInventoryPage, getInventoryCategories, updateProduct as apiUpdateProduct,
   deleteProduct as apiDeleteProduct, createProduct as apiCreateProduct,
 } from '@/lib/api';
 import toast from 'react-hot-toast';
 import { trackEvent } from '@/lib/tracker';
 
+export const PAGE_SIZE = 10;
+
+export type InventoryQuery = Required<Pick<InventoryPageParams, 'sort' | 'order'>> &
+  Pick<InventoryPageParams, 'q' | 'category' | 'stock'>;
+
+const DEFAULT_QUERY: InventoryQuery = { sort: 'name', order: 'asc', q: '', category: '', stock: undefined };
+
 interface InventoryState {
-  products: Product[];
+  products: Product[];        // current page only; filters, sort and paging run on the server
+  total: number;              // rows matching the current filters
   customColumns: CustomColumn[];
+  categories: string[];
+  query: InventoryQuery;
+  page: number;               // 0-based
+  cursors: (string | null)[]; // cursors[i] loads page i (keyset: pages are reached in order)
   loading: boolean;
   error: string;
   highlightSku: string;
 
-  fetchProducts: (token: string, jwt?: string) => Promise<void>;
+  loadPage: (token: string, page: number, jwt?: string) => Promise<void>;
+  setQuery: (token: string, patch: Partial<InventoryQuery>, jwt?: string) => Promise<void>;
+  refresh: (token: string, jwt?: string) => Promise<void>;
+  fetchCategories: (token: string, jwt?: string) => Promise<void>;
   createProduct: (token: string, data: Partial<Product>, jwt?: string) => Promise<void>;
   updateProduct: (token: string, sku: string, data: Partial<Product>, jwt?: string) => Promise<void>;
   deleteProduct: (token: string, sku: string, name: string, jwt?: string) => Promise<void>;
   setHighlight: (sku: string) => void;
 }
 
+// Only the latest request may write the page: typing fast must not show an older search
+let requestSeq = 0;
+
 export const useInventoryStore = create<InventoryState>((set, get) => ({
   products: [],
+  total: 0,
   customColumns: [],
+  categories: [],
+  query: DEFAULT_QUERY,
+  page: 0,
+  cursors: [null],
   loading: true,
   error: '',
   highlightSku: '',
 
-  fetchProducts: async (token, jwt) => {
-    set({ loading: true, error: '' });
+  loadPage: async (token, page, jwt) => {
+    const { query, cursors } = get();
+    if (page < 0 || page >= cursors.length) return;
+    const seq = ++requestSeq;
+    set({ error: '' });
     try {
-      const data = await getInventory(token, jwt);
-      set({ products: data.products, customColumns: data.custom_columns || [], loading: false });
+      const data = await getInventoryPage(token, { ...query, limit: PAGE_SIZE, cursor: cursors[page] }, jwt);
+      if (seq !== requestSeq) return;
+      // A page emptied by deletes elsewhere: fall back to the previous one
+      if (data.products.length === 0 && page > 0) {
+        set({ cursors: cursors.slice(0, page) });
+        return get().loadPage(token, page - 1, jwt);
+      }
+      set({
+        products: data.products, total: data.total, customColumns: data.custom_columns || [],
+        page, cursors: [...cursors.slice(0, page + 1), ...(data.next_cursor ? [data.next_cursor] : [])],
+        loading: false,
+      });
     } catch (err: any) {
-      set({ error: err.message, loading: false });
+      if (seq === requestSeq) set({ error: err.message, loading: false });
+    }
+  },
+
+  // Any filter/sort change restarts from the first page (cursors belong to one query)
+  setQuery: async (token, patch, jwt) => {
+    const query = { ...get().query, ...patch };
+    const current = get().query;
+    if ((Object.keys(query) as (keyof InventoryQuery)[]).every(k => query[k] === current[k])) return;
+    set({ query, cursors: [null] });
+    return get().loadPage(token, 0, jwt);
+  },
+
+  // Reload the visible page; ETag revalidation makes this a 304 when nothing changed
+  refresh: async (token, jwt) => {
+    await Promise.all([get().loadPage(token, get().page, jwt), get().fetchCategories(token, jwt)]);
+  },
+
+  fetchCategories: async (token, jwt) => {
+    try {
+      const data = await getInventoryCategories(token, jwt);
+      set({ categories: data.categories });
+    } catch {
+      // Keep the previous list; the dropdown is only a convenience
     }
   },
 
@@ -55,18 +114,22 @@ export const useInventoryStore = create<InventoryState>((set, get) => ({
       lote: (data.lote as string) || '',
     };
 
-    // Optimistic insert
+    // Optimistic insert on top of the visible page
     set(state => ({ products: [optimistic, ...state.products], highlightSku: tempSku }));
     setTimeout(() => set({ highlightSku: '' }), 2000);
 
     try {
       const result = await apiCreateProduct(token, data, jwt);
-      // Replace optimistic with server product (has real UUID + SKU)
+      // Replace optimistic with server product (has real UUID + SKU); it keeps the top
+      // row until the next load puts it where the current sort says
       set(state => ({
         products: state.products.map(p =>
           p.sku === tempSku ? result.product : p
         ),
+        total: state.total + 1,
+        highlightSku: state.highlightSku === tempSku ? result.product.sku : state.highlightSku,
       }));
+      get().fetchCategories(token, jwt);
       toast.success('Producto creado');
       try { trackEvent(token, 'create_product', 'crud', 'inventory', { sku: result.product.sku }, jwt); } catch {}
     } catch {
@@ -89,25 +152,25 @@ export const useInventoryStore = create<InventoryState>((set, get) => ({
       try { trackEvent(token, 'update_product', 'crud', 'inventory', { sku }, jwt); } catch {}
       toast.success('Producto actualizado');
     } catch {
-      // Rollback
-      await get().fetchProducts(token, jwt);
       toast.error('Error al guardar');
     }
+    // The edit may move the row out of the filters/sort: reload (also rolls back on error)
+    await get().refresh(token, jwt);
   },
 
   deleteProduct: async (token, sku, name, jwt) => {
     // Optimistic delete
-    set(state => ({ products: state.products.filter(p => p.sku !== sku) }));
+    set(state => ({ products: state.products.filter(p => p.sku !== sku), total: Math.max(0, state.total - 1) }));
 
     try {
       await apiDeleteProduct(token, sku, jwt);
       try { trackEvent(token, 'delete_product', 'crud', 'inventory', { sku }, jwt); } catch {}
       toast.success(`${name} eliminado`);
     } catch {
-      // Rollback
-      await get().fetchProducts(token, jwt);
       toast.error('Error al eliminar');
     }
+    // Pull the next row into the page (or restore it on error)
+    await get().refresh(token, jwt);
   },
 
   setHighlight: (sku) => {
@@ -24,6 +24,47 @@ export interface InventoryResponse {
   products: Product[];
   total: number;
   custom_columns?: CustomColumn[];
+  next_cursor?: string | null;
+  change_cursor?: number | null;
+}
+
+export interface InventoryChangesResponse {
+  products: Product[];
+  deleted: string[];
+  cursor: number;
+  has_more: boolean;
+  reset: boolean;
+  custom_columns?: CustomColumn[] | null;
+}
+
+export interface ImportJob {
+  id: string;
+  status: 'queued' | 'running' | 'done' | 'failed';
+  format: 'csv' | 'xlsx';
+  rows: number;
+  inserted: number;
+  updated: number;
+  skipped: number;
+  errors: { line: number; sku: string; error: string }[];
+  ignored_columns: string[];
+  created_columns: string[];
+  started_at: string | null;
+  finished_at: string | null;
+  elapsed_ms: number | null;
+  message: string;
+}
+
+export interface InventoryPageParams {
+  limit?: number;
+  cursor?: string | null;
+  sort?: 'name' | 'sku' | 'category' | 'location' | 'stock' | 'price' | 'expiration_date' | 'created';
+  order?: 'asc' | 'desc';
+  q?: string;
+  category?: string;
+  location?: string;
+  low_stock?: boolean;
+  stock?: 'low' | 'out' | 'normal';
+  expiring_days?: number;
 }
 
 export interface CustomColumn {
@@ -0,0 +1,66 @@
+"""
+Test setup: every test session gets its own DATA_DIR, set before the app
+modules read their settings, so nothing touches real tenant files.
+"""
+import os
+import tempfile
+import uuid
+
+os.environ["DATA_DIR"] = tempfile.mkdtemp(prefix="inventory-tests-")
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "test-token")
+os.environ.setdefault("GROQ_API_KEY", "test-key")
+os.environ.setdefault("MAINT_ENABLED", "false")
+os.environ.setdefault("BACKUP_ENABLED", "false")
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture
+def tenant_id() -> str:
+    """A fresh, fully migrated tenant DB."""
+    from app.core.database import init_tenant_db
+    tid = f"t{uuid.uuid4().hex[:10]}"
+    init_tenant_db(tid)
+    return tid
+
+
+@pytest.fixture
+def service(tenant_id):
+    from app.services.inventory_service import InventoryService
+    return InventoryService(tenant_id)
+
+
+@pytest.fixture
+def add_products(tenant_id):
+    """add_products([(sku, name, stock[, price[, category]]), ...]) into the tenant DB."""
+    from app.core.database import get_conn
+
+    def _add(rows):
+        with get_conn(tenant_id) as conn:
+            for sku, name, stock, *rest in rows:
+                price = rest[0] if rest else 0
+                category = rest[1] if len(rest) > 1 else "General"
+                conn.execute("INSERT INTO products (sku, name, stock, price, category) VALUES (?, ?, ?, ?, ?)",
+                             (sku, name, stock, price, category))
+    return _add
+
+
+@pytest.fixture
+def client():
+    """HTTP client for the app. Startup jobs (migrations, schedulers) are not run."""
+    from fastapi.testclient import TestClient
+    from app.main import app
+    return TestClient(app)
+
+
+@pytest.fixture
+def auth_headers(tenant_id):
+    """Bearer JWT for the tenant fixture."""
+    from app.core.auth import create_token
+    return {"Authorization": f"Bearer {create_token(tenant_id=tenant_id, original_token='tok-' + tenant_id)}"}
+
+
+@pytest.fixture
+def admin_headers():
+    from app.core.auth import create_token
+    return {"Authorization": f"Bearer {create_token(tenant_id='admin', original_token='3HF784F', pyme_name='Admin')}"}
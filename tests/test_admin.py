@@ -0,0 +1,19 @@
+import pytest
+
+from app.core.config import settings
+
+
+@pytest.mark.parametrize("path", ["/admin/maintenance/run", "/admin/backups",
+                                  "/admin/backups/x/verify", "/admin/backups/x/restore"])
+def test_operator_endpoints_need_admin(client, auth_headers, path):
+    assert client.post(path).status_code == 401
+    assert client.post(path, headers=auth_headers).status_code == 403
+
+
+def test_restore_refused_with_several_workers(client, admin_headers, monkeypatch):
+    monkeypatch.setattr(settings, "WEB_CONCURRENCY", 2)
+    assert client.post("/admin/backups/x/restore", headers=admin_headers).status_code == 409
+
+
+def test_restore_unknown_snapshot(client, admin_headers):
+    assert client.post("/admin/backups/missing/restore", headers=admin_headers).status_code == 404
@@ -0,0 +1,58 @@
+"""The admin token is served by the dummy inventory service: no tenant DB behind it."""
+import os
+
+import pytest
+
+from app.core.database import DB_DIR
+
+ADMIN = {"token": "3HF784F"}
+
+
+@pytest.mark.parametrize("path, params", [
+    ("/api/inventory", {}),
+    ("/api/inventory", {"limit": 10, "sort": "name"}),
+    ("/api/inventory/changes", {"since": 0}),
+    ("/api/inventory/categories", {}),
+    ("/api/stats", {}),
+    ("/api/alerts", {}),
+    ("/api/movements", {}),
+    ("/api/analytics", {}),
+])
+def test_admin_token_reads_without_tenant_db(client, path, params):
+    response = client.get(path, params={**ADMIN, **params})
+    assert response.status_code == 200, response.text
+    assert not os.path.exists(os.path.join(DB_DIR, "inventory_admin.db"))
+
+
+def test_tenant_reads_get_etag_and_304(client, tenant_id, auth_headers, add_products):
+    add_products([("ABC", "Arroz", 3, 1000)])
+    first = client.get("/api/inventory", params={"token": "x"}, headers=auth_headers)
+    assert first.status_code == 200 and first.json()["total"] == 1
+    etag = first.headers["ETag"]
+    again = client.get("/api/inventory", params={"token": "x"}, headers={**auth_headers, "If-None-Match": etag})
+    assert again.status_code == 304
+    add_products([("XYZ", "Sal", 1)])
+    changed = client.get("/api/inventory", params={"token": "x"}, headers={**auth_headers, "If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["ETag"] != etag
+
+
+@pytest.mark.parametrize("method, path, params", [
+    ("POST", "/api/inventory/import", {}),
+    ("GET", "/api/inventory/import/abc", {}),
+    ("GET", "/api/inventory/export", {"format": "csv"}),
+    ("GET", "/api/inventory/export", {"format": "xlsx"}),
+])
+def test_admin_token_cannot_import_or_export(client, method, path, params):
+    response = client.request(method, path, params={**ADMIN, **params}, content=b"sku,name\nA,B\n")
+    assert response.status_code == 403, response.text
+    assert not os.path.exists(os.path.join(DB_DIR, "inventory_admin.db"))
+
+
+@pytest.mark.parametrize("body", [
+    {"items": [{"sku": "A", "price": 10}]},
+    {"category": "General", "price_pct": 10},
+])
+def test_admin_token_cannot_bulk_patch(client, body):
+    response = client.patch("/api/products", params=ADMIN, json=body)
+    assert response.status_code == 403, response.text
+    assert not os.path.exists(os.path.join(DB_DIR, "inventory_admin.db"))
@@ -0,0 +1,25 @@
+import time
+
+from app.core.cache import delete_cache, get_cache, get_named_cache, set_cache
+
+
+def test_get_cache_honours_read_ttl(monkeypatch):
+    set_cache("k", {"a": 1}, ttl=300)
+    assert get_cache("k") == {"a": 1}
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 60)
+    assert get_cache("k", ttl=30) is None
+    assert get_cache("k", ttl=120) == {"a": 1}
+    delete_cache("k")
+    assert get_cache("k") is None
+
+
+def test_named_cache_expiry_and_lru():
+    cache = get_named_cache("test-lru", max_entries=2, default_ttl=300)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)  # evicts b, the least recently used
+    assert cache.get("b") is None and cache.get("a") == 1 and cache.get("c") == 3
+    cache.set("d", 4, ttl=-1)
+    assert cache.get("d") is None
@@ -0,0 +1,123 @@
+import sys
+import threading
+import time
+
+import pytest
+
+from app.core.database import get_read_conn
+from app.core.state import state
+from app.services import catalog_io
+from app.services.catalog_io import CatalogIOError, _number, export_csv, get_import_status, spool_path, start_import
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("1500", 1500), ("1.500", 1500), ("1.234.567", 1234567), ("$ 12.000", 12000),
+    ("1.234,50", 1234.5), ("12,5", 12.5), ("1,234.50", 1234.5), ("12.5", 12.5),
+    ("0.500", 0.5), ("1.5", 1.5), ("-2.000", -2000),
+])
+def test_number_formats(text, expected):
+    assert _number(text) == expected
+
+
+def _upload(text: str) -> str:
+    path = spool_path()
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    return path
+
+
+def _wait(tenant_id, job_id, timeout=10) -> dict:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = get_import_status(tenant_id, job_id)
+        if job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.02)
+    raise AssertionError("import did not finish")
+
+
+def test_csv_import_upserts_and_reports_row_errors(tenant_id, add_products):
+    add_products([("ABC", "Arroz", 5, 1000)])
+    job = start_import(tenant_id, _upload(
+        "codigo;nombre;cantidad;precio\n"
+        "abc;;8;1.500\n"          # existing SKU: blank name keeps the current one
+        "NEW1;Sal;3;2.000,50\n"
+        "NEW2;Azucar;-1;100\n"    # invalid stock
+        "NEW1;Dup;1;1\n"          # repeated in the file
+    ), "csv")
+    job = _wait(tenant_id, job["id"])
+    assert job["status"] == "done", job
+    assert (job["inserted"], job["updated"], job["skipped"]) == (1, 1, 2)
+    assert [e["line"] for e in job["errors"]] == [4, 5]
+    with get_read_conn(tenant_id) as conn:
+        rows = {r["sku"]: (r["name"], r["stock"], r["price"]) for r in conn.execute("SELECT sku, name, stock, price FROM products")}
+    assert rows == {"ABC": ("Arroz", 8, 1500), "NEW1": ("Sal", 3, 2000.5)}
+
+
+def test_one_import_per_tenant(tenant_id, monkeypatch):
+    gate = threading.Event()
+    monkeypatch.setattr(catalog_io.ImportJob, "run", lambda self: gate.wait(5))
+    results = []
+
+    def start():
+        try:
+            results.append(start_import(tenant_id, _upload("sku,name\nA,B\n"), "csv")["id"])
+        except CatalogIOError as e:
+            results.append(e.status_code)
+
+    threads = [threading.Thread(target=start) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    gate.set()
+    assert results.count(409) == 7
+    state.delete(catalog_io._ACTIVE, tenant_id)
+
+
+def test_xlsx_without_openpyxl_is_501(tenant_id, monkeypatch):
+    monkeypatch.setitem(sys.modules, "openpyxl", None)  # import fails as if not installed
+    path = _upload("PK")
+    with pytest.raises(CatalogIOError) as exc:
+        start_import(tenant_id, path, "xlsx")
+    assert exc.value.status_code == 501
+    with pytest.raises(CatalogIOError) as exc:
+        catalog_io.export_xlsx(tenant_id)
+    assert exc.value.status_code == 501
+
+
+def test_export_csv_includes_custom_columns(tenant_id, add_products):
+    from app.core.database import get_conn
+    add_products([("ABC", "Arroz", 5, 1000)])
+    with get_conn(tenant_id) as conn:
+        conn.execute("INSERT INTO custom_columns (id, name) VALUES (1, 'Marca')")
+        conn.execute("INSERT INTO product_custom_values (product_sku, column_id, value) VALUES ('ABC', 1, 'Diana')")
+    lines = b"".join(export_csv(tenant_id)).decode("utf-8-sig").splitlines()
+    assert lines[0].endswith(",Marca") and lines[1].startswith("ABC,Arroz,") and lines[1].endswith(",Diana")
+
+
+def test_queued_job_keeps_its_claim(tenant_id, monkeypatch):
+    slots = threading.BoundedSemaphore(1)
+    slots.acquire()  # every import slot busy
+    monkeypatch.setattr(catalog_io, "_slots", slots)
+    monkeypatch.setattr(catalog_io, "_ACTIVE_TTL", 0.3)
+    job = start_import(tenant_id, _upload("sku,name\nA,Arroz\n"), "csv")
+    time.sleep(1)  # longer than the claim's ttl
+    with pytest.raises(CatalogIOError) as exc:
+        start_import(tenant_id, _upload("sku,name\nB,Sal\n"), "csv")
+    assert exc.value.status_code == 409
+    slots.release()
+    assert _wait(tenant_id, job["id"])["status"] == "done"
+    assert state.get(catalog_io._ACTIVE, tenant_id) is None
+
+
+def test_import_endpoint(client, tenant_id, auth_headers):
+    response = client.post("/api/inventory/import", params={"token": "x"}, headers=auth_headers,
+                           content=b"sku,name,stock\nA,Arroz,4\nB,Sal,2\n")
+    assert response.status_code == 202, response.text
+    job = _wait(tenant_id, response.json()["id"])
+    assert job["inserted"] == 2
+    status = client.get(f"/api/inventory/import/{job['id']}", params={"token": "x"}, headers=auth_headers)
+    assert status.json()["status"] == "done"
+    export = client.get("/api/inventory/export", params={"token": "x"}, headers=auth_headers)
+    assert export.status_code == 200 and "A,Arroz" in export.text
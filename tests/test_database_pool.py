@@ -0,0 +1,146 @@
+import os
+import threading
+
+import pytest
+
+from app.core.cache import cached_payload
+from app.core.database import ConnectionPool, get_data_version, get_read_conn
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "pool.db")
+
+
+@pytest.fixture
+def pool(db_path):
+    pool = ConnectionPool(max_readers=2, checkout_timeout=0.5)
+    with pool.writer(db_path) as conn:
+        conn.execute("CREATE TABLE t (x INTEGER)")
+    yield pool
+    pool.close_all()
+
+
+def _hold_reader(pool, db_path, started: threading.Event, release: threading.Event, seen: list):
+    with pool.reader(db_path) as conn:
+        seen.append(conn.execute("SELECT count(*) FROM t").fetchone()[0])
+        started.set()
+        release.wait(5)
+        seen.append(conn.execute("SELECT count(*) FROM t").fetchone()[0])
+
+
+def _count_in_thread(pool, db_path) -> int:
+    """Row count as another thread sees it (committed data only)."""
+    result = []
+
+    def count():
+        with pool.reader(db_path) as conn:
+            result.append(conn.execute("SELECT count(*) FROM t").fetchone()[0])
+
+    thread = threading.Thread(target=count)
+    thread.start()
+    thread.join(5)
+    return result[0]
+
+
+def test_reader_does_not_block_writer(pool, db_path):
+    started, release, seen = threading.Event(), threading.Event(), []
+    thread = threading.Thread(target=_hold_reader, args=(pool, db_path, started, release, seen))
+    thread.start()
+    assert started.wait(5)
+    with pool.writer(db_path) as conn:
+        conn.execute("INSERT INTO t VALUES (1)")
+    release.set()
+    thread.join(5)
+    # The writer committed while the reader was checked out, without waiting for it
+    assert seen == [0, 1]
+    stats = pool.stats()["databases"]["pool.db"]
+    assert stats["writer_waits"] == 0 and stats["timeouts"] == 0
+
+
+def test_nested_writer_shares_the_outer_transaction(pool, db_path):
+    with pool.writer(db_path) as outer:
+        with pool.writer(db_path) as inner:
+            assert inner is outer
+            inner.execute("INSERT INTO t VALUES (1)")
+        assert pool.owns_writer(db_path)
+        with pool.reader(db_path) as conn:
+            assert conn is outer  # reads inside the transaction see its pending rows
+        assert _count_in_thread(pool, db_path) == 0  # inner exit did not commit
+    assert _count_in_thread(pool, db_path) == 1
+
+    with pytest.raises(RuntimeError):
+        with pool.writer(db_path):
+            with pool.writer(db_path) as inner:
+                inner.execute("INSERT INTO t VALUES (2)")
+            raise RuntimeError("outer fails")
+    assert _count_in_thread(pool, db_path) == 1  # the inner write rolled back with the outer
+
+
+def test_reader_checkout_is_bounded(db_path):
+    pool = ConnectionPool(max_readers=1, checkout_timeout=0.2)
+    with pool.writer(db_path) as conn:
+        conn.execute("CREATE TABLE t (x INTEGER)")
+    started, release, seen = threading.Event(), threading.Event(), []
+    thread = threading.Thread(target=_hold_reader, args=(pool, db_path, started, release, seen))
+    thread.start()
+    assert started.wait(5)
+    try:
+        with pytest.raises(TimeoutError):
+            with pool.reader(db_path):
+                pass
+    finally:
+        release.set()
+        thread.join(5)
+    with pool.reader(db_path) as conn:  # the slot is back once the holder returns it
+        conn.execute("SELECT 1")
+    stats = pool.stats()["databases"]["pool.db"]
+    assert stats["timeouts"] == 1 and stats["readers_open"] == 1
+    pool.close_all()
+
+
+def test_eviction_closes_least_recently_used_files(tmp_path):
+    pool = ConnectionPool(max_open_dbs=1)
+    evicted = []
+    pool.add_eviction_listener(evicted.append)
+    a, b = str(tmp_path / "a.db"), str(tmp_path / "b.db")
+    with pool.writer(a) as conn:
+        conn.execute("CREATE TABLE t (x INTEGER)")
+        with pool.writer(b):
+            pass  # a is checked out: over budget, but not evicted
+        assert evicted == []
+    with pool.writer(b):
+        pass
+    assert evicted == [a]
+    assert not os.path.exists(a + "-wal")  # checkpointed and closed
+    assert pool.stats()["summary"]["open_dbs"] == 1
+    pool.close_all()
+
+
+def test_idle_sweep_closes_unused_files(tmp_path):
+    pool = ConnectionPool(idle_seconds=0)
+    evicted = []
+    pool.add_eviction_listener(evicted.append)
+    path = str(tmp_path / "idle.db")
+    with pool.reader(path) as conn:
+        conn.execute("SELECT 1")
+    assert pool.evict_idle() == 1 and evicted == [path]
+    assert not os.path.exists(path + "-wal") and pool.stats()["summary"]["open_dbs"] == 0
+
+
+def test_payload_cache_follows_data_version(tenant_id, add_products):
+    loads = []
+
+    def loader():
+        loads.append(1)
+        with get_read_conn(tenant_id) as conn:
+            return conn.execute("SELECT count(*) FROM products").fetchone()[0]
+
+    assert cached_payload(tenant_id, ("count",), loader) == 0
+    assert cached_payload(tenant_id, ("count",), loader) == 0
+    assert len(loads) == 1
+    version = get_data_version(tenant_id)
+    add_products([("A", "Arroz", 1)])
+    assert get_data_version(tenant_id) > version
+    assert cached_payload(tenant_id, ("count",), loader) == 1
+    assert len(loads) == 2
@@ -0,0 +1,58 @@
+import threading
+
+from app.core.database import get_conn, get_read_conn
+from app.database_sa import get_read_session, get_session
+from app.models import Client
+
+
+def _write_in_thread(tenant_id) -> bool:
+    done = threading.Event()
+
+    def write():
+        with get_conn(tenant_id) as conn:
+            conn.execute("INSERT INTO products (sku, name) VALUES ('W', 'Escrito')")
+        done.set()
+
+    threading.Thread(target=write, daemon=True).start()
+    return done.wait(2)
+
+
+def test_read_session_does_not_hold_the_writer(tenant_id):
+    session = get_read_session(tenant_id)
+    try:
+        assert session.query(Client).count() == 0
+        assert _write_in_thread(tenant_id)  # would wait for session.close() on the writer
+    finally:
+        session.close()
+
+
+def test_write_session_commits_through_the_pool_writer(tenant_id):
+    session = get_session(tenant_id)
+    try:
+        session.add(Client(name="Ferreteria"))
+        session.commit()
+    finally:
+        session.close()
+    with get_read_conn(tenant_id) as conn:
+        assert conn.execute("SELECT name FROM clients").fetchone()[0] == "Ferreteria"
+    session = get_read_session(tenant_id)
+    try:
+        assert [c.name for c in session.query(Client)] == ["Ferreteria"]
+    finally:
+        session.close()
+
+
+def test_remision_endpoints(client, tenant_id, auth_headers, add_products):
+    add_products([("A", "Arroz", 10, 1000)])
+    client_id = client.post("/api/clients", json={"name": "Tienda"}, headers=auth_headers).json()["id"]
+    created = client.post("/api/remisiones", params={"token": "x"}, headers=auth_headers, json={
+        "client_id": client_id,
+        "items": [{"product_sku": "A", "product_name": "Arroz", "quantity": 3, "unit_price": 1000}],
+    })
+    assert created.status_code == 200, created.text
+    remision_id = created.json()["id"]
+    assert client.get("/api/remisiones", headers=auth_headers).json()["remisiones"][0]["item_count"] == 1
+    assert client.get(f"/api/remisiones/{remision_id}", headers=auth_headers).json()["total_amount"] == 3000
+    pdf = client.get(f"/api/remisiones/{remision_id}/pdf", headers=auth_headers)
+    assert pdf.status_code == 200 and pdf.content.startswith(b"%PDF")
+    assert client.get("/api/remisiones/999/pdf", headers=auth_headers).status_code == 404
@@ -0,0 +1,49 @@
+"""Server-side paging of /api/inventory: what the inventory table runs on."""
+import pytest
+
+
+@pytest.fixture
+def catalog(add_products):
+    add_products([("A1", "Arroz", 0, 100, "Granos"), ("A2", "Azucar", 3, 200, "Granos"),
+                  ("B1", "Jabon", 12, 300, "Aseo"), ("B2", "Shampoo", 5, 400, "Aseo"),
+                  ("C1", "Sal", -1, 50, "")])
+
+
+@pytest.mark.parametrize("stock, skus", [
+    ("low", {"A2", "B2"}),
+    ("out", {"A1", "C1"}),
+    ("normal", {"B1"}),
+])
+def test_stock_filter(client, auth_headers, catalog, stock, skus):
+    body = client.get("/api/inventory", params={"token": "x", "limit": 10, "stock": stock},
+                      headers=auth_headers).json()
+    assert {p["sku"] for p in body["products"]} == skus and body["total"] == len(skus)
+
+
+def test_rejects_unknown_stock_filter(client, auth_headers, catalog):
+    response = client.get("/api/inventory", params={"token": "x", "stock": "all"}, headers=auth_headers)
+    assert response.status_code == 422
+
+
+def test_cursor_walks_filtered_sorted_pages(client, auth_headers, catalog):
+    params = {"token": "x", "limit": 2, "sort": "price", "order": "desc", "category": "Aseo"}
+    first = client.get("/api/inventory", params=params, headers=auth_headers).json()
+    assert [p["sku"] for p in first["products"]] == ["B2", "B1"] and first["total"] == 2
+    assert first["next_cursor"] is None
+
+    params.pop("category")
+    seen = []
+    cursor = None
+    while True:
+        page = client.get("/api/inventory", params={**params, **({"cursor": cursor} if cursor else {})},
+                          headers=auth_headers).json()
+        seen += [p["sku"] for p in page["products"]]
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert seen == ["B2", "B1", "A2", "A1", "C1"]
+
+
+def test_categories(client, auth_headers, catalog):
+    response = client.get("/api/inventory/categories", params={"token": "x"}, headers=auth_headers)
+    assert response.status_code == 200 and response.json() == {"categories": ["Aseo", "Granos"]}
@@ -0,0 +1,69 @@
+import sqlite3
+from contextlib import closing
+
+import pytest
+
+from app.core.database import get_read_conn
+from app.core.migrations import TENANT_MIGRATIONS, migrate
+
+
+def _legacy_db(path) -> sqlite3.Connection:
+    """A tenant DB at v2: the old rowid-only products table."""
+    conn = sqlite3.connect(str(path), isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    migrate(conn, TENANT_MIGRATIONS[:2])
+    return conn
+
+
+def test_fresh_tenant_is_at_latest_version(tenant_id):
+    with get_read_conn(tenant_id) as conn:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == len(TENANT_MIGRATIONS)
+        tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert {"products", "movements", "custom_columns", "product_custom_values",
+            "data_version", "change_log", "product_codes"} <= tables
+
+
+def test_migrations_are_idempotent(tmp_path):
+    with closing(_legacy_db(tmp_path / "t.db")) as conn:
+        assert migrate(conn, TENANT_MIGRATIONS) == len(TENANT_MIGRATIONS)
+        assert migrate(conn, TENANT_MIGRATIONS) == len(TENANT_MIGRATIONS)
+
+
+def test_v3_keeps_rowids_and_dedupes_skus(tmp_path):
+    with closing(_legacy_db(tmp_path / "t.db")) as conn:
+        conn.executemany("INSERT INTO products (sku, name, stock) VALUES (?, ?, ?)",
+                         [("ABC", "Arroz", 1), ("abc ", "Arroz 2", 2), ("", "Sin sku", 3)])
+        migrate(conn, TENANT_MIGRATIONS)
+        rows = [tuple(r) for r in conn.execute("SELECT id, sku, name FROM products ORDER BY id")]
+    assert rows == [(1, "ABC", "Arroz"), (2, "abc-2", "Arroz 2"), (3, "GEN-3", "Sin sku")]
+
+
+def test_v3_moves_custom_values_with_renamed_skus(tmp_path):
+    with closing(_legacy_db(tmp_path / "t.db")) as conn:
+        conn.execute("INSERT INTO custom_columns (id, name) VALUES (1, 'Marca')")
+        conn.executemany("INSERT INTO products (sku, name) VALUES (?, ?)",
+                         [("ABC", "Arroz"), ("abc", "Arroz 2"), ("XYZ", "Sal"), ("XYZ", "Sal 2"), (" QQ ", "Azucar")])
+        conn.executemany("INSERT INTO product_custom_values (product_sku, column_id, value) VALUES (?, 1, ?)",
+                         [("ABC", "Diana"), ("abc", "Roa"), ("XYZ", "Refisal"), (" QQ ", "Manuelita")])
+        migrate(conn, TENANT_MIGRATIONS)
+        values = dict(conn.execute("SELECT product_sku, value FROM product_custom_values").fetchall())
+    # Renamed rows keep their own values; exact duplicates each get a copy; trimmed keys follow
+    assert values == {"ABC": "Diana", "abc-2": "Roa", "XYZ": "Refisal", "XYZ-4": "Refisal", "QQ": "Manuelita"}
+
+
+def test_lookup_indexes_exist(tenant_id):
+    with get_read_conn(tenant_id) as conn:
+        indexes = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        sku_col = conn.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'products'"
+        ).fetchone()[0]
+    assert {"idx_products_name", "idx_products_invima", "idx_products_lote", "idx_products_category",
+            "idx_products_location", "idx_movements_sku_type_ts", "idx_movements_ts",
+            "idx_products_stock", "idx_products_price", "idx_products_expiration"} <= indexes
+    assert "id INTEGER PRIMARY KEY" in sku_col and "NOCASE" in sku_col
+
+
+def test_sku_is_unique_case_insensitive(tenant_id, add_products):
+    add_products([("ABC", "Arroz", 1)])
+    with pytest.raises(sqlite3.IntegrityError):
+        add_products([("abc", "Otro", 1)])
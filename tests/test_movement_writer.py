@@ -0,0 +1,113 @@
+import threading
+import time
+import uuid
+
+import pytest
+
+from app.core.database import get_conn, get_read_conn
+from app.services.movement_writer import MovementWriter
+
+
+def _row(sku, qty=1):
+    return ("2024-01-01 10:00:00", "tx", "VENTA", sku, "Producto", qty, "test", "")
+
+
+def _count(tenant_id):
+    with get_read_conn(tenant_id) as conn:
+        return conn.execute("SELECT count(*) FROM movements").fetchone()[0]
+
+
+@pytest.fixture
+def writer():
+    writer = MovementWriter(flush_ms=20, flush_rows=1000, max_pending=10000)
+    yield writer
+    writer.close()
+
+
+def test_concurrent_waiters_share_commits(tenant_id, writer):
+    threads = [threading.Thread(target=writer.log, args=(tenant_id, [_row(f"S{i}")], True)) for i in range(100)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert _count(tenant_id) == 100  # wait mode: committed when log() returns
+    stats = writer.stats()
+    assert stats["written"] == 100 and stats["batches"] < 100
+
+
+def test_async_rows_written_on_flush_and_close(tenant_id, writer):
+    writer.log(tenant_id, [_row("A"), _row("B")], wait=False)
+    assert writer.flush(timeout=5)
+    assert _count(tenant_id) == 2
+    writer.log(tenant_id, [_row("C")], wait=False)
+    writer.close()
+    assert _count(tenant_id) == 3
+    writer.log(tenant_id, [_row("D")])  # closed: written inline
+    assert _count(tenant_id) == 4 and writer.stats()["inline"] == 1
+
+
+def test_inside_write_transaction_rows_roll_back_with_it(tenant_id, writer):
+    with pytest.raises(RuntimeError):
+        with get_conn(tenant_id):
+            writer.log(tenant_id, [_row("A")])
+            raise RuntimeError("boom")
+    assert _count(tenant_id) == 0 and writer.stats()["inline"] == 1
+
+
+def test_failed_batch_raises_in_wait_mode(tenant_id, writer):
+    with pytest.raises(Exception):
+        writer.log(tenant_id, [("too", "few", "columns")], wait=True)
+    assert writer.stats()["failed"] == 1
+
+
+@pytest.fixture
+def other_tenant():
+    from app.core.database import init_tenant_db
+    tid = f"t{uuid.uuid4().hex[:10]}"
+    init_tenant_db(tid)
+    return tid
+
+
+def test_busy_tenant_does_not_hold_up_others(tenant_id, other_tenant, writer):
+    """A thread inside tenant A's transaction logs for B while another thread waits on A."""
+    errors = []
+
+    def log_a():
+        try:
+            writer.log(tenant_id, [_row("A")], wait=True)
+        except Exception as e:
+            errors.append(e)
+
+    started = time.monotonic()
+    with get_conn(tenant_id):
+        waiter = threading.Thread(target=log_a)
+        waiter.start()
+        while not writer.stats()["deferred"]:  # A's batch found the writer busy
+            time.sleep(0.01)
+        writer.log(other_tenant, [_row("B")], wait=True)
+        assert _count(other_tenant) == 1
+    waiter.join(5)
+    assert time.monotonic() - started < 2 and not errors
+    assert _count(tenant_id) == 1
+
+
+def test_busy_tenant_times_out(tenant_id, writer, monkeypatch):
+    from app.core.config import settings
+    monkeypatch.setattr(settings, "DB_CHECKOUT_TIMEOUT", 0.2)
+    holding, release = threading.Event(), threading.Event()
+
+    def hold():
+        with get_conn(tenant_id):
+            holding.set()
+            release.wait(5)
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    holding.wait(5)
+    try:
+        with pytest.raises(TimeoutError):
+            writer.log(tenant_id, [_row("A")], wait=True)
+    finally:
+        release.set()
+        holder.join(5)
+    assert _count(tenant_id) == 0 and writer.stats()["failed"] == 1
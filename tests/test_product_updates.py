@@ -0,0 +1,64 @@
+from app.core.database import get_conn, get_read_conn
+from app.services.product_updates import apply_product_edits, apply_sku_edits, update_selection
+
+
+def _products(tenant_id):
+    with get_read_conn(tenant_id) as conn:
+        return {r["sku"]: dict(r) for r in conn.execute("SELECT sku, name, stock, price, category FROM products")}
+
+
+def _custom(tenant_id):
+    with get_read_conn(tenant_id) as conn:
+        return dict(conn.execute("SELECT product_sku, value FROM product_custom_values").fetchall())
+
+
+def _marca(tenant_id):
+    with get_conn(tenant_id) as conn:
+        conn.execute("INSERT INTO custom_columns (id, name) VALUES (1, 'Marca')")
+
+
+def test_edits_write_fields_and_custom_values(tenant_id, add_products):
+    add_products([("A", "Arroz", 1, 100), ("B", "Sal", 2, 200)])
+    _marca(tenant_id)
+    written = apply_product_edits(tenant_id, {1: {"price": 150, "stock": 9, "Marca": "Diana", "Color": "x"},
+                                              2: {"name": "Sal Refisal"}, 99: {"price": 1}})
+    assert sorted(written[1]) == ["Marca", "price", "stock"] and written[2] == ["name"] and 99 not in written
+    products = _products(tenant_id)
+    assert (products["A"]["price"], products["A"]["stock"], products["B"]["name"]) == (150, 9, "Sal Refisal")
+    assert _custom(tenant_id) == {"A": "Diana"}
+
+
+def test_rename_moves_custom_values(tenant_id, add_products):
+    add_products([("A", "Arroz", 1)])
+    _marca(tenant_id)
+    apply_product_edits(tenant_id, {1: {"Marca": "Diana"}})
+    written = apply_product_edits(tenant_id, {1: {"price": 5}}, renames={1: "A-NEW"})
+    assert sorted(written[1]) == ["price", "sku"]
+    assert list(_products(tenant_id)) == ["A-NEW"] and _custom(tenant_id) == {"A-NEW": "Diana"}
+
+
+def test_sku_edits_and_selection(tenant_id, add_products):
+    add_products([("A", "Arroz", 1, 1000, "Granos"), ("B", "Frijol", 1, 2000, "Granos"), ("C", "Sal", 1, 500)])
+    written, missing = apply_sku_edits(tenant_id, {"a": {"stock": 7}, "zz": {"stock": 1}})
+    assert written == {"a": ["stock"]} and missing == ["zz"]
+    assert update_selection(tenant_id, {}, category="Granos", price_pct=10, round_to=50) == 2
+    products = _products(tenant_id)
+    assert (products["A"]["price"], products["B"]["price"], products["C"]["price"]) == (1100, 2200, 500)
+
+
+def test_bot_update_is_one_transaction(service, tenant_id, add_products):
+    add_products([("A", "Arroz", 1, 100), ("B", "Sal", 1)])
+    _marca(tenant_id)
+    reply = service._handle_update(1, "Arroz", {"accion": "actualizar", "producto": "arroz", "precio": 250,
+                                                "cantidad": "4", "categoria": "granos", "nuevo_sku": "arr-1",
+                                                "Marca": "Diana"})
+    assert "Campos modificados: 5" in reply
+    products = _products(tenant_id)
+    assert products["ARR-1"] == {"sku": "ARR-1", "name": "Arroz", "stock": 4, "price": 250,
+                                 "category": "Granos"}
+    assert _custom(tenant_id) == {"ARR-1": "Diana"}
+
+    # A taken SKU changes nothing
+    reply = service._handle_update(2, "Sal", {"precio": 9, "sku": "arr-1"})
+    assert "Ya existe" in reply and _products(tenant_id)["B"]["price"] == 0
+    assert "no encontrado" in service._handle_update(99, "X", {"precio": 1})
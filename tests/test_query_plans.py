@@ -0,0 +1,83 @@
+"""
+EXPLAIN QUERY PLAN checks for the hot lookups: each must SEARCH an index
+(or the rowid), never SCAN the table, so they stay flat as catalogs grow.
+Statements come from the modules that run them, not copies.
+"""
+import re
+
+import pytest
+
+from app.core.database import get_read_conn
+from app.routers.api import _CUSTOM_VALUES_SQL
+from app.services.catalog_io import _EXISTING_SQL
+from app.services.inventory_repository import (
+    _BY_SKU_SQL, _CHANGES_SQL, _EXPIRATION_COUNTS_SQL, _RESOLVE_CODE_SQL, _RESOLVE_CODES_SQL, SORT_COLUMNS,
+    InventoryRepository, _movements_query,
+)
+from app.services.inventory_service import _EXACT_NAME_SQL
+
+_TABLE_SCAN = re.compile(r"\bSCAN (products|movements|product_codes)\b")
+
+
+def _plan(tenant_id, sql, params=()) -> str:
+    with get_read_conn(tenant_id) as conn:
+        return "\n".join(r["detail"] for r in conn.execute("EXPLAIN QUERY PLAN " + sql, params))
+
+
+@pytest.mark.parametrize("sql, params, index", [
+    # Bot / API product resolution (inventory_service, inventory_repository)
+    (_BY_SKU_SQL, ("ABC",), "sqlite_autoindex_products"),
+    (_EXACT_NAME_SQL, ("Arroz",), "idx_products_name"),
+    (_RESOLVE_CODE_SQL, ("ABC",), "SEARCH product_codes USING PRIMARY KEY (code=?)"),
+    (_RESOLVE_CODES_SQL.format("?,?"), ("A", "B"), "SEARCH product_codes USING PRIMARY KEY (code=?)"),
+    # Catalog import: existing rows of a batch
+    (_EXISTING_SQL.format("?, ?"), ("A", "B"), "sqlite_autoindex_products"),
+    # Dashboard expiration buckets
+    (_EXPIRATION_COUNTS_SQL, (), "idx_products_expiration"),
+    # Movements: recent feed
+    (*_movements_query(50, "2024-01-01"), "idx_movements_ts"),
+    # Custom values for a page of products (api._load_custom_values)
+    (_CUSTOM_VALUES_SQL, ('["ABC"]',), "sqlite_autoindex_product_custom_values"),
+    (_CHANGES_SQL, (0, 10), "INTEGER PRIMARY KEY"),
+])
+def test_hot_query_uses_index(tenant_id, sql, params, index):
+    plan = _plan(tenant_id, sql, params)
+    assert index in plan, plan
+    assert not _TABLE_SCAN.search(plan), plan
+
+
+def test_code_order_sorts_one_codes_rows_only(tenant_id):
+    """resolve_code's ORDER BY (sku > invima > lote) runs after the PK probe on code,
+    so the sort only sees the few rows sharing that code."""
+    plan = _plan(tenant_id, _RESOLVE_CODE_SQL, ("ABC",)).splitlines()
+    probe = plan.index("SEARCH product_codes USING PRIMARY KEY (code=?)")
+    assert all("product_codes" not in line for line in plan[probe + 1:]), plan
+
+
+@pytest.mark.parametrize("filters, index", [
+    ({"category": "General"}, "idx_products_category"),
+    ({"location": "A1"}, "idx_products_location"),
+    ({"low_stock": True}, "idx_products_stock"),
+    ({"stock_level": "low"}, "idx_products_stock"),
+    ({"stock_level": "out"}, "idx_products_stock"),
+    ({"expiring_before": "2024-12-31"}, "idx_products_expiration"),
+    ({"search": "arroz"}, "products_fts"),
+])
+def test_inventory_page_filter_uses_index(tenant_id, filters, index):
+    plan = _plan(tenant_id, *InventoryRepository(tenant_id)._page_query("created", False, 50, None, **filters))
+    assert index in plan, plan
+    assert not _TABLE_SCAN.search(plan), plan
+
+
+@pytest.mark.parametrize("sort", sorted(SORT_COLUMNS))
+@pytest.mark.parametrize("descending", [False, True])
+def test_inventory_page_sort_needs_no_temp_btree(tenant_id, sort, descending):
+    plan = _plan(tenant_id, *InventoryRepository(tenant_id)._page_query(sort, descending, 50, None))
+    assert "USE TEMP B-TREE FOR ORDER BY" not in plan, plan
+
+
+@pytest.mark.parametrize("sort", sorted(SORT_COLUMNS))
+def test_inventory_next_page_seeks_the_cursor(tenant_id, sort):
+    after = (1, 1) if SORT_COLUMNS[sort] in ("id", "stock", "price") else ("x", 1)
+    plan = _plan(tenant_id, *InventoryRepository(tenant_id)._page_query(sort, False, 50, after))
+    assert plan.startswith("SEARCH products") and "USE TEMP B-TREE" not in plan, plan
@@ -0,0 +1,46 @@
+import pytest
+
+from app.core.state import MemoryStateStore, SQLiteStateStore, StateStore
+
+
+def test_state_store_is_abstract():
+    with pytest.raises(TypeError):
+        StateStore()
+
+    class Partial(StateStore):
+        def get(self, namespace, key):
+            return None
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+@pytest.fixture(params=[MemoryStateStore, SQLiteStateStore])
+def store(request):
+    store = request.param()
+    store.clear("test")
+    store.clear("gen")
+    return store
+
+
+def test_store_roundtrip(store):
+    store.set("test", "a", {"x": [1, 2]})
+    assert store.get("test", "a") == {"x": [1, 2]}
+    assert store.pop("test", "a") == {"x": [1, 2]}
+    assert store.get("test", "a") is None
+    assert store.incr("test", "n") == 1 and store.incr("test", "n") == 2
+    assert store.bump("g") == store.generation("g") == 1
+
+
+def test_store_ttl(store):
+    store.set("test", "k", 1, ttl=-1)
+    assert store.get("test", "k") is None
+
+
+def test_store_add_only_if_absent(store):
+    assert store.add("test", "lock", "a", ttl=60)
+    assert not store.add("test", "lock", "b", ttl=60)
+    assert store.get("test", "lock") == "a"
+    store.set("test", "stale", "x", ttl=-1)
+    assert store.add("test", "stale", "y")  # expired entries count as absent
+    assert store.get("test", "stale") == "y"
@@ -0,0 +1,71 @@
+import threading
+
+import pytest
+
+from app.core.database import get_read_conn
+from app.services.stock_ledger import StockChange, StockError, apply_stock_changes
+
+
+def _stock(tenant_id):
+    with get_read_conn(tenant_id) as conn:
+        return dict(conn.execute("SELECT sku, stock FROM products").fetchall())
+
+
+def _movements(tenant_id):
+    with get_read_conn(tenant_id) as conn:
+        return [tuple(r) for r in conn.execute("SELECT sku, mov_type, qty, tx_id FROM movements ORDER BY id")]
+
+
+def test_sale_and_purchase_log_movements(tenant_id, add_products):
+    add_products([("A", "Arroz", 10), ("B", "Sal", 2)])
+    results = apply_stock_changes(tenant_id, [StockChange(1, -3, "VENTA", "bot"), StockChange(2, 5, "COMPRA", "bot")])
+    assert [(r.sku, r.previous_stock, r.stock) for r in results] == [("A", 10, 7), ("B", 2, 7)]
+    assert _stock(tenant_id) == {"A": 7, "B": 7}
+    moves = _movements(tenant_id)
+    assert [m[:3] for m in moves] == [("A", "VENTA", -3), ("B", "COMPRA", 5)]
+    assert moves[0][3] == moves[1][3]  # one tx_id per batch
+
+
+def test_atomic_batch_rolls_back_stock_and_movements(tenant_id, add_products):
+    add_products([("A", "Arroz", 10), ("B", "Sal", 2)])
+    with pytest.raises(StockError) as exc:
+        apply_stock_changes(tenant_id, [StockChange(1, -3, "VENTA", "bot"), StockChange(2, -5, "VENTA", "bot")])
+    assert exc.value.result.error == "insufficient" and exc.value.result.stock == 2
+    assert _stock(tenant_id) == {"A": 10, "B": 2}
+    assert _movements(tenant_id) == []
+
+
+def test_partial_batch_reports_failures(tenant_id, add_products):
+    add_products([("A", "Arroz", 1)])
+    results = apply_stock_changes(tenant_id, [StockChange(1, -5, "VENTA", "bot"), StockChange(99, 1, "COMPRA", "bot"),
+                                              StockChange(1, 4, "COMPRA", "bot")], atomic=False)
+    assert [r.error for r in results] == ["insufficient", "not_found", None]
+    assert _stock(tenant_id) == {"A": 5}
+    assert [m[:3] for m in _movements(tenant_id)] == [("A", "COMPRA", 4)]
+
+
+def test_clamped_adjustment_floors_at_zero(tenant_id, add_products):
+    add_products([("A", "Arroz", 3)])
+    [result] = apply_stock_changes(tenant_id, [StockChange(1, -10, "AJUSTE", "bot", clamp=True)])
+    assert result.ok and result.stock == 0 and result.previous_stock is None
+
+
+def test_concurrent_sales_never_oversell(tenant_id, add_products):
+    add_products([("A", "Arroz", 50)])
+    outcomes = []
+
+    def sell():
+        try:
+            apply_stock_changes(tenant_id, [StockChange(1, -1, "VENTA", "bot")])
+            outcomes.append(True)
+        except StockError:
+            outcomes.append(False)
+
+    threads = [threading.Thread(target=sell) for _ in range(80)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert outcomes.count(True) == 50
+    assert _stock(tenant_id) == {"A": 0}
+    assert len(_movements(tenant_id)) == 50
@@ -0,0 +1,27 @@
+from app.core.database import get_admin_read_conn
+from app.services.tenant_service import TenantService
+
+
+def _owners(tenant_token):
+    with get_admin_read_conn() as conn:
+        return conn.execute("SELECT telegram_id FROM tenants WHERE token = ?", (tenant_token,)).fetchone()[0]
+
+
+def test_latest_link_wins_and_registry_follows():
+    service = TenantService()
+    first = service.create_tenant("Tienda Uno", "tienda", telegram_id="5001")
+    assert service.get_tenant_by_user("5001")["token"] == first["token"]
+
+    # Creating a second tenant for the same user moves the user, like link_user does
+    second = service.create_tenant("Tienda Dos", "tienda", telegram_id="5001")
+    assert service.get_tenant_by_user("5001")["token"] == second["token"]
+    assert _owners(first["token"]) == "" and _owners(second["token"]) == "5001"
+
+    ok, _ = service.link_user("5001", first["token"])
+    assert ok
+    assert service.get_tenant_by_user("5001")["token"] == first["token"]
+    assert _owners(first["token"]) == "5001" and _owners(second["token"]) == ""
+
+    ok, _ = service.link_user("5002", first["token"])
+    assert ok and _owners(first["token"]) == "5001,5002"
+    assert not service.link_user("5003", "NOPE")[0]